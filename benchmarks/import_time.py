@@ -0,0 +1,78 @@
+# Import time check for the battery_dispatch entry points: runs `python -X importtime`
+# in a fresh interpreter for each module and fails if a heavy dependency is imported
+# eagerly or the cumulative import time goes over budget.
+# Usage: PYTHONPATH=src python benchmarks/import_time.py [--budget-ms 150]
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+
+MODULES = (
+    "battery_dispatch.core",
+    "battery_dispatch.cli",
+    "battery_dispatch.batch",
+)
+# Only imported once a simulation actually runs
+HEAVY_MODULES = ("pandas", "numpy", "scipy", "yaml")
+
+
+def measure_import(module: str) -> tuple[float, dict[str, float]]:
+    # Returns the module's cumulative import time and the cumulative time of
+    # every module it pulled in, in milliseconds
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported: dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.removeprefix("import time:").split("|")
+        imported[name.strip()] = int(cumulative_us) / 1000
+    return imported[module], imported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Check import time of the battery_dispatch entry points"
+    )
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        # Warm up once so we measure imports from cached bytecode
+        measure_import(module)
+        total_ms, imported = measure_import(module)
+        heavy = sorted(
+            name
+            for name in imported
+            if name.split(".")[0] in HEAVY_MODULES and "." not in name
+        )
+        slowest = sorted(
+            (
+                (ms, name)
+                for name, ms in imported.items()
+                if name.startswith("battery_dispatch")
+            ),
+            reverse=True,
+        )[:3]
+        status = "ok"
+        if heavy or total_ms > args.budget_ms:
+            status = "FAIL"
+            failed = True
+        print(
+            f"{status:4} {module:28} {total_ms:7.1f} ms"
+            + (f"  eagerly imports {', '.join(heavy)}" if heavy else "")
+        )
+        for ms, name in slowest:
+            print(f"       {name:35} {ms:7.1f} ms")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
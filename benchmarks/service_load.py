@@ -0,0 +1,177 @@
+# Load generator for the dispatch service: sends dispatch requests for random
+# batteries at random gates from concurrent keep-alive connections, then prints the
+# client-side latency percentiles and throughput next to the service's /metrics.
+# Start the service first, e.g. python -m battery_dispatch serve scenarios/example.toml
+# Usage: PYTHONPATH=src python benchmarks/service_load.py [--url URL | --socket PATH]
+#   [--connections 16] [--requests 4000] [--batteries-per-request 1] [--gates 8]
+#   [--value-fraction 0]
+from __future__ import annotations
+
+import argparse
+import datetime
+import http.client
+import json
+import random
+import socket
+import threading
+import time
+from typing import Any
+from urllib.parse import urlparse
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str) -> None:
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def connect(args: argparse.Namespace) -> http.client.HTTPConnection:
+    if args.socket is not None:
+        return UnixHTTPConnection(args.socket)
+    url = urlparse(args.url)
+    return http.client.HTTPConnection(url.hostname or "127.0.0.1", url.port or 80)
+
+
+def call(
+    connection: http.client.HTTPConnection, method: str, path: str, body: Any = None
+) -> tuple[int, Any]:
+    payload = None if body is None else json.dumps(body)
+    connection.request(
+        method, path, body=payload, headers={"Content-Type": "application/json"}
+    )
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def random_battery(rng: random.Random) -> dict[str, float]:
+    capacity_mwh = rng.choice([1.0, 2.0, 4.0, 8.0])
+    return {
+        "capacity_mwh": capacity_mwh,
+        "max_charge_mw": capacity_mwh / rng.choice([1, 2, 4]),
+        "max_discharge_mw": capacity_mwh / rng.choice([1, 2, 4]),
+        "charge_efficiency": 0.95,
+        "discharge_efficiency": 0.95,
+        "state_of_charge_mwh": rng.uniform(0, capacity_mwh),
+    }
+
+
+def gate_times(market: dict[str, Any], *, count: int, rng: random.Random) -> list[str]:
+    # Live callers decide for many batteries at a handful of gates
+    start = datetime.datetime.fromisoformat(market["start"])
+    interval = datetime.timedelta(hours=market["interval_hours"])
+    return [
+        (start + rng.randrange(market["intervals"]) * interval).isoformat()
+        for _ in range(count)
+    ]
+
+
+def percentile(sorted_values: list[float], value: float) -> float:
+    rank = max(1, -(-len(sorted_values) * value // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the dispatch service")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--socket", help="The service's Unix socket, instead of --url")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument(
+        "--batteries-per-request",
+        type=int,
+        default=1,
+        help="Dispatch decisions per request, all at one gate",
+    )
+    parser.add_argument("--gates", type=int, default=8)
+    parser.add_argument(
+        "--value-fraction",
+        type=float,
+        default=0.0,
+        help="Share of requests that are month-long valuations rather than dispatch",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    _, markets = call(connect(args), "GET", "/markets")
+    market = markets[0]
+    gates = gate_times(market, count=args.gates, rng=rng)
+    month_end = (
+        datetime.datetime.fromisoformat(market["start"]) + datetime.timedelta(days=30)
+    ).isoformat()
+
+    latencies: list[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    def run_connection(requests: int, seed: int) -> None:
+        nonlocal failures
+        connection_rng = random.Random(seed)
+        connection = connect(args)
+        for _ in range(requests):
+            battery = random_battery(connection_rng)
+            if connection_rng.random() < args.value_fraction:
+                path = "/value"
+                body = {"battery": battery, "market": market["name"], "end": month_end}
+            elif args.batteries_per_request == 1:
+                path = "/dispatch"
+                body = {"battery": battery, "timestamp": connection_rng.choice(gates)}
+            else:
+                path = "/dispatch"
+                gate = connection_rng.choice(gates)
+                body = [
+                    {"battery": random_battery(connection_rng), "timestamp": gate}
+                    for _ in range(args.batteries_per_request)
+                ]
+            started = time.perf_counter()
+            status, _ = call(connection, "POST", path, body)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                failures += status != 200
+        connection.close()
+
+    per_connection = [
+        args.requests // args.connections + (index < args.requests % args.connections)
+        for index in range(args.connections)
+    ]
+    threads = [
+        threading.Thread(target=run_connection, args=(requests, args.seed + index))
+        for index, requests in enumerate(per_connection)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{len(latencies)} requests over {args.connections} connections in "
+        f"{elapsed:.2f}s: {len(latencies) / elapsed:.0f} requests/s, "
+        f"{len(latencies) * args.batteries_per_request / elapsed:.0f} decisions/s, "
+        f"{failures} failed"
+    )
+    print(
+        "Client latency: "
+        + ", ".join(
+            f"p{value} {1000 * percentile(latencies, value):.2f}ms"
+            for value in LATENCY_PERCENTILES
+        )
+        + f", max {1000 * latencies[-1]:.2f}ms"
+    )
+    _, metrics = call(connect(args), "GET", "/metrics")
+    print("Service metrics:")
+    print(json.dumps(metrics, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,3 @@
+from battery_dispatch.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import importlib
+from types import ModuleType
+from typing import Any
+
+
+class LazyModule:
+    # Stand-in for a module that is only imported the first time one of its
+    # attributes is used, so importing battery_dispatch stays cheap for the CLI
+    # and short-lived workers. Use it behind `if TYPE_CHECKING` so type checkers
+    # still see the real module
+    def __init__(self, name: str) -> None:
+        self._lazy_name = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        module = importlib.import_module(self._lazy_name)
+        # Copy the module's namespace so later lookups don't go through here
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._lazy_name!r}>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    return LazyModule(name)  # type: ignore[return-value]
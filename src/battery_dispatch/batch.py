@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import csv
+import dataclasses
+import functools
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterator, TypeVar
+
+from battery_dispatch.config import BatteryConfig, MarketConfig, ScenarioConfig
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+    from battery_dispatch.values.battery import Battery
+    from battery_dispatch.values.market import Market
+
+# The simulation modules pull in pandas, so they are only imported once a scenario
+# actually runs
+
+_T = TypeVar("_T")
+
+
+@dataclasses.dataclass(frozen=True)
+class ScenarioResult:
+    scenario: str
+    strategy: str
+    lookahead_hours: float
+    markets: str
+    capacity_mwh: float
+    max_charge_mw: float
+    max_discharge_mw: float
+    charge_efficiency: float
+    discharge_efficiency: float
+    revenue: float
+    cost: float
+    profit: float
+    final_state_of_charge_mwh: float
+    throughput_mwh: float
+    degradation_cost: float
+
+
+def run_scenarios(
+    scenarios: list[ScenarioConfig],
+    workers: int = 1,
+    checkpoint_directory: str | None = None,
+    results_path: str | None = None,
+    store_timelines: bool = False,
+) -> list[ScenarioResult]:
+    # With a checkpoint directory each scenario checkpoints into its own
+    # subdirectory, so rerunning the batch after a crash resumes the unfinished ones.
+    # With a results store, scenarios already in it aren't run again, and new
+    # results are added to it as they come in
+    if results_path is None:
+        run = functools.partial(run_scenario, checkpoint_directory=checkpoint_directory)
+        return list(_map(run, scenarios, workers=workers))
+
+    from battery_dispatch.results_store import (
+        INSERT_BATCH_SIZE,
+        ResultsStore,
+        StoredResult,
+        scenario_key,
+    )
+
+    keys = [scenario_key(scenario) for scenario in scenarios]
+    with ResultsStore.open(results_path) as store:
+        results_by_key = store.get(keys)
+        # Scenarios differing only in name are run once
+        to_run = {
+            key: scenario
+            for key, scenario in zip(keys, scenarios)
+            if key not in results_by_key
+        }
+        run_for_store = functools.partial(
+            _run_scenario_for_store,
+            checkpoint_directory=checkpoint_directory,
+            store_timeline=store_timelines,
+        )
+        batch: list[StoredResult] = []
+        for key, (result, timeline) in zip(
+            to_run, _map(run_for_store, list(to_run.values()), workers=workers)
+        ):
+            results_by_key[key] = result
+            batch.append(
+                StoredResult(scenario_key=key, result=result, timeline=timeline)
+            )
+            if len(batch) == INSERT_BATCH_SIZE:
+                store.add(batch)
+                batch = []
+        store.add(batch)
+
+    return [
+        dataclasses.replace(results_by_key[key], scenario=scenario.name)
+        for key, scenario in zip(keys, scenarios)
+    ]
+
+
+def _map(
+    function: Callable[[ScenarioConfig], _T],
+    scenarios: list[ScenarioConfig],
+    *,
+    workers: int,
+) -> Iterator[_T]:
+    if workers <= 1 or len(scenarios) <= 1:
+        return map(function, scenarios)
+
+    # Each worker keeps its own market cache, so hand out contiguous chunks to give
+    # scenarios sharing markets a chance to land on the same process
+    chunksize = max(1, len(scenarios) // (workers * 4))
+    return _map_in_processes(function, scenarios, workers=workers, chunksize=chunksize)
+
+
+def _map_in_processes(
+    function: Callable[[ScenarioConfig], _T],
+    scenarios: list[ScenarioConfig],
+    *,
+    workers: int,
+    chunksize: int,
+) -> Iterator[_T]:
+    # Results are yielded as they arrive, in order, so they can be stored as the
+    # batch goes
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(function, scenarios, chunksize=chunksize)
+
+
+def run_scenario(
+    scenario: ScenarioConfig, checkpoint_directory: str | None = None
+) -> ScenarioResult:
+    result, _ = _run_scenario_for_store(
+        scenario, checkpoint_directory=checkpoint_directory, store_timeline=False
+    )
+    return result
+
+
+def _run_scenario_for_store(
+    scenario: ScenarioConfig,
+    checkpoint_directory: str | None = None,
+    store_timeline: bool = False,
+) -> tuple[ScenarioResult, dict[str, npt.NDArray[Any]] | None]:
+    import numpy as np
+
+    from battery_dispatch.core import run_battery_simulation_for_scenario
+
+    battery_config = scenario.battery
+    battery = build_battery(battery_config)
+    scenario_checkpoint_directory = (
+        Path(checkpoint_directory) / scenario.name
+        if checkpoint_directory is not None
+        else None
+    )
+    result = run_battery_simulation_for_scenario(
+        battery=battery,
+        all_markets=[_load_market(market) for market in scenario.markets],
+        output=False,
+        number_of_hours_to_look_ahead=scenario.lookahead_hours,
+        checkpoint_directory=(
+            str(scenario_checkpoint_directory)
+            if scenario_checkpoint_directory is not None
+            else None
+        ),
+    )
+    # The scenario's subdirectory is only there for its checkpoint
+    if (
+        scenario_checkpoint_directory is not None
+        and scenario_checkpoint_directory.is_dir()
+    ):
+        if not any(scenario_checkpoint_directory.iterdir()):
+            scenario_checkpoint_directory.rmdir()
+    scenario_result = ScenarioResult(
+        scenario=scenario.name,
+        strategy=scenario.strategy,
+        lookahead_hours=scenario.lookahead_hours,
+        markets="+".join(market.name for market in scenario.markets),
+        capacity_mwh=battery_config.capacity_mwh,
+        max_charge_mw=battery_config.max_charge_mw,
+        max_discharge_mw=battery_config.max_discharge_mw,
+        charge_efficiency=battery_config.charge_efficiency,
+        discharge_efficiency=battery_config.discharge_efficiency,
+        revenue=result.revenue,
+        cost=result.cost,
+        profit=result.profit,
+        final_state_of_charge_mwh=result.final_state_of_charge_mwh,
+        throughput_mwh=result.throughput_mwh,
+        degradation_cost=result.degradation_cost,
+    )
+    if not store_timeline:
+        return scenario_result, None
+
+    # One entry per settled commitment, keyed by the start of the interval it
+    # settled, in nanoseconds since the epoch
+    ledger = battery.energy_ledger
+    return scenario_result, {
+        "start_time_ns": np.array(ledger.start_times_ns),
+        "grid_import_mwh": np.array(ledger.grid_import_mwh),
+        "grid_export_mwh": np.array(ledger.grid_export_mwh),
+        "losses_mwh": np.array(ledger.losses_mwh),
+    }
+
+
+def build_battery(battery_config: BatteryConfig) -> Battery:
+    from battery_dispatch.values.battery import Battery
+    from battery_dispatch.values.degradation import DegradationModel
+
+    degradation = battery_config.degradation
+    return Battery(
+        capacity_mwh=battery_config.capacity_mwh,
+        max_charge_mw=battery_config.max_charge_mw,
+        max_discharge_mw=battery_config.max_discharge_mw,
+        charge_efficiency=battery_config.charge_efficiency,
+        discharge_efficiency=battery_config.discharge_efficiency,
+        state_of_charge_mwh=battery_config.state_of_charge_mwh,
+        degradation=(
+            DegradationModel(**dataclasses.asdict(degradation))
+            if degradation is not None
+            else None
+        ),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _load_market(market: MarketConfig) -> Market:
+    # Scenarios pick their lookahead from the market's range index, so one market
+    # serves every lookahead
+    from battery_dispatch.core import create_market_from_data
+    from battery_dispatch.values.forecast import ForecastStore
+
+    return create_market_from_data(
+        csv_path=market.csv_path,
+        interval_hours=market.interval_hours,
+        name=market.name,
+        forecasts=(
+            ForecastStore.load(market.forecast_path)
+            if market.forecast_path is not None
+            else None
+        ),
+    )
+
+
+def write_results(results: list[ScenarioResult], output_path: str) -> None:
+    path = Path(output_path)
+    rows: list[dict[str, Any]] = [dataclasses.asdict(result) for result in results]
+    if path.suffix == ".json":
+        path.write_text(json.dumps(rows, indent=2))
+    elif path.suffix == ".csv":
+        with path.open("w", newline="") as output_file:
+            writer = csv.DictWriter(
+                output_file,
+                fieldnames=[field.name for field in dataclasses.fields(ScenarioResult)],
+            )
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        raise ValueError(
+            f"Unsupported output file type {path.suffix!r}, expected .csv or .json"
+        )
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import pickle
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.values.alignment import MarketAlignment, to_nanoseconds
+from battery_dispatch.values.battery import (
+    Battery,
+    BatteryCommitment,
+    BatteryCommitmentType,
+)
+from battery_dispatch.values.degradation import RainflowCounter
+from battery_dispatch.values.ledger import EnergyLedger
+from battery_dispatch.values.market import Market
+from battery_dispatch.values.pnl import PnlRollup
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+    from battery_dispatch.core import ScenarioTimeline
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# A checkpoint directory holds the scenario's timeline, written once as .npy files
+# that are memory-mapped on resume, and a small state file that is replaced
+# atomically every checkpoint_every steps. The energy ledger grows with every
+# settlement, so its new entries are appended to a file of their own rather than
+# rewritten each time, which keeps every checkpoint the same size. There's nothing
+# random in the simulation, so the loop position and the battery are all the state
+# there is
+
+CHECKPOINT_EVERY_STEPS = 5000
+STATE_FILE = "state.pickle"
+LEDGER_FILE = "energy_ledger.bin"
+TIMELINE_DIRECTORY = "timeline"
+TIMELINE_FILES = (
+    "timestamps.npy",
+    "highest.npy",
+    "lowest.npy",
+    "interval_indices.npy",
+    "interval_start_masks.npy",
+    "metadata.json",
+)
+# Each settlement's start time, as int64 nanoseconds, then its grid import, grid
+# export and losses, as float64
+LEDGER_ENTRY_FIELDS = [
+    ("start_time_ns", "<i8"),
+    ("grid_import_mwh", "<f8"),
+    ("grid_export_mwh", "<f8"),
+    ("losses_mwh", "<f8"),
+]
+LEDGER_ENTRY_BYTES = 32
+
+
+class CheckpointError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class CommitmentCheckpoint:
+    # Markets are referred to by position, so a checkpoint never holds price data
+    market_index: int
+    commitment_type: BatteryCommitmentType
+    energy_mwh: float
+    start_time_ns: int
+    end_time_ns: int
+
+
+@dataclasses.dataclass(frozen=True)
+class SimulationCheckpoint:
+    fingerprint: str
+    # Next timeline position to run
+    position: int
+    steps_evaluated: int
+    state_of_charge_mwh: float
+    initial_state_of_charge_mwh: float
+    revenue: float
+    cost: float
+    degradation_cost: float
+    throughput_mwh: float
+    commitments: tuple[CommitmentCheckpoint, ...]
+    rainflow_counter: RainflowCounter
+    # How many of the ledger file's entries belong to this checkpoint
+    ledger_entries: int
+    # Sized by the markets' date range, so it doesn't grow as the run goes on
+    pnl_rollup: PnlRollup | None
+
+    @classmethod
+    def capture(
+        cls,
+        *,
+        fingerprint: str,
+        battery: Battery,
+        all_markets: list[Market],
+        position: int,
+        steps_evaluated: int,
+    ) -> SimulationCheckpoint:
+        market_indices = {id(market): index for index, market in enumerate(all_markets)}
+        return cls(
+            fingerprint=fingerprint,
+            position=position,
+            steps_evaluated=steps_evaluated,
+            state_of_charge_mwh=battery.state_of_charge_mwh,
+            initial_state_of_charge_mwh=battery.initial_state_of_charge_mwh,
+            revenue=battery.revenue,
+            cost=battery.cost,
+            degradation_cost=battery.degradation_cost,
+            throughput_mwh=battery.throughput_mwh,
+            commitments=tuple(
+                CommitmentCheckpoint(
+                    market_index=market_indices[id(commitment.market)],
+                    commitment_type=commitment.commitment_type,
+                    energy_mwh=commitment.energy_mwh,
+                    start_time_ns=pd.Timestamp(commitment.start_time).value,
+                    end_time_ns=pd.Timestamp(commitment.end_time).value,
+                )
+                for commitment in battery.commitments
+            ),
+            rainflow_counter=battery.rainflow_counter,
+            ledger_entries=len(battery.energy_ledger),
+            pnl_rollup=battery.pnl_rollup,
+        )
+
+    def restore(
+        self,
+        *,
+        battery: Battery,
+        all_markets: list[Market],
+        energy_ledger: EnergyLedger,
+    ) -> None:
+        battery.state_of_charge_mwh = self.state_of_charge_mwh
+        battery.initial_state_of_charge_mwh = self.initial_state_of_charge_mwh
+        battery.revenue = self.revenue
+        battery.cost = self.cost
+        battery.degradation_cost = self.degradation_cost
+        battery.throughput_mwh = self.throughput_mwh
+        battery.rainflow_counter = self.rainflow_counter
+        battery.energy_ledger = energy_ledger
+        battery.pnl_rollup = self.pnl_rollup
+        battery.commitments = [
+            BatteryCommitment(
+                market=all_markets[commitment.market_index],
+                commitment_type=commitment.commitment_type,
+                energy_mwh=commitment.energy_mwh,
+                start_time=pd.Timestamp(commitment.start_time_ns, unit="ns"),
+                end_time=pd.Timestamp(commitment.end_time_ns, unit="ns"),
+            )
+            for commitment in self.commitments
+        ]
+
+
+@dataclasses.dataclass
+class SimulationCheckpointer:
+    directory: Path
+    fingerprint: str
+    checkpoint_every: int = CHECKPOINT_EVERY_STEPS
+    _last_position: int = 0
+    _ledger_entries_saved: int = 0
+
+    @classmethod
+    def open(
+        cls,
+        *,
+        directory: str,
+        battery: Battery,
+        all_markets: list[Market],
+        number_of_hours_to_look_ahead: float | None,
+        checkpoint_every: int = CHECKPOINT_EVERY_STEPS,
+    ) -> SimulationCheckpointer:
+        if checkpoint_every < 1:
+            raise ValueError("checkpoint_every must be at least 1")
+
+        return cls(
+            directory=Path(directory),
+            fingerprint=scenario_fingerprint(
+                battery=battery,
+                all_markets=all_markets,
+                number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+            ),
+            checkpoint_every=checkpoint_every,
+        )
+
+    def load_timeline(
+        self, *, build_timeline: Callable[[], ScenarioTimeline]
+    ) -> ScenarioTimeline:
+        # The timeline is only derived on the first run of a scenario
+        timeline_directory = self.directory / TIMELINE_DIRECTORY
+        if (timeline_directory / "metadata.json").is_file():
+            return load_timeline(timeline_directory, fingerprint=self.fingerprint)
+
+        timeline = build_timeline()
+        save_timeline(timeline, timeline_directory, fingerprint=self.fingerprint)
+        return timeline
+
+    def resume(self, *, battery: Battery, all_markets: list[Market]) -> tuple[int, int]:
+        # Returns the position to carry on from and the steps already evaluated
+        state_path = self.directory / STATE_FILE
+        if not state_path.is_file():
+            return 0, 0
+
+        with state_path.open("rb") as state_file:
+            checkpoint = pickle.load(state_file)
+        if (
+            not isinstance(checkpoint, SimulationCheckpoint)
+            or checkpoint.fingerprint != self.fingerprint
+        ):
+            raise CheckpointError(
+                f"The checkpoint in {self.directory} is for a different scenario"
+            )
+
+        checkpoint.restore(
+            battery=battery,
+            all_markets=all_markets,
+            energy_ledger=self._load_ledger(entries=checkpoint.ledger_entries),
+        )
+        self._last_position = checkpoint.position
+        self._ledger_entries_saved = checkpoint.ledger_entries
+        return checkpoint.position, checkpoint.steps_evaluated
+
+    def step_completed(
+        self,
+        *,
+        battery: Battery,
+        all_markets: list[Market],
+        position: int,
+        steps_evaluated: int,
+    ) -> None:
+        # position is the next one to run
+        if position - self._last_position < self.checkpoint_every:
+            return
+
+        self.save(
+            battery=battery,
+            all_markets=all_markets,
+            position=position,
+            steps_evaluated=steps_evaluated,
+        )
+
+    def save(
+        self,
+        *,
+        battery: Battery,
+        all_markets: list[Market],
+        position: int,
+        steps_evaluated: int,
+    ) -> None:
+        checkpoint = SimulationCheckpoint.capture(
+            fingerprint=self.fingerprint,
+            battery=battery,
+            all_markets=all_markets,
+            position=position,
+            steps_evaluated=steps_evaluated,
+        )
+        # Written to the side and renamed, so a crash mid-write leaves the previous
+        # checkpoint intact. The ledger goes first, as the state counts its entries
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._append_ledger(battery.energy_ledger)
+        temporary_path = self.directory / f"{STATE_FILE}.tmp"
+        with temporary_path.open("wb") as state_file:
+            pickle.dump(checkpoint, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self.directory / STATE_FILE)
+        self._last_position = position
+
+    def finish(self) -> None:
+        # A finished run has nothing to resume. Only the checkpoint's own files are
+        # removed, as the directory may hold others
+        for name in (STATE_FILE, f"{STATE_FILE}.tmp", LEDGER_FILE):
+            (self.directory / name).unlink(missing_ok=True)
+        timeline_directory = self.directory / TIMELINE_DIRECTORY
+        if timeline_directory.is_dir():
+            for name in TIMELINE_FILES:
+                (timeline_directory / name).unlink(missing_ok=True)
+            if not any(timeline_directory.iterdir()):
+                timeline_directory.rmdir()
+
+    def _append_ledger(self, energy_ledger: EnergyLedger) -> None:
+        saved = self._ledger_entries_saved
+        entries = np.empty(len(energy_ledger) - saved, dtype=LEDGER_ENTRY_FIELDS)
+        entries["start_time_ns"] = np.frombuffer(
+            energy_ledger.start_times_ns, dtype=np.int64
+        )[saved:]
+        for name in ("grid_import_mwh", "grid_export_mwh", "losses_mwh"):
+            entries[name] = np.frombuffer(getattr(energy_ledger, name))[saved:]
+        with (self.directory / LEDGER_FILE).open("ab") as ledger_file:
+            ledger_file.write(entries.tobytes())
+        self._ledger_entries_saved = len(energy_ledger)
+
+    def _load_ledger(self, *, entries: int) -> EnergyLedger:
+        ledger_path = self.directory / LEDGER_FILE
+        size = entries * LEDGER_ENTRY_BYTES
+        saved_size = ledger_path.stat().st_size if ledger_path.is_file() else 0
+        if saved_size < size:
+            raise CheckpointError(
+                f"The energy ledger in {self.directory} is missing entries"
+            )
+        if saved_size > size:
+            # Entries appended by a save that crashed before its state was written
+            os.truncate(ledger_path, size)
+
+        rows = (
+            np.fromfile(ledger_path, dtype=LEDGER_ENTRY_FIELDS)
+            if entries > 0
+            else np.empty(0, dtype=LEDGER_ENTRY_FIELDS)
+        )
+        return EnergyLedger(
+            start_times_ns=array(
+                "q", np.ascontiguousarray(rows["start_time_ns"]).tobytes()
+            ),
+            grid_import_mwh=array(
+                "d", np.ascontiguousarray(rows["grid_import_mwh"]).tobytes()
+            ),
+            grid_export_mwh=array(
+                "d", np.ascontiguousarray(rows["grid_export_mwh"]).tobytes()
+            ),
+            losses_mwh=array("d", np.ascontiguousarray(rows["losses_mwh"]).tobytes()),
+        )
+
+
+def scenario_fingerprint(
+    *,
+    battery: Battery,
+    all_markets: list[Market],
+    number_of_hours_to_look_ahead: float | None,
+) -> str:
+    # Identifies everything a checkpoint depends on, so resuming a different
+    # scenario, battery or set of prices is refused rather than silently mixed
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(
+        repr(
+            (
+                battery.capacity_mwh,
+                battery.max_charge_mw,
+                battery.max_discharge_mw,
+                battery.charge_efficiency,
+                battery.discharge_efficiency,
+                battery.initial_state_of_charge_mwh,
+                battery.degradation,
+                number_of_hours_to_look_ahead,
+            )
+        ).encode()
+    )
+    for market in all_markets:
+        digest.update(repr((market.name, market.interval_hours)).encode())
+        digest.update(to_nanoseconds(market.prices.index).tobytes())
+        digest.update(market.prices.to_numpy(dtype=float).tobytes())
+        digest.update(market.highest_price_across_next_n_hours.to_numpy().tobytes())
+        digest.update(market.lowest_price_across_next_n_hours.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def save_timeline(
+    timeline: ScenarioTimeline, directory: Path, *, fingerprint: str
+) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    alignment = timeline.alignment
+    np.save(directory / "timestamps.npy", to_nanoseconds(timeline.timestamps))
+    np.save(
+        directory / "highest.npy",
+        timeline.highest_price_across_next_n_hours.to_numpy(dtype=float),
+    )
+    np.save(
+        directory / "lowest.npy",
+        timeline.lowest_price_across_next_n_hours.to_numpy(dtype=float),
+    )
+    np.save(directory / "interval_indices.npy", np.stack(alignment.interval_indices))
+    np.save(
+        directory / "interval_start_masks.npy",
+        np.stack(alignment.interval_start_masks),
+    )
+    # Metadata goes last, as its presence marks the timeline as complete
+    (directory / "metadata.json").write_text(
+        json.dumps(
+            {
+                "fingerprint": fingerprint,
+                "base_interval_ns": alignment.base_interval_ns,
+                "market_lengths": alignment.market_lengths,
+            }
+        )
+    )
+
+
+def load_timeline(directory: Path, *, fingerprint: str) -> ScenarioTimeline:
+    from battery_dispatch.core import ScenarioTimeline
+
+    metadata = json.loads((directory / "metadata.json").read_text())
+    if metadata["fingerprint"] != fingerprint:
+        raise CheckpointError(
+            f"The timeline in {directory} is for a different scenario"
+        )
+
+    timestamps = pd.DatetimeIndex(
+        np.load(directory / "timestamps.npy", mmap_mode="r").view("datetime64[ns]")
+    )
+    interval_indices = np.load(directory / "interval_indices.npy", mmap_mode="r")
+    interval_start_masks = np.load(
+        directory / "interval_start_masks.npy", mmap_mode="r"
+    )
+    return ScenarioTimeline(
+        timestamps=timestamps,
+        highest_price_across_next_n_hours=pd.Series(
+            np.load(directory / "highest.npy", mmap_mode="r"), index=timestamps
+        ),
+        lowest_price_across_next_n_hours=pd.Series(
+            np.load(directory / "lowest.npy", mmap_mode="r"), index=timestamps
+        ),
+        alignment=MarketAlignment(
+            base_timestamps=timestamps,
+            base_interval_ns=metadata["base_interval_ns"],
+            interval_indices=list(interval_indices),
+            interval_start_masks=list(interval_start_masks),
+            market_lengths=metadata["market_lengths"],
+        ),
+    )
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import argparse
+import socketserver
+import sys
+import time
+
+from battery_dispatch.config import ConfigError, ScenarioConfig, load_scenario_files
+
+# Keep the imports here to the standard library and config so `--help` and
+# `validate` return immediately; the simulation is only imported by `run`
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m battery_dispatch",
+        description="Run battery dispatch scenarios described in TOML/YAML files.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run every scenario in the files")
+    run_parser.add_argument("scenario_files", nargs="+", metavar="SCENARIO_FILE")
+    run_parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Results file, written as CSV or JSON depending on its extension",
+    )
+    run_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1, run in this process)",
+    )
+    run_parser.add_argument(
+        "--checkpoint-dir",
+        help="Checkpoint each scenario here, and resume from it if a previous run died",
+    )
+    run_parser.add_argument(
+        "--results-db",
+        help="SQLite results store; scenarios already in it are not run again",
+    )
+    run_parser.add_argument(
+        "--store-timelines",
+        action="store_true",
+        help="Also keep each new scenario's settlements in the results store",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve dispatch decisions over the scenario files' markets"
+    )
+    serve_parser.add_argument("scenario_files", nargs="+", metavar="SCENARIO_FILE")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument(
+        "--socket", help="Listen on this Unix socket instead of a TCP port"
+    )
+    serve_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for valuations and simulations (default: 1, in-process)",
+    )
+
+    validate_parser = subparsers.add_parser(
+        "validate", help="Check the scenario files without running them"
+    )
+    validate_parser.add_argument("scenario_files", nargs="+", metavar="SCENARIO_FILE")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    try:
+        scenarios = load_scenario_files(args.scenario_files)
+    except ConfigError as error:
+        print(f"Invalid scenario config: {error}", file=sys.stderr)
+        return 2
+
+    if args.command == "validate":
+        print(f"{len(scenarios)} scenario(s) OK")
+        return 0
+
+    if args.workers < 1:
+        print("--workers must be at least 1", file=sys.stderr)
+        return 2
+    if args.command == "serve":
+        return _serve(args, scenarios)
+
+    assert args.command == "run"
+    if args.store_timelines and args.results_db is None:
+        print("--store-timelines needs --results-db", file=sys.stderr)
+        return 2
+
+    from battery_dispatch.batch import run_scenarios, write_results
+
+    start = time.perf_counter()
+    results = run_scenarios(
+        scenarios,
+        workers=args.workers,
+        checkpoint_directory=args.checkpoint_dir,
+        results_path=args.results_db,
+        store_timelines=args.store_timelines,
+    )
+    write_results(results, args.output)
+    print(
+        f"Ran {len(results)} scenario(s) in {time.perf_counter() - start:.1f}s, "
+        f"results written to {args.output}"
+    )
+    return 0
+
+
+def _serve(args: argparse.Namespace, scenarios: list[ScenarioConfig]) -> int:
+    from battery_dispatch.service import DispatchService, create_server
+
+    market_configs = [market for scenario in scenarios for market in scenario.markets]
+    try:
+        service = DispatchService.start(
+            market_configs=market_configs, workers=args.workers
+        )
+    except ValueError as error:
+        print(f"Invalid scenario config: {error}", file=sys.stderr)
+        return 2
+
+    server = create_server(
+        service, host=args.host, port=args.port, socket_path=args.socket
+    )
+    if args.socket is not None:
+        address = args.socket
+    else:
+        assert isinstance(server, socketserver.TCPServer)
+        address = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving {len(service.markets)} market(s) on {address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
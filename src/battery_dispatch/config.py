@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import dataclasses
+import tomllib
+from pathlib import Path
+from typing import Any
+
+# Only the standard library is imported here so scenario files can be validated
+# without paying for pandas/numpy
+
+STRATEGIES = ("lookahead",)
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class MarketConfig:
+    name: str
+    csv_path: str
+    interval_hours: float
+    # Directory of a saved ForecastStore; without one the lookahead sees realised prices
+    forecast_path: str | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class DegradationConfig:
+    throughput_cost_per_mwh: float = 0.0
+    cycle_cost: float = 0.0
+    cycle_depth_exponent: float = 1.0
+
+
+@dataclasses.dataclass(frozen=True)
+class BatteryConfig:
+    capacity_mwh: float
+    max_charge_mw: float
+    max_discharge_mw: float
+    charge_efficiency: float = 1.0
+    discharge_efficiency: float = 1.0
+    state_of_charge_mwh: float = 0.0
+    degradation: DegradationConfig | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class ScenarioConfig:
+    name: str
+    markets: tuple[MarketConfig, ...]
+    battery: BatteryConfig
+    strategy: str = "lookahead"
+    lookahead_hours: float = 3.0
+
+
+def load_scenario_files(paths: list[str]) -> list[ScenarioConfig]:
+    scenarios: list[ScenarioConfig] = []
+    for path in paths:
+        scenarios += load_scenario_file(path)
+
+    names = [scenario.name for scenario in scenarios]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ConfigError(f"Duplicate scenario names: {', '.join(duplicates)}")
+    return scenarios
+
+
+def load_scenario_file(path: str) -> list[ScenarioConfig]:
+    config_path = Path(path)
+    if not config_path.is_file():
+        raise ConfigError(f"Scenario file not found: {path}")
+
+    raw = _read_raw_config(config_path)
+    try:
+        return _parse_scenarios(raw, base_dir=config_path.parent)
+    except ConfigError as error:
+        raise ConfigError(f"{path}: {error}") from error
+
+
+def _read_raw_config(config_path: Path) -> dict[str, Any]:
+    if config_path.suffix == ".toml":
+        with config_path.open("rb") as config_file:
+            try:
+                return tomllib.load(config_file)
+            except tomllib.TOMLDecodeError as error:
+                raise ConfigError(f"{config_path}: {error}") from error
+
+    if config_path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as error:
+            raise ConfigError(
+                "PyYAML is required to read YAML scenario files (pip install pyyaml)"
+            ) from error
+
+        with config_path.open() as config_file:
+            try:
+                raw = yaml.safe_load(config_file)
+            except yaml.YAMLError as error:
+                raise ConfigError(f"{config_path}: {error}") from error
+        if not isinstance(raw, dict):
+            raise ConfigError(f"{config_path}: expected a mapping at the top level")
+        return raw
+
+    raise ConfigError(
+        f"Unsupported scenario file type {config_path.suffix!r}, "
+        "expected .toml, .yaml or .yml"
+    )
+
+
+def _parse_scenarios(raw: dict[str, Any], *, base_dir: Path) -> list[ScenarioConfig]:
+    _check_keys(raw, {"markets", "scenarios"}, "top level")
+    raw_markets = _get(raw, "markets", dict)
+    markets = {
+        name: _parse_market(
+            name, _expect(raw_market, dict, f"markets.{name}"), base_dir
+        )
+        for name, raw_market in raw_markets.items()
+    }
+
+    scenarios = []
+    for index, raw_scenario in enumerate(_get(raw, "scenarios", list)):
+        scenario = _expect(raw_scenario, dict, f"scenarios[{index}]")
+        name = _get(scenario, "name", str, f"scenarios[{index}]")
+        scenarios.append(_parse_scenario(name, scenario, markets))
+    return scenarios
+
+
+def _parse_market(name: str, raw: dict[str, Any], base_dir: Path) -> MarketConfig:
+    context = f"markets.{name}"
+    csv_path = Path(_get(raw, "csv_path", str, context))
+    if not csv_path.is_absolute():
+        csv_path = base_dir / csv_path
+    if not csv_path.is_file():
+        raise ConfigError(f"{context}.csv_path: file not found: {csv_path}")
+
+    interval_hours = _get_number(raw, "interval_hours", context)
+    if interval_hours <= 0:
+        raise ConfigError(f"{context}.interval_hours must be positive")
+
+    forecast_path = None
+    if "forecast_path" in raw:
+        forecast_path = Path(_get(raw, "forecast_path", str, context))
+        if not forecast_path.is_absolute():
+            forecast_path = base_dir / forecast_path
+        if not forecast_path.is_dir():
+            raise ConfigError(
+                f"{context}.forecast_path: directory not found: {forecast_path}"
+            )
+
+    return MarketConfig(
+        name=name,
+        csv_path=str(csv_path),
+        interval_hours=interval_hours,
+        forecast_path=str(forecast_path) if forecast_path is not None else None,
+    )
+
+
+def _parse_scenario(
+    name: str, raw: dict[str, Any], markets: dict[str, MarketConfig]
+) -> ScenarioConfig:
+    context = f"scenarios.{name}"
+    _check_keys(
+        raw, {field.name for field in dataclasses.fields(ScenarioConfig)}, context
+    )
+    market_names = _get(raw, "markets", list, context)
+    if not market_names:
+        raise ConfigError(f"{context}.markets must list at least one market")
+    unknown = [market for market in market_names if market not in markets]
+    if unknown:
+        raise ConfigError(f"{context}.markets: unknown markets {unknown}")
+
+    strategy = raw.get("strategy", "lookahead")
+    if strategy not in STRATEGIES:
+        raise ConfigError(
+            f"{context}.strategy: unknown strategy {strategy!r}, "
+            f"expected one of {list(STRATEGIES)}"
+        )
+
+    lookahead_hours = _get_number(raw, "lookahead_hours", context, default=3.0)
+    if lookahead_hours <= 0:
+        raise ConfigError(f"{context}.lookahead_hours must be positive")
+
+    return ScenarioConfig(
+        name=name,
+        markets=tuple(markets[market] for market in market_names),
+        battery=parse_battery(_get(raw, "battery", dict, context), context),
+        strategy=strategy,
+        lookahead_hours=lookahead_hours,
+    )
+
+
+def parse_battery(raw: dict[str, Any], context: str) -> BatteryConfig:
+    context = f"{context}.battery"
+    _check_keys(
+        raw, {field.name for field in dataclasses.fields(BatteryConfig)}, context
+    )
+
+    numbers = {
+        field.name: _get_number(raw, field.name, context, default=field.default)
+        for field in dataclasses.fields(BatteryConfig)
+        if field.name != "degradation"
+    }
+    for name in ("capacity_mwh", "max_charge_mw", "max_discharge_mw"):
+        if numbers[name] <= 0:
+            raise ConfigError(f"{context}.{name} must be positive")
+    for name in ("charge_efficiency", "discharge_efficiency"):
+        if not 0 < numbers[name] <= 1:
+            raise ConfigError(f"{context}.{name} must be in (0, 1]")
+    if not 0 <= numbers["state_of_charge_mwh"] <= numbers["capacity_mwh"]:
+        raise ConfigError(f"{context}.state_of_charge_mwh must be within capacity")
+
+    degradation = None
+    if "degradation" in raw:
+        raw_degradation = _get(raw, "degradation", dict, context)
+        degradation_context = f"{context}.degradation"
+        _check_keys(
+            raw_degradation,
+            {field.name for field in dataclasses.fields(DegradationConfig)},
+            degradation_context,
+        )
+        degradation = DegradationConfig(
+            **{
+                field.name: _get_number(
+                    raw_degradation, field.name, degradation_context, field.default
+                )
+                for field in dataclasses.fields(DegradationConfig)
+            }
+        )
+
+    return BatteryConfig(**numbers, degradation=degradation)
+
+
+_MISSING = object()
+
+
+def _get(raw: dict[str, Any], key: str, kind: type, context: str = "") -> Any:
+    location = f"{context}.{key}" if context else key
+    if key not in raw:
+        raise ConfigError(f"{location} is required")
+    return _expect(raw[key], kind, location)
+
+
+def _get_number(
+    raw: dict[str, Any], key: str, context: str, default: Any = _MISSING
+) -> float:
+    location = f"{context}.{key}"
+    if key not in raw:
+        if default is _MISSING or default is dataclasses.MISSING:
+            raise ConfigError(f"{location} is required")
+        return float(default)
+
+    value = raw[key]
+    # bool is a subclass of int, but `capacity_mwh = true` is certainly a mistake
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ConfigError(f"{location} must be a number, got {value!r}")
+    return float(value)
+
+
+def _expect(value: Any, kind: type, location: str) -> Any:
+    if not isinstance(value, kind):
+        raise ConfigError(
+            f"{location} must be a {kind.__name__}, got {type(value).__name__}"
+        )
+    return value
+
+
+def _check_keys(raw: dict[str, Any], allowed: set[str], context: str) -> None:
+    unknown = sorted(set(raw) - allowed)
+    if unknown:
+        raise ConfigError(f"{context}: unknown keys {unknown}")
@@ -1,19 +1,31 @@
 from __future__ import annotations
 
-import copy
 import dataclasses
+from functools import cached_property
+from typing import TYPE_CHECKING
 
-import pandas as pd
-
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.checkpoint import CHECKPOINT_EVERY_STEPS, SimulationCheckpointer
+from battery_dispatch.values.alignment import MarketAlignment, interval_nanoseconds
 from battery_dispatch.values.battery import (
     Battery,
     BatteryCommitment,
     BatteryCommitmentType,
-    BatteryState,
     CannotAddCommitmentError,
-    CannotDispatchBatteryError,
 )
+from battery_dispatch.values.forecast import ForecastError, ForecastStore
+from battery_dispatch.values.ledger import EnergyBalanceError
 from battery_dispatch.values.market import Market
+from battery_dispatch.values.price_validation import validate_price_series
+from battery_dispatch.values.range_query import RangeExtremaIndex
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
 
 
 @dataclasses.dataclass
@@ -22,68 +34,133 @@ class CommitmentEvaluation:
     revenue: float
 
 
+@dataclasses.dataclass(frozen=True)
+class SimulationResult:
+    revenue: float
+    cost: float
+    final_state_of_charge_mwh: float
+    throughput_mwh: float
+    degradation_cost: float
+    # How many timestamps the dispatch logic ran at, not part of the outcome
+    steps_evaluated: int = dataclasses.field(default=0, compare=False)
+
+    @property
+    def profit(self) -> float:
+        return self.revenue - self.cost
+
+
 NUMBER_OF_HOURS_TO_LOOK_AHEAD = 3
+# Layout of the price CSVs
+TIMESTAMP_COLUMN = "timestamp"
+PRICE_COLUMN = "price [£/MWh]"
+TIMESTAMP_FORMAT = "%m/%d/%y %H:%M"
+# Relative allowance when screening for dispatch candidates up front
+CANDIDATE_PROFIT_SLACK = 1e-9
 
 
 def _get_highest_price_across_next_n_hours_series(
     price_series: pd.Series[float],
     number_of_intervals_to_look_ahead: int,
 ) -> pd.Series[float]:
-    highest_price_across_next_n_hours = pd.Series(
-        [
-            price_series[
-                i + 1 : i + number_of_intervals_to_look_ahead + 1
-            ].max()  # if i + number_of_intervals_to_look_ahead < len(price_series)
-            for i in range(len(price_series))
-        ]
+    range_index = RangeExtremaIndex.build(price_series.to_numpy(dtype=float))
+    return pd.Series(
+        range_index.max_over_next(number_of_intervals_to_look_ahead),
+        index=price_series.index,
     )
-    highest_price_across_next_n_hours.index = price_series.index
-    return highest_price_across_next_n_hours
 
 
 def _get_lowest_price_across_next_n_hours_series(
     price_series: pd.Series[float],
     number_of_intervals_to_look_ahead: int,
 ) -> pd.Series[float]:
-    lowest_price_across_next_n_hours = pd.Series(
-        [
-            price_series[
-                i + 1 : i + number_of_intervals_to_look_ahead + 1
-            ].min()  # if i + number_of_intervals_to_look_ahead < len(price_series)
-            for i in range(len(price_series))
-        ]
+    range_index = RangeExtremaIndex.build(price_series.to_numpy(dtype=float))
+    return pd.Series(
+        range_index.min_over_next(number_of_intervals_to_look_ahead),
+        index=price_series.index,
     )
-    lowest_price_across_next_n_hours.index = price_series.index
-    return lowest_price_across_next_n_hours
 
 
-def create_market_from_data(csv_path: str, interval_hours: float) -> Market:
+def load_price_series(csv_path: str) -> pd.Series[float]:
     prices = pd.read_csv(csv_path, parse_dates=True)
-    price_series = pd.Series(
-        data=prices["price [£/MWh]"].values,
-        index=pd.to_datetime(prices["timestamp"], format="%m/%d/%y %H:%M"),
-    )
-    number_of_intervals_to_look_ahead = int(
-        NUMBER_OF_HOURS_TO_LOOK_AHEAD / interval_hours
+    return pd.Series(
+        data=prices[PRICE_COLUMN].values,
+        index=pd.to_datetime(prices[TIMESTAMP_COLUMN], format=TIMESTAMP_FORMAT),
     )
 
-    highest_price_across_next_n_hours = _get_highest_price_across_next_n_hours_series(
-        price_series=price_series,
-        number_of_intervals_to_look_ahead=number_of_intervals_to_look_ahead,
-    )
 
-    lowest_price_across_next_n_hours = _get_lowest_price_across_next_n_hours_series(
-        price_series=price_series,
-        number_of_intervals_to_look_ahead=number_of_intervals_to_look_ahead,
-    )
-    market = Market(
-        name=f"Market_{interval_hours}h",
-        prices=price_series,
+def create_market_from_price_series(
+    price_series: pd.Series[float],
+    interval_hours: float,
+    number_of_hours_to_look_ahead: float = NUMBER_OF_HOURS_TO_LOOK_AHEAD,
+    name: str | None = None,
+    forecasts: ForecastStore | None = None,
+    dtype: str = "float64",
+) -> Market:
+    number_of_intervals_to_look_ahead = interval_nanoseconds(
+        number_of_hours_to_look_ahead
+    ) // interval_nanoseconds(interval_hours)
+
+    if forecasts is not None:
+        # Imperfect foresight: decide on the latest forecasts, settle at realised prices
+        if forecasts.interval_hours != interval_hours:
+            raise ForecastError(
+                f"Forecasts are for {forecasts.interval_hours}h intervals, "
+                f"but the market has {interval_hours}h intervals"
+            )
+        highest_price_across_next_n_hours, lowest_price_across_next_n_hours = (
+            forecasts.lookahead_extrema(
+                interval_starts=pd.DatetimeIndex(price_series.index),
+                number_of_intervals=number_of_intervals_to_look_ahead,
+            )
+        )
+    else:
+        range_index = RangeExtremaIndex.build(price_series.to_numpy(dtype=float))
+        highest_price_across_next_n_hours = range_index.max_over_next(
+            number_of_intervals_to_look_ahead
+        )
+        lowest_price_across_next_n_hours = range_index.min_over_next(
+            number_of_intervals_to_look_ahead
+        )
+
+    return Market.from_arrays(
+        name=name if name is not None else f"Market_{interval_hours}h",
+        timestamps=pd.DatetimeIndex(price_series.index),
+        prices=price_series.to_numpy(dtype=float),
         highest_price_across_next_n_hours=highest_price_across_next_n_hours,
         lowest_price_across_next_n_hours=lowest_price_across_next_n_hours,
         interval_hours=interval_hours,
+        forecasts=forecasts,
+        dtype=dtype,
     )
-    return market
+
+
+def create_market_from_data(
+    csv_path: str,
+    interval_hours: float,
+    number_of_hours_to_look_ahead: float = NUMBER_OF_HOURS_TO_LOOK_AHEAD,
+    name: str | None = None,
+    forecasts: ForecastStore | None = None,
+    fill_policy: str = "interpolate",
+    duplicate_policy: str = "mean",
+    outlier_policy: str = "keep",
+    dtype: str = "float64",
+) -> Market:
+    price_series, validation_report = validate_price_series(
+        load_price_series(csv_path),
+        interval_hours=interval_hours,
+        fill_policy=fill_policy,
+        duplicate_policy=duplicate_policy,
+        outlier_policy=outlier_policy,
+    )
+    market = create_market_from_price_series(
+        price_series=price_series,
+        interval_hours=interval_hours,
+        number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+        name=name,
+        forecasts=forecasts,
+        dtype=dtype,
+    )
+    return dataclasses.replace(market, validation_report=validation_report)
 
 
 def run_battery_simulation() -> None:
@@ -107,238 +184,557 @@ def run_battery_simulation() -> None:
     )
 
 
-def run_battery_simulation_for_scenario(
-    battery: Battery,
+@dataclasses.dataclass(frozen=True)
+class ScenarioTimeline:
+    # Every step of the scenario's base grid, with the best lookahead prices across
+    # all markets at each of them
+    timestamps: pd.DatetimeIndex
+    highest_price_across_next_n_hours: pd.Series[float]
+    lowest_price_across_next_n_hours: pd.Series[float]
+    alignment: MarketAlignment
+
+    @cached_property
+    def highest_price_values(self) -> npt.NDArray[np.float64]:
+        return np.asarray(self.highest_price_across_next_n_hours, dtype=np.float64)
+
+    @cached_property
+    def lowest_price_values(self) -> npt.NDArray[np.float64]:
+        return np.asarray(self.lowest_price_across_next_n_hours, dtype=np.float64)
+
+
+def build_scenario_timeline(
     all_markets: list[Market],
-) -> None:
-    min_interval = min([market.interval_hours for market in all_markets])
-    max_interval = max([market.interval_hours for market in all_markets])
-
-    open_time = min([min(market.prices.index) for market in all_markets])
-    close_time = max([max(market.prices.index) for market in all_markets])
-
-    # Generate timestamps from open_time to close_time with min_interval
-    # frequency so we can consider at every interval
-    timestamps = pd.date_range(
-        start=open_time,
-        end=close_time + pd.Timedelta(hours=max_interval),
-        freq=f"{min_interval}h",
-    )
-    highest_price_across_next_n_hours = pd.Series(
-        [
-            max(
-                [
-                    market.highest_price_across_next_n_hours.get(
-                        timestamp, float("-inf")
-                    )
-                    for market in all_markets
-                ]
-            )
-            for timestamp in timestamps
+    number_of_hours_to_look_ahead: float | None = None,
+) -> ScenarioTimeline:
+    # Markets carry lookahead series for the horizon they were created with; asking
+    # for another horizon queries each market's range index instead of rebuilding it
+    if number_of_hours_to_look_ahead is None:
+        market_highest_prices = [
+            market.highest_price_across_next_n_hours for market in all_markets
         ]
-    )
-    highest_price_across_next_n_hours.index = timestamps
-
-    lowest_price_across_next_n_hours = pd.Series(
-        [
-            min(
-                [
-                    market.lowest_price_across_next_n_hours.get(timestamp, float("inf"))
-                    for market in all_markets
-                ]
-            )
-            for timestamp in timestamps
+        market_lowest_prices = [
+            market.lowest_price_across_next_n_hours for market in all_markets
         ]
+    else:
+        market_highest_prices = []
+        market_lowest_prices = []
+        for market in all_markets:
+            market_highest, market_lowest = market.price_extrema_over_next_hours(
+                number_of_hours=number_of_hours_to_look_ahead
+            )
+            market_highest_prices.append(market_highest)
+            market_lowest_prices.append(market_lowest)
+
+    # The base grid holds every market's interval starts, whatever their resolution
+    alignment = MarketAlignment.build(all_markets)
+    timestamps = alignment.base_timestamps
+
+    highest, lowest = combine_market_lookaheads(
+        alignment=alignment,
+        market_highest_prices=[
+            np.asarray(market_highest.reindex(market.prices.index), dtype=np.float64)
+            for market, market_highest in zip(all_markets, market_highest_prices)
+        ],
+        market_lowest_prices=[
+            np.asarray(market_lowest.reindex(market.prices.index), dtype=np.float64)
+            for market, market_lowest in zip(all_markets, market_lowest_prices)
+        ],
+    )
+    return ScenarioTimeline(
+        timestamps=timestamps,
+        highest_price_across_next_n_hours=pd.Series(highest, index=timestamps),
+        lowest_price_across_next_n_hours=pd.Series(lowest, index=timestamps),
+        alignment=alignment,
     )
-    lowest_price_across_next_n_hours.index = timestamps
-
-    for timestamp in timestamps:
-        # Commit commitments now, as this represents the end of the previous interval
-        battery.commit_expired_commitments(current_timestamp=timestamp)
-
-        best_commitments: list[CommitmentEvaluation] = []
-        # Effective profit because the plan is to compare against the rolling average -
-        # using this method I can only really evaluate profit at the end of the interval
-        best_effective_profit = 0.0
-
-        # Since we limit the battery to only be able to do one operation at once (charge or discharge)
-        # we are basically choosing between charging or discharging based on the best price across all markets
-        # so we can loop through all markets and find the best option to decide whether we charge or discharge
-
-        evaluations_by_battery_state: dict[BatteryState, list[CommitmentEvaluation]] = {
-            BatteryState.CHARGING: [],
-            BatteryState.DISCHARGING: [],
-        }
-
-        for battery_state in evaluations_by_battery_state.keys():
-            if (
-                battery_state is not battery.current_mode(current_timestamp=timestamp)
-                and battery.current_mode(current_timestamp=timestamp)
-                is not BatteryState.IDLE
-            ):
-                # Can't cancel commitments mid-way through, so we can't switch states
-                continue
 
-            for market in all_markets:
-                if not market.is_interval_start(timestamp=timestamp):
-                    # Battery must only commit its capacity for the entire market interval
-                    continue
 
-                price = market.prices.get(timestamp)
-                if price is None:
-                    continue
+def combine_market_lookaheads(
+    *,
+    alignment: MarketAlignment,
+    market_highest_prices: list[npt.NDArray[np.float64]],
+    market_lowest_prices: list[npt.NDArray[np.float64]],
+    positions: slice = slice(None),
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    # Combine the markets in order, only replacing the running value with a strictly
+    # better one, so NaNs at the end of a market's lookahead behave exactly like
+    # Python's max()/min() over the markets. Each market only counts at the start of
+    # its intervals
+    highest = lowest = np.empty(0)
+    for market_index, (market_highest, market_lowest) in enumerate(
+        zip(market_highest_prices, market_lowest_prices)
+    ):
+        other_highest = alignment.to_base(
+            market_index=market_index,
+            values=market_highest,
+            starts_only=True,
+            fill_value=float("-inf"),
+            positions=positions,
+        )
+        other_lowest = alignment.to_base(
+            market_index=market_index,
+            values=market_lowest,
+            starts_only=True,
+            fill_value=float("inf"),
+            positions=positions,
+        )
+        if market_index == 0:
+            highest, lowest = other_highest, other_lowest
+            continue
+        highest = np.where(~(other_highest > highest), highest, other_highest)
+        lowest = np.where(~(other_lowest < lowest), lowest, other_lowest)
+    return highest, lowest
 
-                duration = market.interval_timedelta()
 
-                if battery_state is BatteryState.CHARGING:
-                    dispatch_fn = attempt_charge
-                else:
-                    assert battery_state is BatteryState.DISCHARGING
-                    dispatch_fn = attempt_discharge
+def run_battery_simulation_for_scenario(
+    battery: Battery,
+    all_markets: list[Market],
+    output: bool = True,
+    number_of_hours_to_look_ahead: float | None = None,
+    event_driven: bool = False,
+    checkpoint_directory: str | None = None,
+    checkpoint_every: int = CHECKPOINT_EVERY_STEPS,
+    timeline: ScenarioTimeline | None = None,
+) -> SimulationResult:
+    # With a checkpoint directory the run saves its state every checkpoint_every
+    # steps, and a later call with the same scenario carries on from the last save.
+    # A timeline built earlier for the same markets and lookahead can be passed in
+    # to share it between runs
+    prebuilt_timeline = timeline
+
+    def build_timeline() -> ScenarioTimeline:
+        if prebuilt_timeline is not None:
+            return prebuilt_timeline
+        return build_scenario_timeline(
+            all_markets=all_markets,
+            number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+        )
 
-                dispatch_fn(
-                    battery_state=battery_state,
+    checkpointer = None
+    start_position = 0
+    steps_evaluated = 0
+    if checkpoint_directory is not None:
+        checkpointer = SimulationCheckpointer.open(
+            directory=checkpoint_directory,
+            battery=battery,
+            all_markets=all_markets,
+            number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+            checkpoint_every=checkpoint_every,
+        )
+        timeline = checkpointer.load_timeline(build_timeline=build_timeline)
+        start_position, steps_evaluated = checkpointer.resume(
+            battery=battery, all_markets=all_markets
+        )
+    else:
+        timeline = build_timeline()
+
+    if event_driven:
+        steps_evaluated = _run_event_driven_simulation(
+            battery=battery,
+            all_markets=all_markets,
+            timeline=timeline,
+            output=output,
+            start_position=start_position,
+            steps_evaluated=steps_evaluated,
+            checkpointer=checkpointer,
+        )
+    else:
+        for position, timestamp in enumerate(
+            timeline.timestamps[start_position:], start=start_position
+        ):
+            # Commit commitments now, as this represents the end of the previous interval
+            battery.commit_expired_commitments(
+                current_timestamp=timestamp, output=output
+            )
+            dispatch_at_timestamp(
+                battery=battery,
+                all_markets=all_markets,
+                timestamp=timestamp,
+                timeline=timeline,
+            )
+            steps_evaluated += 1
+            if checkpointer is not None:
+                checkpointer.step_completed(
                     battery=battery,
-                    duration=duration,
-                    market=market,
-                    price=price,
-                    timestamp=timestamp,
-                    highest_price_across_next_n_hours=highest_price_across_next_n_hours,
-                    lowest_price_across_next_n_hours=lowest_price_across_next_n_hours,
-                    evaluations_by_battery_state=evaluations_by_battery_state,
+                    all_markets=all_markets,
+                    position=position + 1,
+                    steps_evaluated=steps_evaluated,
                 )
 
-        # Select the best commitments
-        for (
-            battery_state,
-            potential_evaluations,
-        ) in evaluations_by_battery_state.items():
-            # Sort by highest effective profit (this is not actual revenue)
-            potential_evaluations.sort(key=lambda ev: ev.revenue, reverse=True)
-            evaluations, profit = _get_possible_evaluations(
-                potential_evaluations=potential_evaluations,
-                battery=battery,
-            )
+    result = finish_simulation(
+        battery=battery, steps_evaluated=steps_evaluated, output=output
+    )
+    if checkpointer is not None:
+        checkpointer.finish()
+    return result
+
+
+def finish_simulation(
+    *, battery: Battery, steps_evaluated: int, output: bool = True
+) -> SimulationResult:
+    audit = battery.audit_energy_balance()
+    if not audit.is_balanced:
+        raise EnergyBalanceError(
+            f"Energy balance is off by {audit.residual_mwh} MWh: {audit}"
+        )
 
-            if profit > best_effective_profit:
-                best_effective_profit = profit
-                best_commitments = evaluations
-
-        if len(best_commitments) > 0:
-            assert len(best_commitments) == 1
-            for evaluation in best_commitments:
-                commitment = evaluation.commitment
-                try:
-                    battery.add_commitments(new_commitments=[commitment])
-                except CannotAddCommitmentError:
-                    continue
-
-    print(
-        f"\n Total Revenue: {battery.revenue:.2f} GBP, Total Cost: {battery.cost:.2f} GBP, Total Profit: {battery.revenue - battery.cost:.2f} GBP, Final State of Charge: {battery.state_of_charge_mwh:.2f} MWh"
+    result = SimulationResult(
+        revenue=battery.revenue,
+        cost=battery.cost,
+        final_state_of_charge_mwh=battery.state_of_charge_mwh,
+        throughput_mwh=battery.throughput_mwh,
+        degradation_cost=battery.total_degradation_cost(),
+        steps_evaluated=steps_evaluated,
+    )
+    if output:
+        print(
+            f"\n Total Revenue: {result.revenue:.2f} GBP, Total Cost: {result.cost:.2f} GBP, Total Profit: {result.profit:.2f} GBP, Final State of Charge: {result.final_state_of_charge_mwh:.2f} MWh, "
+            f"Throughput: {result.throughput_mwh:.2f} MWh, Degradation Cost: {result.degradation_cost:.2f} GBP"
+        )
+    return result
+
+
+def find_dispatch_candidates(
+    *, battery: Battery, all_markets: list[Market], timeline: ScenarioTimeline
+) -> tuple[npt.NDArray[np.bool_], npt.NDArray[np.bool_]]:
+    # Masks over the timeline of where some market could charge or discharge. A
+    # charge needs the price below everything in the lookahead and a spread to the
+    # lookahead's best price that covers losses and wear, and vice versa for a
+    # discharge. Battery state isn't known up front, so these are supersets of
+    # where dispatch happens
+    timestamps = timeline.timestamps
+    highest = timeline.highest_price_across_next_n_hours.to_numpy(dtype=float)
+    lowest = timeline.lowest_price_across_next_n_hours.to_numpy(dtype=float)
+    round_trip_efficiency = battery.round_trip_efficiency
+    # Cycle costs only ever add to the per MWh wear, so throughput is a lower bound
+    minimum_wear_per_mwh = (
+        2 * battery.degradation.throughput_cost_per_mwh
+        if battery.degradation is not None
+        else 0.0
     )
 
+    could_charge = np.zeros(len(timestamps), dtype=bool)
+    could_discharge = np.zeros(len(timestamps), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        for market_index, market in enumerate(all_markets):
+            prices = timeline.alignment.to_base(
+                market_index=market_index,
+                values=market.prices.to_numpy(dtype=float),
+                starts_only=True,
+            )
+            interval_start = timeline.alignment.interval_start_masks[market_index]
+            # Slack for rounding, as the step computes the same profit with the
+            # energy multiplied through
+            slack = CANDIDATE_PROFIT_SLACK * (np.abs(prices) + np.abs(highest))
+            could_charge |= (
+                interval_start
+                & (prices < lowest)
+                & (
+                    highest * round_trip_efficiency - prices - minimum_wear_per_mwh
+                    > -slack
+                )
+            )
+            slack = CANDIDATE_PROFIT_SLACK * (np.abs(prices) + np.abs(lowest))
+            could_discharge |= (
+                interval_start
+                & (prices > highest)
+                & (
+                    prices - lowest / round_trip_efficiency - minimum_wear_per_mwh
+                    > -slack
+                )
+            )
+    return could_charge, could_discharge
+
 
-# TODO: Abstract common logic between attempt_charge and attempt_discharge
-def attempt_charge(
-    battery_state: BatteryState,
+def _run_event_driven_simulation(
+    *,
     battery: Battery,
-    duration: pd.Timedelta,
-    market: Market,
-    price: float,
-    timestamp: pd.DatetimeIndex,
-    highest_price_across_next_n_hours: pd.Series[float],
-    lowest_price_across_next_n_hours: pd.Series[float],
-    evaluations_by_battery_state: dict[BatteryState, list[CommitmentEvaluation]],
-) -> None:
-    energy = battery.max_charge_mw * duration.total_seconds() / 3600
-    if battery.available_capacity(current_timestamp=timestamp) < energy:
-        energy = battery.available_capacity(current_timestamp=timestamp)
-
-    cost = price * energy
-    future_best_revenue_for_energy = (
-        highest_price_across_next_n_hours[timestamp] * energy
+    all_markets: list[Market],
+    timeline: ScenarioTimeline,
+    output: bool,
+    start_position: int = 0,
+    steps_evaluated: int = 0,
+    checkpointer: SimulationCheckpointer | None = None,
+) -> int:
+    # Nothing can happen between a dispatch candidate and a commitment expiring, so
+    # jump straight between them. Every step still goes through the same code as
+    # the stepwise loop, which keeps the results identical
+    timestamps = timeline.timestamps
+    could_charge, could_discharge = find_dispatch_candidates(
+        battery=battery, all_markets=all_markets, timeline=timeline
     )
-    expected_profit = future_best_revenue_for_energy - cost
-    if expected_profit > 0 and price < lowest_price_across_next_n_hours[timestamp]:
-        charge_commitment = BatteryCommitment(
-            market=market,
-            commitment_type=BatteryCommitmentType.CHARGE,
-            energy_mwh=energy,
-            start_time=timestamp,
-            end_time=timestamp + duration,
+    candidate_positions = np.flatnonzero(could_charge | could_discharge)
+    number_of_steps = len(timestamps)
+    next_candidate = int(candidate_positions.searchsorted(start_position))
+
+    while True:
+        position = (
+            int(candidate_positions[next_candidate])
+            if next_candidate < len(candidate_positions)
+            else number_of_steps
         )
-        evaluations_by_battery_state[battery_state].append(
-            CommitmentEvaluation(
-                revenue=expected_profit,
-                commitment=charge_commitment,
+        expiry_position = number_of_steps
+        if len(battery.commitments) > 0:
+            # Commitments are ordered by end time, so only the first can expire next
+            expiry_position = int(
+                timestamps.searchsorted(battery.commitments[0].end_time, side="left")
             )
+        if expiry_position <= position:
+            position = expiry_position
+        elif _cannot_dispatch(
+            battery=battery,
+            timestamp=timestamps[position],
+            could_charge=bool(could_charge[position]),
+            could_discharge=bool(could_discharge[position]),
+        ):
+            # A full battery can't take a charge, an empty one can't discharge
+            next_candidate += 1
+            continue
+        if position >= number_of_steps:
+            break
+
+        timestamp = timestamps[position]
+        battery.commit_expired_commitments(current_timestamp=timestamp, output=output)
+        dispatch_at_timestamp(
+            battery=battery,
+            all_markets=all_markets,
+            timestamp=timestamp,
+            timeline=timeline,
         )
+        steps_evaluated += 1
+        while (
+            next_candidate < len(candidate_positions)
+            and candidate_positions[next_candidate] <= position
+        ):
+            next_candidate += 1
+        if checkpointer is not None:
+            checkpointer.step_completed(
+                battery=battery,
+                all_markets=all_markets,
+                position=position + 1,
+                steps_evaluated=steps_evaluated,
+            )
+
+    return steps_evaluated
 
 
-def attempt_discharge(
-    battery_state: BatteryState,
+def _cannot_dispatch(
+    *,
+    battery: Battery,
+    timestamp: pd.Timestamp,
+    could_charge: bool,
+    could_discharge: bool,
+) -> bool:
+    # Only valid when nothing settles at the timestamp, as the battery state seen
+    # here is then the state the step would see
+    if could_charge and battery.available_capacity(current_timestamp=timestamp) > 0:
+        return False
+    if (
+        could_discharge
+        and battery.available_state_of_charge(current_timestamp=timestamp) > 0
+    ):
+        return False
+    return True
+
+
+def dispatch_at_timestamp(
+    *,
     battery: Battery,
-    duration: pd.Timedelta,
-    market: Market,
-    price: float,
-    timestamp: pd.DatetimeIndex,
-    highest_price_across_next_n_hours: pd.Series[float],
-    lowest_price_across_next_n_hours: pd.Series[float],
-    evaluations_by_battery_state: dict[BatteryState, list[CommitmentEvaluation]],
-) -> None:
-    energy = battery.max_discharge_mw * duration.total_seconds() / 3600
-    if battery.state_of_charge_mwh < energy:
-        energy = battery.state_of_charge_mwh
-
-    revenue = price * energy
-    future_lowest_cost_for_energy = lowest_price_across_next_n_hours[timestamp] * energy
-    expected_profit = revenue - future_lowest_cost_for_energy
-    if expected_profit > 0 and price > highest_price_across_next_n_hours[timestamp]:
-        discharge_commitment = BatteryCommitment(
-            market=market,
-            commitment_type=BatteryCommitmentType.DISCHARGE,
-            energy_mwh=energy,
-            start_time=timestamp,
-            end_time=timestamp + duration,
+    all_markets: list[Market],
+    timestamp: pd.Timestamp,
+    timeline: ScenarioTimeline,
+) -> list[BatteryCommitment]:
+    # Returns the commitments taken on at this timestamp
+    best_commitments: list[CommitmentEvaluation] = []
+    # Effective profit because the plan is to compare against the rolling average -
+    # using this method I can only really evaluate profit at the end of the interval
+    best_effective_profit = 0.0
+
+    # The battery can't charge and discharge at the same time, so we choose between
+    # charging or discharging based on the best allocation of power across all markets
+
+    alignment = timeline.alignment
+    position = alignment.base_position(timestamp=timestamp)
+    highest_price = timeline.highest_price_values[position]
+    lowest_price = timeline.lowest_price_values[position]
+    markets: list[Market] = []
+    commitment_types: list[BatteryCommitmentType] = []
+    prices: list[float] = []
+    for market_index, market in enumerate(all_markets):
+        # Battery must only commit its capacity for the entire market interval
+        if not alignment.interval_start_masks[market_index][position]:
+            continue
+
+        # Prices are validated on load, so every interval has one
+        price = market.price_values[alignment.interval_indices[market_index][position]]
+        # Only buy below, or sell above, every price coming up
+        if price < lowest_price:
+            markets.append(market)
+            commitment_types.append(BatteryCommitmentType.CHARGE)
+            prices.append(price)
+        if price > highest_price:
+            markets.append(market)
+            commitment_types.append(BatteryCommitmentType.DISCHARGE)
+            prices.append(price)
+    if len(markets) == 0:
+        return []
+
+    # Every candidate is offered as much energy as the battery could take on over
+    # its market's interval, in one pass over the battery's commitments. Charging
+    # while discharging (or vice versa) can't deliver anything, as commitments
+    # can't be cancelled mid-way through to switch states
+    feasibility = battery.check_commitments(
+        energies_mwh=np.full(len(markets), np.inf),
+        commitment_types=commitment_types,
+        timestamps=timestamp,
+        interval_hours=[market.interval_hours for market in markets],
+    )
+    energies = feasibility.deliverable_mwh
+    price_values = np.array(prices, dtype=float)
+    is_charge = np.array(
+        [
+            commitment_type is BatteryCommitmentType.CHARGE
+            for commitment_type in commitment_types
+        ]
+    )
+    expected_profits = np.where(
+        is_charge,
+        # Only the round trip efficiency's share of the energy bought now can be
+        # sold later
+        highest_price * energies * battery.round_trip_efficiency
+        - price_values * energies,
+        # Replacing the energy sold now means buying back more to cover the losses
+        price_values * energies
+        - lowest_price * energies / battery.round_trip_efficiency,
+    ) - battery.round_trip_degradation_costs(energies_mwh=energies)
+
+    for commitment_type, of_type in (
+        (BatteryCommitmentType.CHARGE, is_charge),
+        (BatteryCommitmentType.DISCHARGE, ~is_charge),
+    ):
+        candidates = np.flatnonzero(of_type & (expected_profits > 0))
+        if len(candidates) == 0:
+            continue
+
+        evaluations, profit = _get_possible_evaluations(
+            markets=[markets[candidate] for candidate in candidates],
+            expected_profits=expected_profits[candidates],
+            energies=energies[candidates],
+            commitment_type=commitment_type,
+            power_mw=float(feasibility.power_headroom_mw[candidates[0]]),
+            energy_mwh=float(feasibility.energy_headroom_mwh[candidates[0]]),
+            timestamp=timestamp,
         )
-        evaluations_by_battery_state[battery_state].append(
-            CommitmentEvaluation(
-                revenue=expected_profit,
-                commitment=discharge_commitment,
+        if profit > best_effective_profit:
+            best_effective_profit = profit
+            best_commitments = evaluations
+
+    new_commitments = [evaluation.commitment for evaluation in best_commitments]
+    if len(new_commitments) > 0:
+        try:
+            battery.add_commitments(new_commitments=new_commitments)
+        except CannotAddCommitmentError:
+            return []
+    return new_commitments
+
+
+def _allocate_power_across_markets(
+    *,
+    unit_profits: list[float],
+    interval_hours: list[float],
+    power_mw: float,
+    energy_mwh: float,
+) -> list[float]:
+    # Maximise sum(unit_profit * hours * power) subject to the shared power headroom
+    # sum(power) <= power_mw and energy headroom sum(hours * power) <= energy_mwh.
+    # With only two constraints an optimal vertex uses at most two markets, so it is
+    # cheap to enumerate every vertex rather than reach for a general LP solver
+    best_profit = 0.0
+    best_powers = [0.0] * len(unit_profits)
+    if power_mw <= 0 or energy_mwh <= 0:
+        return best_powers
+
+    for i, (unit_profit_i, hours_i) in enumerate(zip(unit_profits, interval_hours)):
+        if unit_profit_i <= 0:
+            continue
+
+        power_i = min(power_mw, energy_mwh / hours_i)
+        profit = unit_profit_i * hours_i * power_i
+        if profit > best_profit:
+            best_profit = profit
+            best_powers = [0.0] * len(unit_profits)
+            best_powers[i] = power_i
+
+        for j in range(i + 1, len(unit_profits)):
+            unit_profit_j, hours_j = unit_profits[j], interval_hours[j]
+            if unit_profit_j <= 0 or hours_i == hours_j:
+                continue
+
+            # Both constraints tight: split the power so the energy headroom is used up
+            power_i = (energy_mwh - hours_j * power_mw) / (hours_i - hours_j)
+            power_j = power_mw - power_i
+            if power_i < 0 or power_j < 0:
+                continue
+
+            profit = (
+                unit_profit_i * hours_i * power_i + unit_profit_j * hours_j * power_j
             )
-        )
+            if profit > best_profit:
+                best_profit = profit
+                best_powers = [0.0] * len(unit_profits)
+                best_powers[i] = power_i
+                best_powers[j] = power_j
+
+    return [power * hours for power, hours in zip(best_powers, interval_hours)]
 
 
 def _get_possible_evaluations(
     *,
-    potential_evaluations: list[CommitmentEvaluation],
-    battery: Battery,
+    markets: list[Market],
+    expected_profits: npt.NDArray[np.float64],
+    energies: npt.NDArray[np.float64],
+    commitment_type: BatteryCommitmentType,
+    power_mw: float,
+    energy_mwh: float,
+    timestamp: pd.Timestamp,
 ) -> tuple[list[CommitmentEvaluation], float]:
-    # Make a copy of the battery to simulate commitments
-    # We could maybe use dataclasses.replace here but deepcopy is safer because of nested structures
-    battery_copy = copy.deepcopy(battery)
+    # Rank by highest effective profit per MWh (this is not actual revenue). The sort
+    # is stable so ties are broken in favour of the better market
+    unit_profits = expected_profits / energies
+    ranking = np.argsort(-unit_profits, kind="stable")
+    allocated_energies = _allocate_power_across_markets(
+        unit_profits=unit_profits[ranking].tolist(),
+        interval_hours=[markets[index].interval_hours for index in ranking],
+        power_mw=power_mw,
+        energy_mwh=energy_mwh,
+    )
 
     profit = 0.0
     evaluations: list[CommitmentEvaluation] = []
 
-    for evaluation in potential_evaluations:
-        commitment = evaluation.commitment
-        try:
-            final_commitment = battery_copy.commit(commitment=commitment, output=False)
-            # Update the final commitment to make sure we have the correct energy dispatched,
-            # as we could accidentally overestimate the profit if we're not able to dispatch the full amount
-            profit += evaluation.revenue * (
-                final_commitment.energy_mwh / commitment.energy_mwh
-            )
-            evaluation.commitment = final_commitment
-            evaluations.append(evaluation)
-
-            # Take the first successful commitment only as it only makes sense to dispatch to the best option
-            break
-
-        except CannotDispatchBatteryError:
+    for index, energy in zip(ranking.tolist(), allocated_energies):
+        if energy <= 0:
             continue
 
+        # Scale the expected profit to the energy we actually dispatch, as we
+        # could overestimate the profit if we're not able to dispatch the full amount
+        expected_profit = float(expected_profits[index]) * (
+            energy / float(energies[index])
+        )
+        profit += expected_profit
+        market = markets[index]
+        evaluations.append(
+            CommitmentEvaluation(
+                commitment=BatteryCommitment(
+                    market=market,
+                    commitment_type=commitment_type,
+                    energy_mwh=energy,
+                    start_time=timestamp,
+                    end_time=timestamp + market.interval_timedelta(),
+                ),
+                revenue=expected_profit,
+            )
+        )
+
     return evaluations, profit
 
 
@@ -0,0 +1,453 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING, Iterator
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.checkpoint import CommitmentCheckpoint
+from battery_dispatch.core import (
+    NUMBER_OF_HOURS_TO_LOOK_AHEAD,
+    ScenarioTimeline,
+    SimulationResult,
+    build_scenario_timeline,
+    combine_market_lookaheads,
+    create_market_from_price_series,
+    dispatch_at_timestamp,
+)
+from battery_dispatch.parallel import DispatchAction, fresh_battery, replay_actions
+from battery_dispatch.values.battery import Battery, BatteryCommitment
+from battery_dispatch.values.degradation import RainflowCounter
+from battery_dispatch.values.market import Market
+from battery_dispatch.values.pnl import PnlRollup
+from battery_dispatch.values.range_query import RangeExtremaIndex
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# Keeps what a run did at every step so that a price correction only re-runs the
+# steps it can affect. A revision re-simulates from the first interval whose price
+# or lookahead changed, starting from the nearest snapshot before it, and stops as
+# soon as it is past the revised window with the battery idle at the same state of
+# charge as before. From there on the old run is still valid, so its P&L trajectory
+# is kept and shifted by the difference at that step. A battery's P&L rollup is
+# shifted the same way, so with one the run is only spliced back at snapshots,
+# where the recorded rollup is known
+
+SNAPSHOT_EVERY_STEPS = 256
+TIMESTAMP_CHUNK = 64
+TRAJECTORY_FIELDS = (
+    "state_of_charge_mwh",
+    "revenue",
+    "cost",
+    "throughput_mwh",
+    "degradation_cost",
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class BatterySnapshot:
+    state_of_charge_mwh: float
+    revenue: float
+    cost: float
+    degradation_cost: float
+    throughput_mwh: float
+    commitments: tuple[CommitmentCheckpoint, ...]
+    rainflow_stack: tuple[float, ...]
+    pnl_rollup: PnlRollup | None = None
+
+    @classmethod
+    def capture(cls, *, battery: Battery, all_markets: list[Market]) -> BatterySnapshot:
+        market_indices = {id(market): index for index, market in enumerate(all_markets)}
+        return cls(
+            state_of_charge_mwh=battery.state_of_charge_mwh,
+            revenue=battery.revenue,
+            cost=battery.cost,
+            degradation_cost=battery.degradation_cost,
+            throughput_mwh=battery.throughput_mwh,
+            commitments=tuple(
+                CommitmentCheckpoint(
+                    market_index=market_indices[id(commitment.market)],
+                    commitment_type=commitment.commitment_type,
+                    energy_mwh=commitment.energy_mwh,
+                    start_time_ns=pd.Timestamp(commitment.start_time).value,
+                    end_time_ns=pd.Timestamp(commitment.end_time).value,
+                )
+                for commitment in battery.commitments
+            ),
+            rainflow_stack=tuple(battery.rainflow_counter._stack),
+            pnl_rollup=(
+                battery.pnl_rollup.copy() if battery.pnl_rollup is not None else None
+            ),
+        )
+
+    def restore(self, *, battery: Battery, all_markets: list[Market]) -> Battery:
+        # The energy ledger isn't kept, so the restored battery can't be audited
+        restored = fresh_battery(
+            battery=battery, state_of_charge_mwh=self.state_of_charge_mwh
+        )
+        restored.revenue = self.revenue
+        restored.cost = self.cost
+        restored.degradation_cost = self.degradation_cost
+        restored.throughput_mwh = self.throughput_mwh
+        restored.rainflow_counter = RainflowCounter(_stack=list(self.rainflow_stack))
+        if self.pnl_rollup is not None:
+            restored.pnl_rollup = self.pnl_rollup.copy()
+        restored.commitments = [
+            BatteryCommitment(
+                market=all_markets[commitment.market_index],
+                commitment_type=commitment.commitment_type,
+                energy_mwh=commitment.energy_mwh,
+                start_time=pd.Timestamp(commitment.start_time_ns, unit="ns"),
+                end_time=pd.Timestamp(commitment.end_time_ns, unit="ns"),
+            )
+            for commitment in self.commitments
+        ]
+        return restored
+
+
+@dataclasses.dataclass
+class IncrementalSimulation:
+    battery: Battery
+    all_markets: list[Market]
+    number_of_hours_to_look_ahead: float
+    timeline: ScenarioTimeline
+    # Battery state after settling at each step, before dispatching
+    trajectory: dict[str, npt.NDArray[np.float64]]
+    idle: npt.NDArray[np.bool_]
+    actions: dict[int, list[DispatchAction]]
+    snapshots: dict[int, BatterySnapshot]
+    final_rainflow_stack: tuple[float, ...]
+    snapshot_every: int = SNAPSHOT_EVERY_STEPS
+    # The run's P&L by market, day and month, when the battery carries a rollup
+    pnl_rollup: PnlRollup | None = None
+    # Steps simulated by the latest run or revision
+    steps_evaluated: int = 0
+
+    @classmethod
+    def run(
+        cls,
+        *,
+        battery: Battery,
+        all_markets: list[Market],
+        number_of_hours_to_look_ahead: float = NUMBER_OF_HOURS_TO_LOOK_AHEAD,
+        snapshot_every: int = SNAPSHOT_EVERY_STEPS,
+    ) -> IncrementalSimulation:
+        # The markets are rebuilt for the run's lookahead, so revisions can patch
+        # their lookahead series in place of recomputing them
+        markets = [
+            create_market_from_price_series(
+                price_series=market.prices,
+                interval_hours=market.interval_hours,
+                number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+                name=market.name,
+                forecasts=market.forecasts,
+            )
+            for market in all_markets
+        ]
+        timeline = build_scenario_timeline(all_markets=markets)
+        number_of_steps = len(timeline.timestamps)
+        simulation = cls(
+            battery=fresh_battery(
+                battery=battery, state_of_charge_mwh=battery.state_of_charge_mwh
+            ),
+            all_markets=markets,
+            number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+            timeline=timeline,
+            trajectory={
+                field: np.zeros(number_of_steps) for field in TRAJECTORY_FIELDS
+            },
+            idle=np.zeros(number_of_steps, dtype=bool),
+            actions={},
+            snapshots={},
+            final_rainflow_stack=(),
+            snapshot_every=snapshot_every,
+        )
+        simulation._simulate(
+            battery=fresh_battery(
+                battery=battery, state_of_charge_mwh=battery.state_of_charge_mwh
+            ),
+            start=0,
+            last_affected=None,
+        )
+        return simulation
+
+    @property
+    def result(self) -> SimulationResult:
+        degradation_cost = float(self.trajectory["degradation_cost"][-1])
+        if self.battery.degradation is not None:
+            # Half cycles still open at the end, as Battery.total_degradation_cost
+            degradation_cost += sum(
+                0.5
+                * self.battery.degradation.cycle_cost_for_range(
+                    range_mwh=range_mwh, capacity_mwh=self.battery.capacity_mwh
+                )
+                for range_mwh in RainflowCounter(
+                    _stack=list(self.final_rainflow_stack)
+                ).residual_ranges()
+            )
+        return SimulationResult(
+            revenue=float(self.trajectory["revenue"][-1]),
+            cost=float(self.trajectory["cost"][-1]),
+            final_state_of_charge_mwh=float(self.trajectory["state_of_charge_mwh"][-1]),
+            throughput_mwh=float(self.trajectory["throughput_mwh"][-1]),
+            degradation_cost=degradation_cost,
+            steps_evaluated=self.steps_evaluated,
+        )
+
+    def revise_prices(
+        self, *, market_index: int, revised_prices: pd.Series[float]
+    ) -> SimulationResult:
+        market = self.all_markets[market_index]
+        revised_positions = market.prices.index.get_indexer(revised_prices.index)
+        if len(revised_positions) == 0:
+            return self.result
+        if np.any(revised_positions < 0):
+            raise ValueError("Revised prices must be for intervals the market has")
+
+        first_revised = int(revised_positions.min())
+        last_revised = int(revised_positions.max())
+        prices = _with_values(
+            market.prices,
+            positions=revised_positions,
+            values=np.asarray(revised_prices, dtype=np.float64),
+        )
+
+        # A decision at interval i looks at (i, i + n], so the lookahead changes for
+        # the n intervals before the window as well as within it
+        first_affected = first_revised
+        highest = market.highest_price_across_next_n_hours
+        lowest = market.lowest_price_across_next_n_hours
+        if market.forecasts is None:
+            number_of_intervals = market.number_of_intervals_in(
+                number_of_hours=self.number_of_hours_to_look_ahead
+            )
+            first_affected = max(first_revised - number_of_intervals, 0)
+            window = RangeExtremaIndex.build(
+                prices.iloc[
+                    first_affected : last_revised + number_of_intervals
+                ].to_numpy(dtype=float)
+            )
+            length = last_revised - first_affected
+            highest = _with_values(
+                highest,
+                positions=slice(first_affected, last_revised),
+                values=window.max_over_next(number_of_intervals)[:length],
+            )
+            lowest = _with_values(
+                lowest,
+                positions=slice(first_affected, last_revised),
+                values=window.min_over_next(number_of_intervals)[:length],
+            )
+
+        self.all_markets[market_index] = dataclasses.replace(
+            market,
+            prices=prices,
+            highest_price_across_next_n_hours=highest,
+            lowest_price_across_next_n_hours=lowest,
+        )
+
+        interval_indices = self.timeline.alignment.interval_indices[market_index]
+        affected_steps = np.flatnonzero(
+            (interval_indices >= first_affected) & (interval_indices <= last_revised)
+        )
+        start, last_affected = int(affected_steps[0]), int(affected_steps[-1])
+        self._update_timeline(start=start, stop=last_affected + 1)
+
+        snapshot_position = max(
+            position for position in self.snapshots if position <= start
+        )
+        battery = self.snapshots[snapshot_position].restore(
+            battery=self.battery, all_markets=self.all_markets
+        )
+        replay_actions(
+            battery=battery,
+            all_markets=self.all_markets,
+            actions=self.actions,
+            start=snapshot_position,
+            stop=start,
+            output=False,
+        )
+        self._simulate(battery=battery, start=start, last_affected=last_affected)
+        return self.result
+
+    def _update_timeline(self, *, start: int, stop: int) -> None:
+        highest, lowest = combine_market_lookaheads(
+            alignment=self.timeline.alignment,
+            market_highest_prices=[
+                np.asarray(market.highest_price_across_next_n_hours, dtype=np.float64)
+                for market in self.all_markets
+            ],
+            market_lowest_prices=[
+                np.asarray(market.lowest_price_across_next_n_hours, dtype=np.float64)
+                for market in self.all_markets
+            ],
+            positions=slice(start, stop),
+        )
+        self.timeline = dataclasses.replace(
+            self.timeline,
+            highest_price_across_next_n_hours=_with_values(
+                self.timeline.highest_price_across_next_n_hours,
+                positions=slice(start, stop),
+                values=highest,
+            ),
+            lowest_price_across_next_n_hours=_with_values(
+                self.timeline.lowest_price_across_next_n_hours,
+                positions=slice(start, stop),
+                values=lowest,
+            ),
+        )
+
+    def _simulate(
+        self, *, battery: Battery, start: int, last_affected: int | None
+    ) -> None:
+        # Runs from start, recording as it goes. With last_affected set, stops once
+        # past it and back in step with the recorded run
+        timestamps = self.timeline.timestamps
+        market_indices = {
+            id(market): index for index, market in enumerate(self.all_markets)
+        }
+        # Both are only known at snapshots in the recorded run
+        needs_snapshot = battery.pnl_rollup is not None or (
+            battery.degradation is not None and battery.degradation.cycle_cost != 0
+        )
+
+        for position, timestamp in _iterate_from(timestamps, start=start):
+            battery.commit_expired_commitments(
+                current_timestamp=timestamp, output=False
+            )
+            if (
+                last_affected is not None
+                and position > last_affected
+                and self._has_converged(
+                    battery=battery, position=position, needs_snapshot=needs_snapshot
+                )
+            ):
+                self._splice(battery=battery, position=position)
+                self.steps_evaluated = position - start
+                return
+
+            for field in TRAJECTORY_FIELDS:
+                self.trajectory[field][position] = getattr(battery, field)
+            self.idle[position] = len(battery.commitments) == 0
+            if position % self.snapshot_every == 0:
+                self.snapshots[position] = BatterySnapshot.capture(
+                    battery=battery, all_markets=self.all_markets
+                )
+
+            new_commitments = dispatch_at_timestamp(
+                battery=battery,
+                all_markets=self.all_markets,
+                timestamp=timestamp,
+                timeline=self.timeline,
+            )
+            self.actions.pop(position, None)
+            if len(new_commitments) > 0:
+                self.actions[position] = [
+                    DispatchAction(
+                        market_index=market_indices[id(commitment.market)],
+                        commitment_type=commitment.commitment_type,
+                        energy_mwh=commitment.energy_mwh,
+                        start_time=commitment.start_time,
+                        end_time=commitment.end_time,
+                    )
+                    for commitment in new_commitments
+                ]
+
+        self.final_rainflow_stack = tuple(battery.rainflow_counter._stack)
+        self.pnl_rollup = battery.pnl_rollup
+        self.steps_evaluated = len(timestamps) - start
+
+    def _has_converged(
+        self, *, battery: Battery, position: int, needs_snapshot: bool
+    ) -> bool:
+        if not (
+            self.idle[position]
+            and len(battery.commitments) == 0
+            and battery.state_of_charge_mwh
+            == self.trajectory["state_of_charge_mwh"][position]
+        ):
+            return False
+        if not needs_snapshot:
+            return True
+        # Later cycle costs depend on the unclosed turning points too, and the
+        # rollup is spliced from the snapshot's
+        snapshot = self.snapshots.get(position)
+        return snapshot is not None and snapshot.rainflow_stack == tuple(
+            battery.rainflow_counter._stack
+        )
+
+    def _splice(self, *, battery: Battery, position: int) -> None:
+        # Everything from position on is what the recorded run did, offset by how
+        # much the books differ at this step
+        offsets = {
+            field: getattr(battery, field) - self.trajectory[field][position]
+            for field in TRAJECTORY_FIELDS
+            if field != "state_of_charge_mwh"
+        }
+        for field, offset in offsets.items():
+            self.trajectory[field][position:] += offset
+        rollup_offset = None
+        if battery.pnl_rollup is not None:
+            recorded = self.snapshots[position].pnl_rollup
+            assert recorded is not None and self.pnl_rollup is not None
+            rollup_offset = (
+                battery.pnl_rollup.daily - recorded.daily,
+                battery.pnl_rollup.monthly - recorded.monthly,
+            )
+            self.pnl_rollup = _shifted(self.pnl_rollup, offset=rollup_offset)
+        for snapshot_position, snapshot in self.snapshots.items():
+            if snapshot_position >= position:
+                self.snapshots[snapshot_position] = dataclasses.replace(
+                    snapshot,
+                    **{
+                        field: getattr(snapshot, field) + offset
+                        for field, offset in offsets.items()
+                    },
+                    pnl_rollup=(
+                        _shifted(snapshot.pnl_rollup, offset=rollup_offset)
+                        if snapshot.pnl_rollup is not None and rollup_offset is not None
+                        else snapshot.pnl_rollup
+                    ),
+                )
+
+
+def _shifted(
+    pnl_rollup: PnlRollup,
+    *,
+    offset: tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]],
+) -> PnlRollup:
+    daily_offset, monthly_offset = offset
+    return dataclasses.replace(
+        pnl_rollup,
+        daily=pnl_rollup.daily + daily_offset,
+        monthly=pnl_rollup.monthly + monthly_offset,
+    )
+
+
+def _with_values(
+    series: pd.Series[float],
+    *,
+    positions: slice | npt.NDArray[np.intp],
+    values: npt.NDArray[np.float64],
+) -> pd.Series[float]:
+    # A copy of the series with the values at the given positions replaced, keeping
+    # its dtype
+    data = series.to_numpy(copy=True)
+    data[positions] = values
+    return pd.Series(data=data, index=series.index, name=series.name)
+
+
+def _iterate_from(
+    timestamps: pd.DatetimeIndex, *, start: int
+) -> Iterator[tuple[int, pd.Timestamp]]:
+    # Iterating a DatetimeIndex boxes thousands of timestamps at a time, which would
+    # dominate a revision that only needs a few dozen steps
+    for chunk_start in range(start, len(timestamps), TIMESTAMP_CHUNK):
+        yield from enumerate(
+            timestamps[chunk_start : chunk_start + TIMESTAMP_CHUNK], start=chunk_start
+        )
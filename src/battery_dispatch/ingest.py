@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import dataclasses
+import glob
+import re
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Mapping
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.core import (
+    NUMBER_OF_HOURS_TO_LOOK_AHEAD,
+    PRICE_COLUMN,
+    TIMESTAMP_COLUMN,
+    TIMESTAMP_FORMAT,
+    create_market_from_price_series,
+)
+from battery_dispatch.values.alignment import to_nanoseconds
+from battery_dispatch.values.market import Market
+from battery_dispatch.values.price_validation import validate_price_series
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# Loads many price files at once, e.g. one CSV per market per month. Files are
+# parsed concurrently into plain timestamp and price arrays, which are cheap to
+# hand back from worker processes, and each market's arrays are concatenated once.
+# Overlapping months are resolved by validation, where the later file wins
+
+# The market is taken from the file name, e.g. n2ex_2024-01.csv or n2ex-202401.csv
+MARKET_FILE_PATTERN = r"(?P<market>.+?)[_-]\d{4}-?\d{2}\.csv"
+EXECUTORS = ("thread", "process")
+
+
+class IngestError(Exception):
+    pass
+
+
+def discover_price_files(
+    source: str, *, market_pattern: str = MARKET_FILE_PATTERN
+) -> dict[str, list[str]]:
+    # source is a directory, whose CSVs are all loaded, or a glob pattern
+    if Path(source).is_dir():
+        paths = sorted(str(path) for path in Path(source).glob("*.csv"))
+    else:
+        paths = sorted(glob.glob(source))
+    if len(paths) == 0:
+        raise IngestError(f"No price files found for {source}")
+
+    pattern = re.compile(market_pattern)
+    files_by_market: dict[str, list[str]] = {}
+    unmatched = []
+    for path in paths:
+        match = pattern.fullmatch(Path(path).name)
+        if match is None:
+            unmatched.append(Path(path).name)
+            continue
+        files_by_market.setdefault(match.group("market"), []).append(path)
+
+    if unmatched:
+        raise IngestError(
+            f"Can't tell the market of {', '.join(unmatched)} "
+            f"from the pattern {market_pattern!r}"
+        )
+    return files_by_market
+
+
+def read_price_arrays(
+    csv_path: str,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    frame = pd.read_csv(
+        csv_path,
+        usecols=[TIMESTAMP_COLUMN, PRICE_COLUMN],
+        dtype={TIMESTAMP_COLUMN: str, PRICE_COLUMN: float},
+    )
+    return (
+        to_nanoseconds(
+            pd.to_datetime(frame[TIMESTAMP_COLUMN], format=TIMESTAMP_FORMAT)
+        ),
+        frame[PRICE_COLUMN].to_numpy(dtype=float),
+    )
+
+
+def load_markets(
+    source: str,
+    *,
+    interval_hours: float | Mapping[str, float] | None = None,
+    number_of_hours_to_look_ahead: float = NUMBER_OF_HOURS_TO_LOOK_AHEAD,
+    workers: int | None = None,
+    executor: str = "process",
+    market_pattern: str = MARKET_FILE_PATTERN,
+    fill_policy: str = "interpolate",
+    duplicate_policy: str = "last",
+    dtype: str = "float64",
+) -> dict[str, Market]:
+    # Returns the markets by name. Without interval_hours, each market's interval is
+    # the most common step between its timestamps. Parsing the timestamps holds the
+    # GIL, so files are parsed in processes by default; threads only help where
+    # reading the files is the slow part
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor {executor!r}, expected one of {EXECUTORS}")
+
+    files_by_market = discover_price_files(source, market_pattern=market_pattern)
+    paths = [path for paths in files_by_market.values() for path in paths]
+    if workers == 1 or len(paths) == 1:
+        arrays = [read_price_arrays(path) for path in paths]
+    else:
+        pool: Executor = (
+            ThreadPoolExecutor(max_workers=workers)
+            if executor == "thread"
+            else ProcessPoolExecutor(max_workers=workers)
+        )
+        with pool:
+            arrays = list(pool.map(read_price_arrays, paths))
+    arrays_by_path = dict(zip(paths, arrays))
+
+    markets = {}
+    for market_name, market_paths in sorted(files_by_market.items()):
+        # Ordered by where each file starts, so later files win where they overlap
+        market_arrays = sorted(
+            (arrays_by_path[path] for path in market_paths),
+            key=lambda times_and_prices: (
+                times_and_prices[0][0] if len(times_and_prices[0]) > 0 else 0
+            ),
+        )
+        times = np.concatenate([times for times, _ in market_arrays])
+        prices = np.concatenate([prices for _, prices in market_arrays])
+        if len(times) == 0:
+            raise IngestError(f"No prices found for market {market_name}")
+
+        market_interval_hours = (
+            interval_hours.get(market_name, None)
+            if isinstance(interval_hours, Mapping)
+            else interval_hours
+        )
+        if market_interval_hours is None:
+            market_interval_hours = infer_interval_hours(times)
+
+        price_series, validation_report = validate_price_series(
+            pd.Series(prices, index=pd.DatetimeIndex(times.view("datetime64[ns]"))),
+            interval_hours=market_interval_hours,
+            fill_policy=fill_policy,
+            duplicate_policy=duplicate_policy,
+        )
+        markets[market_name] = dataclasses.replace(
+            create_market_from_price_series(
+                price_series=price_series,
+                interval_hours=market_interval_hours,
+                number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+                name=market_name,
+                dtype=dtype,
+            ),
+            validation_report=validation_report,
+        )
+    return markets
+
+
+def infer_interval_hours(times: npt.NDArray[np.int64]) -> float:
+    steps = np.diff(np.unique(times))
+    if len(steps) == 0:
+        raise IngestError("Can't infer the interval from a single timestamp")
+    step_sizes, counts = np.unique(steps, return_counts=True)
+    return float(step_sizes[np.argmax(counts)]) / 3.6e12
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import dataclasses
+import time
+from typing import TYPE_CHECKING, Callable, Sequence
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.core import build_scenario_timeline, dispatch_at_timestamp
+from battery_dispatch.optimal import SOC_STEPS, solve_optimal_dispatch
+from battery_dispatch.values.battery import (
+    Battery,
+    BatteryCommitment,
+    BatteryCommitmentType,
+)
+from battery_dispatch.values.degradation import RainflowCounter
+from battery_dispatch.values.ledger import EnergyLedger
+from battery_dispatch.values.market import Market
+
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+# Dispatch decisions for live operation, made against a deadline. The lookahead
+# heuristic answers first, from slices of the markets just long enough for its
+# lookahead, so there is always a decision to fall back on. The exact solver then
+# re-plans over progressively longer horizons while the budget lasts, trading in
+# whichever single market is worth most over the horizon. A tier is only started
+# when the previous one's time per interval says it will finish in time, and only
+# used if it did
+
+EXACT_HORIZONS_HOURS = (6.0, 12.0, 24.0, 48.0)
+
+
+@dataclasses.dataclass(frozen=True)
+class TierTiming:
+    tier: str
+    # The exact solver's horizon; None for the lookahead heuristic
+    horizon_hours: float | None
+    seconds: float
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatchDecision:
+    # Commitments to take on now, starting at the decision's timestamp. The battery
+    # itself is left unchanged
+    commitments: list[BatteryCommitment]
+    tier: str
+    horizon_hours: float | None
+    # Every tier that finished, in order, up to and including this one
+    timings: tuple[TierTiming, ...]
+    # Exact horizons that weren't started because they wouldn't have finished
+    skipped_horizons_hours: tuple[float, ...] = ()
+    # The exact horizon that was started but finished after the deadline, if any
+    overrun_horizons_hours: tuple[float, ...] = ()
+
+
+def decide_dispatch(
+    *,
+    battery: Battery,
+    all_markets: list[Market],
+    timestamp: pd.Timestamp,
+    deadline_seconds: float,
+    number_of_hours_to_look_ahead: float | None = None,
+    exact_horizons_hours: Sequence[float] = EXACT_HORIZONS_HOURS,
+    soc_steps: int = SOC_STEPS,
+    on_decision: Callable[[DispatchDecision], None] | None = None,
+) -> DispatchDecision:
+    # Returns the decision of the last tier to finish within deadline_seconds of the
+    # call. on_decision sees every decision as it's made, starting with the
+    # heuristic's, so a caller can act on the fallback straight away. A horizon
+    # that finishes after the deadline is thrown away
+    started = time.perf_counter()
+    deadline = started + deadline_seconds
+    timestamp = pd.Timestamp(timestamp)
+    markets = _tradeable_markets(all_markets=all_markets, timestamp=timestamp)
+    (commitments,) = lookahead_decisions(
+        batteries=[battery],
+        all_markets=all_markets,
+        timestamp=timestamp,
+        number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+    )
+    finished = time.perf_counter()
+    decision = DispatchDecision(
+        commitments=commitments,
+        tier="lookahead",
+        horizon_hours=None,
+        timings=(
+            TierTiming(
+                tier="lookahead", horizon_hours=None, seconds=finished - started
+            ),
+        ),
+    )
+    if on_decision is not None:
+        on_decision(decision)
+
+    # The heuristic's time per interval is the first horizon's estimate; after that
+    # each horizon's comes from the one before it
+    lookahead_hours = number_of_hours_to_look_ahead or 0.0
+    lookahead_intervals = sum(
+        market.number_of_intervals_in(number_of_hours=lookahead_hours) + 1
+        for market in markets
+    )
+    seconds_per_interval = (finished - started) / lookahead_intervals
+    horizons = sorted(exact_horizons_hours)
+    for position, horizon_hours in enumerate(horizons):
+        intervals = sum(
+            market.number_of_intervals_in(number_of_hours=horizon_hours)
+            for market in markets
+        )
+        if seconds_per_interval * intervals > deadline - time.perf_counter():
+            # Longer horizons would take longer still
+            return dataclasses.replace(
+                decision, skipped_horizons_hours=tuple(horizons[position:])
+            )
+
+        tier_started = time.perf_counter()
+        commitments = _exact_decision(
+            battery=battery,
+            markets=markets,
+            timestamp=timestamp,
+            horizon_hours=horizon_hours,
+            soc_steps=soc_steps,
+        )
+        finished = time.perf_counter()
+        if finished > deadline:
+            # Too late to act on, and the rest would be later still
+            return dataclasses.replace(
+                decision,
+                overrun_horizons_hours=(horizon_hours,),
+                skipped_horizons_hours=tuple(horizons[position + 1 :]),
+            )
+        seconds_per_interval = (finished - tier_started) / max(intervals, 1)
+        decision = DispatchDecision(
+            commitments=commitments,
+            tier="exact",
+            horizon_hours=horizon_hours,
+            timings=decision.timings
+            + (
+                TierTiming(
+                    tier="exact",
+                    horizon_hours=horizon_hours,
+                    seconds=finished - tier_started,
+                ),
+            ),
+        )
+        if on_decision is not None:
+            on_decision(decision)
+    return decision
+
+
+def lookahead_decisions(
+    *,
+    batteries: list[Battery],
+    all_markets: list[Market],
+    timestamp: pd.Timestamp,
+    number_of_hours_to_look_ahead: float | None = None,
+) -> list[list[BatteryCommitment]]:
+    # The lookahead heuristic's commitments for each battery at one gate. The
+    # batteries share the market windows and their timeline, which are most of the
+    # cost of a decision, so deciding for many at once is much cheaper than one by
+    # one. The batteries themselves are left unchanged
+    timestamp = pd.Timestamp(timestamp)
+    _tradeable_markets(all_markets=all_markets, timestamp=timestamp)
+    # The markets' own lookahead series are computed over all their data, so the
+    # interval starting now is enough for them. Any other lookahead is queried from
+    # the intervals it covers
+    windows = []
+    originals = []
+    for market in all_markets:
+        end = timestamp + market.interval_timedelta()
+        if number_of_hours_to_look_ahead is not None:
+            end += pd.Timedelta(hours=number_of_hours_to_look_ahead)
+        window = market.slice(start=timestamp, end=end)
+        if len(window.prices) > 0:
+            windows.append(window)
+            originals.append(market)
+    timeline = build_scenario_timeline(
+        all_markets=windows,
+        number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+    )
+    # Commitments settle against the markets they were made in, not the windows
+    window_markets = {id(window): market for window, market in zip(windows, originals)}
+
+    decisions = []
+    for battery in batteries:
+        # Nothing the scratch battery touches is shared with the real one: replacing
+        # re-adds the state of charge to the rainflow counter it is given, and
+        # neither the ledger nor the rollup should see a decision
+        scratch_battery = dataclasses.replace(
+            battery,
+            commitments=list(battery.commitments),
+            rainflow_counter=RainflowCounter(
+                _stack=list(battery.rainflow_counter._stack)
+            ),
+            energy_ledger=EnergyLedger(),
+            pnl_rollup=None,
+        )
+        commitments = dispatch_at_timestamp(
+            battery=scratch_battery,
+            all_markets=windows,
+            timestamp=timestamp,
+            timeline=timeline,
+        )
+        decisions.append(
+            [
+                dataclasses.replace(
+                    commitment, market=window_markets[id(commitment.market)]
+                )
+                for commitment in commitments
+            ]
+        )
+    return decisions
+
+
+def _tradeable_markets(
+    *, all_markets: list[Market], timestamp: pd.Timestamp
+) -> list[Market]:
+    # Only markets with an interval starting now can be traded in
+    markets = [
+        market
+        for market in all_markets
+        if market.is_interval_start(timestamp=timestamp) and timestamp in market.prices
+    ]
+    if len(markets) == 0:
+        raise ValueError(f"No market has an interval starting at {timestamp}")
+    return markets
+
+
+def _exact_decision(
+    *,
+    battery: Battery,
+    markets: list[Market],
+    timestamp: pd.Timestamp,
+    horizon_hours: float,
+    soc_steps: int,
+) -> list[BatteryCommitment]:
+    # The solver plans from the current state of charge, so its first move is cut
+    # down to what the battery can deliver around its open commitments
+    best_value = 0.0
+    best: tuple[Market, float] | None = None
+    for market in markets:
+        dispatch = solve_optimal_dispatch(
+            battery=battery,
+            market=market.slice(
+                start=timestamp, end=timestamp + pd.Timedelta(hours=horizon_hours)
+            ),
+            soc_steps=soc_steps,
+        )
+        value = dispatch.profit - dispatch.result.degradation_cost
+        if value > best_value:
+            best_value = value
+            best = (market, float(dispatch.grid_energy_mwh[0]))
+
+    if best is None or best[1] == 0:
+        return []
+
+    market, grid_energy_mwh = best
+    commitment_type = (
+        BatteryCommitmentType.DISCHARGE
+        if grid_energy_mwh > 0
+        else BatteryCommitmentType.CHARGE
+    )
+    feasibility = battery.check_commitments(
+        energies_mwh=[abs(grid_energy_mwh)],
+        commitment_types=commitment_type,
+        timestamps=timestamp,
+        interval_hours=[market.interval_hours],
+    )
+    energy_mwh = float(feasibility.deliverable_mwh[0])
+    if energy_mwh <= 0:
+        return []
+    return [
+        BatteryCommitment(
+            market=market,
+            commitment_type=commitment_type,
+            energy_mwh=energy_mwh,
+            start_time=timestamp,
+            end_time=timestamp + market.interval_timedelta(),
+        )
+    ]
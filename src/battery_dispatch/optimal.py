@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.core import SimulationResult
+from battery_dispatch.values.battery import POWER_TOLERANCE_MW, Battery
+from battery_dispatch.values.degradation import RainflowCounter
+from battery_dispatch.values.market import Market
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+else:
+    np = lazy_import("numpy")
+
+# Perfect-foresight dispatch of one battery in one market by backward induction over
+# a grid of states of charge. The value function (the best profit still to be made
+# from each grid level at the start of each interval) is what a solve costs, and
+# the dispatch itself is a cheap forward pass over it. Value functions are cached,
+# so re-solving with the same prices and battery only runs the forward pass. A
+# battery between two cached ones that differ in one parameter reuses their
+# interpolated value function
+#
+# Only the throughput part of the degradation model can be priced into the
+# induction: cycle costs depend on the path taken so far. They are still counted
+# in the result, from the state of charge path
+
+# Grid levels are capacity / SOC_STEPS apart, so moves smaller than a step (and
+# what's left of a move after the last whole step) are lost
+SOC_STEPS = 100
+INTERPOLABLE_PARAMETERS = ("capacity_mwh", "charge_efficiency", "discharge_efficiency")
+# Cached value functions are only interpolated between when both are within this
+# relative distance of the parameter asked for
+INTERPOLATION_TOLERANCE = 0.1
+CACHE_MAX_BYTES = 256 * 1024**2
+
+
+@dataclasses.dataclass(frozen=True)
+class ValueFunctionKey:
+    market_fingerprint: str
+    soc_steps: int
+    capacity_mwh: float
+    max_charge_mw: float
+    max_discharge_mw: float
+    charge_efficiency: float
+    discharge_efficiency: float
+    throughput_cost_per_mwh: float
+
+    @classmethod
+    def for_battery(
+        cls, *, battery: Battery, market: Market, soc_steps: int
+    ) -> ValueFunctionKey:
+        return cls(
+            market_fingerprint=market.fingerprint,
+            soc_steps=soc_steps,
+            capacity_mwh=battery.capacity_mwh,
+            max_charge_mw=battery.max_charge_mw,
+            max_discharge_mw=battery.max_discharge_mw,
+            charge_efficiency=battery.charge_efficiency,
+            discharge_efficiency=battery.discharge_efficiency,
+            throughput_cost_per_mwh=(
+                0.0
+                if battery.degradation is None
+                else battery.degradation.throughput_cost_per_mwh
+            ),
+        )
+
+    @property
+    def file_name(self) -> str:
+        return hashlib.blake2b(repr(self).encode(), digest_size=16).hexdigest()
+
+
+@dataclasses.dataclass
+class ValueFunctionCache:
+    # Least recently used value functions are evicted once those held in memory
+    # exceed max_bytes. With a spill_directory they're written there first and
+    # memory-mapped back when asked for again, rather than solved again
+    max_bytes: int = CACHE_MAX_BYTES
+    spill_directory: str | None = None
+    interpolation_tolerance: float = INTERPOLATION_TOLERANCE
+    hits: int = 0
+    misses: int = 0
+    interpolations: int = 0
+    _in_memory: OrderedDict[ValueFunctionKey, npt.NDArray[np.float64]] = (
+        dataclasses.field(default_factory=OrderedDict, repr=False)
+    )
+    _spilled: dict[ValueFunctionKey, Path] = dataclasses.field(
+        default_factory=dict, repr=False
+    )
+
+    def __len__(self) -> int:
+        return len(self._in_memory) + len(self._spilled)
+
+    @property
+    def bytes_in_memory(self) -> int:
+        return sum(values.nbytes for values in self._in_memory.values())
+
+    def get(self, key: ValueFunctionKey) -> npt.NDArray[np.float64] | None:
+        values = self._lookup(key)
+        if values is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return values
+
+    def put(self, key: ValueFunctionKey, values: npt.NDArray[np.float64]) -> None:
+        self._in_memory[key] = values
+        self._in_memory.move_to_end(key)
+        self._spilled.pop(key, None)
+        bytes_in_memory = self.bytes_in_memory
+        while bytes_in_memory > self.max_bytes and len(self._in_memory) > 1:
+            evicted_key, evicted_values = self._in_memory.popitem(last=False)
+            bytes_in_memory -= evicted_values.nbytes
+            if self.spill_directory is not None:
+                self._spill(evicted_key, evicted_values)
+
+    def interpolate(self, key: ValueFunctionKey) -> npt.NDArray[np.float64] | None:
+        # From the nearest cached value functions either side of the key, along one
+        # parameter they differ from it in
+        keys = list(self._in_memory) + list(self._spilled)
+        for parameter in INTERPOLABLE_PARAMETERS:
+            target = getattr(key, parameter)
+            below: ValueFunctionKey | None = None
+            above: ValueFunctionKey | None = None
+            for candidate in keys:
+                value = getattr(candidate, parameter)
+                if (
+                    dataclasses.replace(candidate, **{parameter: target}) != key
+                    or abs(value - target) > self.interpolation_tolerance * target
+                ):
+                    continue
+                if value < target and (
+                    below is None or value > getattr(below, parameter)
+                ):
+                    below = candidate
+                elif value > target and (
+                    above is None or value < getattr(above, parameter)
+                ):
+                    above = candidate
+
+            if below is not None and above is not None:
+                low, high = getattr(below, parameter), getattr(above, parameter)
+                weight = (target - low) / (high - low)
+                below_values = self._lookup(below)
+                above_values = self._lookup(above)
+                assert below_values is not None and above_values is not None
+                self.interpolations += 1
+                return np.asarray(
+                    (1 - weight) * below_values + weight * above_values,
+                    dtype=np.float64,
+                )
+        return None
+
+    def _lookup(self, key: ValueFunctionKey) -> npt.NDArray[np.float64] | None:
+        if key in self._in_memory:
+            self._in_memory.move_to_end(key)
+            return self._in_memory[key]
+        if key in self._spilled:
+            # Left memory-mapped, so only the rows a solve reads are loaded
+            values: npt.NDArray[np.float64] = np.load(self._spilled[key], mmap_mode="r")
+            return values
+        return None
+
+    def _spill(self, key: ValueFunctionKey, values: npt.NDArray[np.float64]) -> None:
+        assert self.spill_directory is not None
+        directory = Path(self.spill_directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{key.file_name}.npy"
+        if not path.exists():
+            # Written under another name first, so a half-written file is never read
+            temporary_path = directory / f"{key.file_name}.tmp.npy"
+            np.save(temporary_path, values)
+            os.replace(temporary_path, path)
+        self._spilled[key] = path
+
+
+@dataclasses.dataclass(frozen=True)
+class OptimalDispatch:
+    result: SimulationResult
+    # At the start of every interval, and after the last one
+    state_of_charge_mwh: npt.NDArray[np.float64]
+    # Energy sold to the grid in each interval, negative when charging
+    grid_energy_mwh: npt.NDArray[np.float64]
+    # Whether the value function was solved for, found in the cache or interpolated
+    source: str
+
+    @property
+    def profit(self) -> float:
+        return self.result.profit
+
+
+@dataclasses.dataclass(frozen=True)
+class _Transitions:
+    # Between every pair of grid levels (from, to) in one interval
+    energy_sold_mwh: npt.NDArray[np.float64]
+    # Throughput cost of the move, or -inf where the move exceeds the power limits
+    penalty: npt.NDArray[np.float64]
+    throughput_mwh: npt.NDArray[np.float64]
+
+
+def solve_optimal_dispatch(
+    *,
+    battery: Battery,
+    market: Market,
+    soc_steps: int = SOC_STEPS,
+    cache: ValueFunctionCache | None = None,
+    interpolate: bool = True,
+) -> OptimalDispatch:
+    # Dispatches from the battery's current state of charge, rounded to the grid,
+    # without changing the battery
+    if soc_steps < 1:
+        raise ValueError(f"soc_steps must be at least 1, got {soc_steps}")
+
+    transitions = _transitions(
+        battery=battery, interval_hours=market.interval_hours, soc_steps=soc_steps
+    )
+    prices = np.asarray(market.prices.to_numpy(dtype=float), dtype=np.float64)
+    key = ValueFunctionKey.for_battery(
+        battery=battery, market=market, soc_steps=soc_steps
+    )
+
+    values = None if cache is None else cache.get(key)
+    source = "cached"
+    if values is None and cache is not None and interpolate:
+        values = cache.interpolate(key)
+        source = "interpolated"
+    if values is None:
+        values = value_function(prices=prices, transitions=transitions)
+        source = "solved"
+        if cache is not None:
+            cache.put(key, values)
+
+    return _dispatch(
+        battery=battery,
+        prices=prices,
+        values=values,
+        transitions=transitions,
+        soc_steps=soc_steps,
+        source=source,
+    )
+
+
+def value_function(
+    *, prices: npt.NDArray[np.float64], transitions: _Transitions
+) -> npt.NDArray[np.float64]:
+    # values[t, level] is the best profit from the start of interval t onwards.
+    # Energy still stored at the end is worth nothing, as in the simulation
+    values = np.zeros((len(prices) + 1, transitions.penalty.shape[0]))
+    # Reused every interval, rather than allocating levels squared floats each time
+    rewards = np.empty_like(transitions.penalty)
+    for position in range(len(prices) - 1, -1, -1):
+        np.multiply(transitions.energy_sold_mwh, prices[position], out=rewards)
+        rewards += transitions.penalty
+        rewards += values[position + 1]
+        rewards.max(axis=1, out=values[position])
+    return values
+
+
+def _transitions(
+    *, battery: Battery, interval_hours: float, soc_steps: int
+) -> _Transitions:
+    levels = np.arange(soc_steps + 1)
+    change_mwh = (levels[None, :] - levels[:, None]) * (
+        battery.capacity_mwh / soc_steps
+    )
+    bought_mwh = np.maximum(change_mwh, 0.0) / battery.charge_efficiency
+    sold_mwh = np.maximum(-change_mwh, 0.0) * battery.discharge_efficiency
+    throughput_mwh = bought_mwh + sold_mwh
+    feasible = (
+        bought_mwh <= (battery.max_charge_mw + POWER_TOLERANCE_MW) * interval_hours
+    ) & (sold_mwh <= (battery.max_discharge_mw + POWER_TOLERANCE_MW) * interval_hours)
+    throughput_cost = (
+        0.0
+        if battery.degradation is None
+        else battery.degradation.throughput_cost_per_mwh
+    )
+    return _Transitions(
+        energy_sold_mwh=sold_mwh - bought_mwh,
+        penalty=np.where(feasible, -throughput_cost * throughput_mwh, -np.inf),
+        throughput_mwh=throughput_mwh,
+    )
+
+
+def _dispatch(
+    *,
+    battery: Battery,
+    prices: npt.NDArray[np.float64],
+    values: npt.NDArray[np.float64],
+    transitions: _Transitions,
+    soc_steps: int,
+    source: str,
+) -> OptimalDispatch:
+    step_mwh = battery.capacity_mwh / soc_steps
+    level = min(max(int(round(battery.state_of_charge_mwh / step_mwh)), 0), soc_steps)
+    levels = np.empty(len(prices) + 1, dtype=np.int64)
+    levels[0] = level
+    for position in range(len(prices)):
+        level = int(
+            np.argmax(
+                prices[position] * transitions.energy_sold_mwh[level]
+                + transitions.penalty[level]
+                + values[position + 1]
+            )
+        )
+        levels[position + 1] = level
+
+    grid_energy_mwh = transitions.energy_sold_mwh[levels[:-1], levels[1:]]
+    throughput_mwh = float(transitions.throughput_mwh[levels[:-1], levels[1:]].sum())
+    state_of_charge_mwh = np.asarray(levels * step_mwh, dtype=np.float64)
+    return OptimalDispatch(
+        result=SimulationResult(
+            revenue=float(np.sum(prices * np.maximum(grid_energy_mwh, 0.0))),
+            cost=float(np.sum(prices * np.maximum(-grid_energy_mwh, 0.0))),
+            final_state_of_charge_mwh=float(state_of_charge_mwh[-1]),
+            throughput_mwh=throughput_mwh,
+            degradation_cost=_degradation_cost(
+                battery=battery,
+                state_of_charge_mwh=state_of_charge_mwh,
+                throughput_mwh=throughput_mwh,
+            ),
+            steps_evaluated=len(prices),
+        ),
+        state_of_charge_mwh=state_of_charge_mwh,
+        grid_energy_mwh=grid_energy_mwh,
+        source=source,
+    )
+
+
+def _degradation_cost(
+    *,
+    battery: Battery,
+    state_of_charge_mwh: npt.NDArray[np.float64],
+    throughput_mwh: float,
+) -> float:
+    # As Battery.total_degradation_cost, including the half cycles left open
+    degradation = battery.degradation
+    if degradation is None:
+        return 0.0
+
+    cost = degradation.throughput_cost_per_mwh * throughput_mwh
+    if degradation.cycle_cost == 0:
+        return cost
+
+    counter = RainflowCounter()
+    for state_of_charge in state_of_charge_mwh.tolist():
+        for range_mwh in counter.add(state_of_charge):
+            cost += degradation.cycle_cost_for_range(
+                range_mwh=range_mwh, capacity_mwh=battery.capacity_mwh
+            )
+    return cost + sum(
+        0.5
+        * degradation.cycle_cost_for_range(
+            range_mwh=range_mwh, capacity_mwh=battery.capacity_mwh
+        )
+        for range_mwh in counter.residual_ranges()
+    )
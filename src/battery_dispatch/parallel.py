@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.core import (
+    ScenarioTimeline,
+    SimulationResult,
+    build_scenario_timeline,
+    dispatch_at_timestamp,
+    finish_simulation,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.values.battery import (
+    Battery,
+    BatteryCommitment,
+    BatteryCommitmentType,
+)
+from battery_dispatch.values.degradation import RainflowCounter
+from battery_dispatch.values.ledger import EnergyLedger
+from battery_dispatch.values.market import Market
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+
+# Splits a scenario into blocks of time that are simulated in parallel, each from a
+# guessed starting state. Dispatch only depends on the state of charge and the open
+# commitments, so once the true run reaches a step with the same state of charge as
+# a block's trace and nothing open in either, the rest of that block's trace is
+# exactly what the serial run would do. Stitching re-runs each block serially up to
+# that point and replays the trace's commitments from there
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatchAction:
+    market_index: int
+    commitment_type: BatteryCommitmentType
+    energy_mwh: float
+    start_time: pd.Timestamp
+    end_time: pd.Timestamp
+
+
+@dataclasses.dataclass(frozen=True)
+class BlockTrace:
+    start: int
+    # State after settling at each step of the block, before dispatching
+    state_of_charge_mwh: npt.NDArray[np.float64]
+    idle: npt.NDArray[np.bool_]
+    # Positions in the timeline at which commitments were taken on
+    actions: dict[int, list[DispatchAction]]
+
+
+def run_battery_simulation_in_blocks(
+    battery: Battery,
+    all_markets: list[Market],
+    output: bool = True,
+    number_of_hours_to_look_ahead: float | None = None,
+    block_frequency: str = "MS",
+    workers: int = 1,
+) -> SimulationResult:
+    # block_frequency is a pandas offset alias marking where blocks start, so "MS"
+    # gives calendar months. The result is identical to the serial simulation
+    timeline = build_scenario_timeline(
+        all_markets=all_markets,
+        number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+    )
+    boundaries = block_boundaries(timeline=timeline, block_frequency=block_frequency)
+    blocks = list(zip(boundaries[:-1], boundaries[1:]))
+    if workers <= 1 or len(blocks) <= 1:
+        # Without blocks running side by side, guessing their starting states and
+        # stitching would only do the work twice
+        return run_battery_simulation_for_scenario(
+            battery=battery,
+            all_markets=all_markets,
+            output=output,
+            number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+            timeline=timeline,
+        )
+
+    # Every block starts from the battery's initial state of charge as its guess
+    initial_battery = fresh_battery(
+        battery=battery, state_of_charge_mwh=battery.state_of_charge_mwh
+    )
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_initialise_worker,
+        initargs=(all_markets, number_of_hours_to_look_ahead),
+    ) as executor:
+        traces = list(
+            executor.map(
+                _simulate_block_in_worker,
+                [initial_battery] * len(blocks),
+                [start for start, _ in blocks],
+                [stop for _, stop in blocks],
+            )
+        )
+
+    steps_evaluated = sum(len(trace.idle) for trace in traces)
+    # Whatever the traces guessed wrong at the start of each block is re-run
+    for (start, stop), trace in zip(blocks, traces):
+        steps_evaluated += stitch_block(
+            battery=battery,
+            all_markets=all_markets,
+            timeline=timeline,
+            trace=trace,
+            stop=stop,
+            output=output,
+        )
+
+    # Settle whatever the replayed trace left open, as the serial loop would have
+    timestamps = timeline.timestamps
+    battery.commit_expired_commitments(
+        current_timestamp=timestamps[len(timestamps) - 1], output=output
+    )
+    return finish_simulation(
+        battery=battery, steps_evaluated=steps_evaluated, output=output
+    )
+
+
+def block_boundaries(*, timeline: ScenarioTimeline, block_frequency: str) -> list[int]:
+    timestamps = timeline.timestamps
+    if len(timestamps) == 0:
+        return [0]
+
+    block_starts = timestamps.to_series().resample(block_frequency).first()
+    starts = {
+        int(position)
+        for position in timestamps.searchsorted(block_starts.dropna(), side="left")
+    }
+    return sorted(starts | {0, len(timestamps)})
+
+
+def simulate_block(
+    *,
+    battery: Battery,
+    all_markets: list[Market],
+    timeline: ScenarioTimeline,
+    start: int,
+    stop: int,
+) -> BlockTrace:
+    # Runs the serial loop over [start, stop) from the given battery, recording
+    # enough to tell when the true run has caught up with it
+    timestamps = timeline.timestamps
+    market_indices = {id(market): index for index, market in enumerate(all_markets)}
+    state_of_charge_mwh = np.empty(stop - start)
+    idle = np.empty(stop - start, dtype=bool)
+    actions: dict[int, list[DispatchAction]] = {}
+
+    for position in range(start, stop):
+        timestamp = timestamps[position]
+        battery.commit_expired_commitments(current_timestamp=timestamp, output=False)
+        state_of_charge_mwh[position - start] = battery.state_of_charge_mwh
+        idle[position - start] = len(battery.commitments) == 0
+        new_commitments = dispatch_at_timestamp(
+            battery=battery,
+            all_markets=all_markets,
+            timestamp=timestamp,
+            timeline=timeline,
+        )
+        if len(new_commitments) > 0:
+            actions[position] = [
+                DispatchAction(
+                    market_index=market_indices[id(commitment.market)],
+                    commitment_type=commitment.commitment_type,
+                    energy_mwh=commitment.energy_mwh,
+                    start_time=commitment.start_time,
+                    end_time=commitment.end_time,
+                )
+                for commitment in new_commitments
+            ]
+
+    return BlockTrace(
+        start=start, state_of_charge_mwh=state_of_charge_mwh, idle=idle, actions=actions
+    )
+
+
+def stitch_block(
+    *,
+    battery: Battery,
+    all_markets: list[Market],
+    timeline: ScenarioTimeline,
+    trace: BlockTrace,
+    stop: int,
+    output: bool,
+) -> int:
+    # Advances the true battery over [trace.start, stop) and returns the number of
+    # steps that had to be re-run
+    timestamps = timeline.timestamps
+    for position in range(trace.start, stop):
+        timestamp = timestamps[position]
+        battery.commit_expired_commitments(current_timestamp=timestamp, output=output)
+        offset = position - trace.start
+        if (
+            trace.idle[offset]
+            and len(battery.commitments) == 0
+            and battery.state_of_charge_mwh == trace.state_of_charge_mwh[offset]
+        ):
+            replay_actions(
+                battery=battery,
+                all_markets=all_markets,
+                actions=trace.actions,
+                start=position,
+                stop=stop,
+                output=output,
+            )
+            return offset
+
+        dispatch_at_timestamp(
+            battery=battery,
+            all_markets=all_markets,
+            timestamp=timestamp,
+            timeline=timeline,
+        )
+    return stop - trace.start
+
+
+def replay_actions(
+    *,
+    battery: Battery,
+    all_markets: list[Market],
+    actions: dict[int, list[DispatchAction]],
+    start: int,
+    stop: int,
+    output: bool,
+) -> None:
+    # Settling is only needed before taking on new commitments, as nothing else in
+    # between looks at the battery
+    for position in sorted(actions):
+        if not start <= position < stop:
+            continue
+
+        position_actions = actions[position]
+        battery.commit_expired_commitments(
+            current_timestamp=position_actions[0].start_time, output=output
+        )
+        battery.add_commitments(
+            new_commitments=[
+                BatteryCommitment(
+                    market=all_markets[action.market_index],
+                    commitment_type=action.commitment_type,
+                    energy_mwh=action.energy_mwh,
+                    start_time=action.start_time,
+                    end_time=action.end_time,
+                )
+                for action in position_actions
+            ]
+        )
+
+
+def fresh_battery(*, battery: Battery, state_of_charge_mwh: float) -> Battery:
+    # Same physical battery with nothing committed and clean books
+    return dataclasses.replace(
+        battery,
+        state_of_charge_mwh=state_of_charge_mwh,
+        commitments=[],
+        revenue=0.0,
+        cost=0.0,
+        degradation_cost=0.0,
+        throughput_mwh=0.0,
+        rainflow_counter=RainflowCounter(),
+        energy_ledger=EnergyLedger(),
+        pnl_rollup=(
+            battery.pnl_rollup.cleared() if battery.pnl_rollup is not None else None
+        ),
+    )
+
+
+_worker_markets: list[Market] = []
+_worker_timeline: ScenarioTimeline | None = None
+
+
+def _initialise_worker(
+    all_markets: list[Market], number_of_hours_to_look_ahead: float | None
+) -> None:
+    # Markets and the timeline are sent once per process rather than once per block
+    global _worker_markets, _worker_timeline
+    _worker_markets = all_markets
+    _worker_timeline = build_scenario_timeline(
+        all_markets=all_markets,
+        number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+    )
+
+
+def _simulate_block_in_worker(battery: Battery, start: int, stop: int) -> BlockTrace:
+    assert _worker_timeline is not None
+    return simulate_block(
+        battery=battery,
+        all_markets=_worker_markets,
+        timeline=_worker_timeline,
+        start=start,
+        stop=stop,
+    )
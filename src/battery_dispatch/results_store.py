@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import io
+import os
+import sqlite3
+import time
+from typing import TYPE_CHECKING, Any, Iterable, Mapping
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.batch import ScenarioResult
+from battery_dispatch.config import ScenarioConfig
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+else:
+    np = lazy_import("numpy")
+
+# Scenario results kept in a local SQLite file, one row per distinct scenario. Rows
+# are keyed on everything a result depends on except the scenario's name, so a
+# scenario that has already been run is looked up rather than run again. Only the
+# standard library is imported until a timeline is read or written
+
+TABLE = "scenario_results"
+INDEXED_COLUMNS = (
+    "strategy",
+    "lookahead_hours",
+    "capacity_mwh",
+    "max_charge_mw",
+    "max_discharge_mw",
+    "charge_efficiency",
+    "discharge_efficiency",
+)
+RESULT_COLUMNS = tuple(field.name for field in dataclasses.fields(ScenarioResult))
+# Rows are written this many at a time, each batch in one transaction
+INSERT_BATCH_SIZE = 500
+# SQLite limits how many parameters one statement can take
+QUERY_BATCH_SIZE = 500
+
+
+@dataclasses.dataclass(frozen=True)
+class StoredResult:
+    scenario_key: str
+    result: ScenarioResult
+    # Named arrays, saved compressed alongside the totals
+    timeline: Mapping[str, npt.NDArray[Any]] | None = None
+
+
+@dataclasses.dataclass
+class ResultsStore:
+    connection: sqlite3.Connection
+
+    @classmethod
+    def open(cls, path: str) -> ResultsStore:
+        connection = sqlite3.connect(path)
+        column_definitions = ", ".join(
+            f"{field.name} {'TEXT' if field.type == 'str' else 'REAL'} NOT NULL"
+            for field in dataclasses.fields(ScenarioResult)
+        )
+        with connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                "scenario_key TEXT PRIMARY KEY, "
+                f"{column_definitions}, "
+                "timeline BLOB, "
+                "created_at REAL NOT NULL)"
+            )
+            for column in INDEXED_COLUMNS:
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {TABLE}_{column} "
+                    f"ON {TABLE} ({column})"
+                )
+        return cls(connection=connection)
+
+    def __enter__(self) -> ResultsStore:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __len__(self) -> int:
+        (count,) = self.connection.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()
+        return int(count)
+
+    def add(self, stored_results: Iterable[StoredResult]) -> int:
+        # Returns how many rows were new. Results already in the store are kept
+        rows = (
+            (
+                stored.scenario_key,
+                *dataclasses.astuple(stored.result),
+                None if stored.timeline is None else _compress(stored.timeline),
+                time.time(),
+            )
+            for stored in stored_results
+        )
+        placeholders = ", ".join("?" * (len(RESULT_COLUMNS) + 3))
+        inserted = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == INSERT_BATCH_SIZE:
+                inserted += self._insert(batch, placeholders=placeholders)
+                batch = []
+        if batch:
+            inserted += self._insert(batch, placeholders=placeholders)
+        return inserted
+
+    def get(self, scenario_keys: Iterable[str]) -> dict[str, ScenarioResult]:
+        keys = list(dict.fromkeys(scenario_keys))
+        found = {}
+        for first in range(0, len(keys), QUERY_BATCH_SIZE):
+            chunk = keys[first : first + QUERY_BATCH_SIZE]
+            for row in self.connection.execute(
+                f"SELECT scenario_key, {', '.join(RESULT_COLUMNS)} FROM {TABLE} "
+                f"WHERE scenario_key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ):
+                found[row[0]] = ScenarioResult(*row[1:])
+        return found
+
+    def query(self, **filters: str | float) -> list[ScenarioResult]:
+        # Results whose parameters equal every filter, e.g. query(lookahead_hours=3)
+        unknown = sorted(set(filters) - set(INDEXED_COLUMNS))
+        if unknown:
+            raise ValueError(
+                f"Can't filter on {', '.join(unknown)}, expected {INDEXED_COLUMNS}"
+            )
+        where = " AND ".join(f"{column} = ?" for column in filters) or "1"
+        return [
+            ScenarioResult(*row)
+            for row in self.connection.execute(
+                f"SELECT {', '.join(RESULT_COLUMNS)} FROM {TABLE} WHERE {where} "
+                "ORDER BY created_at, scenario_key",
+                list(filters.values()),
+            )
+        ]
+
+    def timeline(self, scenario_key: str) -> dict[str, npt.NDArray[Any]] | None:
+        row = self.connection.execute(
+            f"SELECT timeline FROM {TABLE} WHERE scenario_key = ?", (scenario_key,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        with np.load(io.BytesIO(row[0])) as arrays:
+            return dict(arrays)
+
+    def _insert(self, rows: list[tuple[Any, ...]], *, placeholders: str) -> int:
+        with self.connection:
+            cursor = self.connection.executemany(
+                f"INSERT OR IGNORE INTO {TABLE} "
+                f"(scenario_key, {', '.join(RESULT_COLUMNS)}, timeline, created_at) "
+                f"VALUES ({placeholders})",
+                rows,
+            )
+        return cursor.rowcount
+
+
+def scenario_key(scenario: ScenarioConfig) -> str:
+    # The price files, and every file in a forecast store, are identified by their
+    # size and modification time, so editing one invalidates the results computed
+    # from it
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(dataclasses.replace(scenario, name="")).encode())
+    for market in scenario.markets:
+        for path in (market.csv_path, market.forecast_path):
+            if path is not None:
+                for file_path in _files_under(path):
+                    stat = os.stat(file_path)
+                    digest.update(
+                        repr((file_path, stat.st_size, stat.st_mtime_ns)).encode()
+                    )
+    return digest.hexdigest()
+
+
+def _files_under(path: str) -> list[str]:
+    # The file itself, or every file in the directory and below it, in a fixed order
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def _compress(timeline: Mapping[str, npt.NDArray[Any]]) -> bytes:
+    buffer = io.BytesIO()
+    # Each array is saved under its name; savez_compressed's own keyword arguments
+    # are typed apart from the arrays, so the names are passed as a plain dict
+    arrays: dict[str, Any] = dict(timeline)
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
@@ -0,0 +1,603 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import dataclasses
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.config import BatteryConfig, ConfigError, MarketConfig
+from battery_dispatch.config import parse_battery as parse_battery_config
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from battery_dispatch.values.battery import BatteryCommitment
+    from battery_dispatch.values.market import Market
+else:
+    pd = lazy_import("pandas")
+
+# A local HTTP service over the dispatcher, serving JSON on TCP or a Unix socket.
+# The markets are loaded once, when the service starts. Dispatch requests are
+# queued and decided in micro-batches: requests for the same gate share one market
+# window and timeline, which is most of the cost of a decision. Valuations and
+# simulations run on a process pool whose workers load the markets once each.
+# Only the standard library is imported until the markets are loaded
+#
+#   POST /dispatch  {"battery": {...}, "timestamp": "...", "lookahead_hours": 3}
+#                   or a list of them, answered with the commitments to take on
+#   POST /value     {"battery": {...}, "market": "...", "start": ..., "end": ...}
+#                   the perfect-foresight value of the battery in one market
+#   POST /simulate  {"battery": {...}, "start": ..., "end": ..., "markets": [...]}
+#                   the lookahead simulation's books over the period
+#   GET  /markets   the markets' names, intervals and date ranges
+#   GET  /metrics   request counts, latency percentiles, throughput and batching
+#
+# Batteries are given as in scenario files and start with nothing committed
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Dispatch requests queued while a batch is being decided join the next one, so
+# batches only grow under load. A batch can also wait this long for company, which
+# on one CPU only adds latency, as handling the HTTP costs more than deciding
+BATCH_WINDOW_SECONDS = 0.0
+MAX_BATCH_SIZE = 256
+# The exact solver's work and memory grow with the square of its grid, so requests
+# can't ask for a finer one than this
+MAX_SOC_STEPS = 1000
+# Latency percentiles are over the most recent requests to each endpoint
+LATENCY_SAMPLES = 10_000
+LATENCY_PERCENTILES = (50, 90, 99)
+ENDPOINTS = ("/dispatch", "/value", "/simulate", "/markets", "/metrics")
+
+
+class RequestError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatchRequest:
+    battery: BatteryConfig
+    timestamp: str
+    lookahead_hours: float | None = None
+    # All of the service's markets when empty
+    markets: tuple[str, ...] = ()
+
+
+@dataclasses.dataclass(frozen=True)
+class ValueRequest:
+    battery: BatteryConfig
+    market: str
+    start: str | None = None
+    end: str | None = None
+    soc_steps: int | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class SimulateRequest:
+    battery: BatteryConfig
+    start: str | None = None
+    end: str | None = None
+    lookahead_hours: float | None = None
+    markets: tuple[str, ...] = ()
+
+
+@dataclasses.dataclass
+class ServiceMetrics:
+    started: float = dataclasses.field(default_factory=time.monotonic)
+    latencies: dict[str, collections.deque[float]] = dataclasses.field(
+        default_factory=dict
+    )
+    requests: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    errors: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    batches: int = 0
+    batched_decisions: int = 0
+    largest_batch: int = 0
+    _lock: threading.Lock = dataclasses.field(
+        default_factory=threading.Lock, repr=False
+    )
+
+    def record_request(self, *, endpoint: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            self.requests[endpoint] += 1
+            if failed:
+                self.errors[endpoint] += 1
+            self.latencies.setdefault(
+                endpoint, collections.deque(maxlen=LATENCY_SAMPLES)
+            ).append(seconds)
+
+    def record_batch(self, size: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.batched_decisions += size
+            self.largest_batch = max(self.largest_batch, size)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            uptime = time.monotonic() - self.started
+            endpoints = {}
+            for endpoint, count in sorted(self.requests.items()):
+                latencies = sorted(self.latencies[endpoint])
+                endpoints[endpoint] = {
+                    "requests": count,
+                    "errors": self.errors[endpoint],
+                    "requests_per_second": count / uptime,
+                    **{
+                        f"p{percentile}_ms": 1000
+                        * _percentile(latencies, percentile=percentile)
+                        for percentile in LATENCY_PERCENTILES
+                    },
+                    "max_ms": 1000 * latencies[-1],
+                }
+            return {
+                "uptime_seconds": uptime,
+                "requests": sum(self.requests.values()),
+                "requests_per_second": sum(self.requests.values()) / uptime,
+                "endpoints": endpoints,
+                "batches": self.batches,
+                "decisions_per_batch": (
+                    self.batched_decisions / self.batches if self.batches else 0.0
+                ),
+                "largest_batch": self.largest_batch,
+            }
+
+
+@dataclasses.dataclass
+class DispatchService:
+    markets: dict[str, Market]
+    market_configs: tuple[MarketConfig, ...]
+    workers: int = 1
+    batch_window_seconds: float = BATCH_WINDOW_SECONDS
+    max_batch_size: int = MAX_BATCH_SIZE
+    metrics: ServiceMetrics = dataclasses.field(default_factory=ServiceMetrics)
+    _queue: queue.Queue[tuple[DispatchRequest, Future[Any]] | None] = dataclasses.field(
+        default_factory=queue.Queue, repr=False
+    )
+    _batcher: threading.Thread | None = dataclasses.field(default=None, repr=False)
+    _pool: ProcessPoolExecutor | None = dataclasses.field(default=None, repr=False)
+
+    @classmethod
+    def start(
+        cls,
+        *,
+        market_configs: Sequence[MarketConfig],
+        workers: int = 1,
+        batch_window_seconds: float = BATCH_WINDOW_SECONDS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ) -> DispatchService:
+        # With more than one worker, valuations and simulations run in that many
+        # processes; otherwise in the thread handling the request
+        configs = tuple(dict.fromkeys(market_configs))
+        names = [config.name for config in configs]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Different markets share the names {duplicates}")
+
+        service = cls(
+            markets=_load_markets(configs),
+            market_configs=configs,
+            workers=workers,
+            batch_window_seconds=batch_window_seconds,
+            max_batch_size=max_batch_size,
+        )
+        if workers > 1:
+            service._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_initialise_worker,
+                initargs=(configs,),
+            )
+        service._batcher = threading.Thread(
+            target=service._run_batches, name="dispatch-batcher", daemon=True
+        )
+        service._batcher.start()
+        return service
+
+    def close(self) -> None:
+        if self._batcher is not None:
+            self._queue.put(None)
+            self._batcher.join()
+            self._batcher = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def dispatch(self, requests: list[DispatchRequest]) -> list[list[dict[str, Any]]]:
+        futures: list[Future[Any]] = []
+        for request in requests:
+            self._check_markets(request.markets)
+            future: Future[Any] = Future()
+            self._queue.put((request, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def value(self, request: ValueRequest) -> dict[str, Any]:
+        self._check_markets((request.market,))
+        return self._run_job(_value, request)
+
+    def simulate(self, request: SimulateRequest) -> dict[str, Any]:
+        self._check_markets(request.markets)
+        return self._run_job(_simulate, request)
+
+    def describe_markets(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "name": name,
+                "interval_hours": market.interval_hours,
+                "start": market.prices.index[0].isoformat(),
+                "end": market.prices.index[-1].isoformat(),
+                "intervals": len(market.prices),
+            }
+            for name, market in self.markets.items()
+        ]
+
+    def _check_markets(self, names: Sequence[str]) -> None:
+        unknown = sorted(set(names) - set(self.markets))
+        if unknown:
+            raise RequestError(f"Unknown markets {unknown}")
+
+    def _run_job(
+        self,
+        job: Callable[[Any, dict[str, Market]], dict[str, Any]],
+        request: Any,
+    ) -> dict[str, Any]:
+        if self._pool is None:
+            return job(request, self.markets)
+        return self._pool.submit(_run_in_worker, job, request).result()
+
+    def _run_batches(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.batch_window_seconds
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self.metrics.record_batch(len(batch))
+            self._decide_batch(batch)
+            if stopping:
+                return
+
+    def _decide_batch(self, batch: list[tuple[DispatchRequest, Future[Any]]]) -> None:
+        from battery_dispatch.batch import build_battery
+        from battery_dispatch.live import lookahead_decisions
+
+        # Grouped on the parsed timestamp, so the same gate written two ways is
+        # decided once
+        groups: dict[
+            tuple[pd.Timestamp, float | None, tuple[str, ...]],
+            list[tuple[DispatchRequest, Future[Any]]],
+        ] = {}
+        for request, future in batch:
+            try:
+                timestamp = _parse_timestamp(request.timestamp)
+            except RequestError as error:
+                future.set_exception(error)
+                continue
+            groups.setdefault(
+                (timestamp, request.lookahead_hours, request.markets), []
+            ).append((request, future))
+
+        for (timestamp, lookahead_hours, market_names), group in groups.items():
+            try:
+                decisions = lookahead_decisions(
+                    batteries=[build_battery(request.battery) for request, _ in group],
+                    all_markets=_select_markets(self.markets, names=market_names),
+                    timestamp=timestamp,
+                    number_of_hours_to_look_ahead=lookahead_hours,
+                )
+            except Exception as error:
+                for _, future in group:
+                    future.set_exception(error)
+                continue
+            for (_, future), commitments in zip(group, decisions):
+                future.set_result(
+                    [_commitment_json(commitment) for commitment in commitments]
+                )
+
+
+def create_server(
+    service: DispatchService,
+    *,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: str | None = None,
+) -> socketserver.BaseServer:
+    # Closing the server closes the service too. port=0 picks a free port
+    server: _TcpServer | _UnixServer = (
+        _UnixServer(socket_path, _Handler)
+        if socket_path is not None
+        else _TcpServer((host, port), _Handler)
+    )
+    server.service = service
+    return server
+
+
+class _ServiceServer:
+    service: DispatchService
+    # Many clients connect at once; socketserver's default backlog is 5
+    request_queue_size = 128
+
+    def server_close(self) -> None:
+        super().server_close()  # type: ignore[misc]
+        self.service.close()
+
+
+class _TcpServer(_ServiceServer, ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(
+    _ServiceServer, socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+    def server_close(self) -> None:
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(str(self.server_address))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keeps connections open between requests, which load generators rely on
+    protocol_version = "HTTP/1.1"
+    server: _ServiceServer  # type: ignore[assignment]
+
+    def do_GET(self) -> None:
+        self._handle(
+            {
+                "/markets": lambda body: self.server.service.describe_markets(),
+                "/metrics": lambda body: self.server.service.metrics.snapshot(),
+            }
+        )
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        self._handle(
+            {
+                "/dispatch": lambda body: _dispatch_response(service, body),
+                "/value": lambda body: service.value(_value_request(body)),
+                "/simulate": lambda body: service.simulate(_simulate_request(body)),
+            }
+        )
+
+    def _handle(self, routes: dict[str, Callable[[Any], Any]]) -> None:
+        started = time.perf_counter()
+        endpoint = self.path.split("?", 1)[0]
+        status = 200
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            raw_body = self.rfile.read(length) if length else b""
+            if endpoint not in routes:
+                status = 404 if endpoint not in ENDPOINTS else 405
+                response: Any = {"error": f"No {self.command} {endpoint}"}
+            else:
+                body = json.loads(raw_body) if raw_body else None
+                response = routes[endpoint](body)
+        except (RequestError, ConfigError, ValueError, KeyError) as error:
+            # json.JSONDecodeError is a ValueError
+            status = 400
+            response = {"error": str(error)}
+        except Exception as error:
+            status = 500
+            response = {"error": f"{type(error).__name__}: {error}"}
+
+        payload = json.dumps(response).encode()
+        # Counted before replying, so the metrics cover every reply a client has seen
+        if endpoint in ENDPOINTS:
+            self.server.service.metrics.record_request(
+                endpoint=endpoint,
+                seconds=time.perf_counter() - started,
+                failed=status != 200,
+            )
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self) -> str:
+        # Unix sockets have no client address
+        return str(self.client_address[0]) if self.client_address else "local"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Every request is counted in /metrics instead
+        pass
+
+
+def _dispatch_response(service: DispatchService, body: Any) -> Any:
+    # A single request is answered with its commitments, a list with a list of them
+    if isinstance(body, list):
+        return service.dispatch([_dispatch_request(raw) for raw in body])
+    return service.dispatch([_dispatch_request(body)])[0]
+
+
+def _dispatch_request(raw: Any) -> DispatchRequest:
+    raw = _expect_object(raw, fields=DispatchRequest)
+    return DispatchRequest(
+        battery=_battery(raw),
+        timestamp=_text(raw, "timestamp", required=True),
+        lookahead_hours=_positive_number(raw, "lookahead_hours"),
+        markets=_names(raw, "markets"),
+    )
+
+
+def _value_request(raw: Any) -> ValueRequest:
+    raw = _expect_object(raw, fields=ValueRequest)
+    soc_steps = _positive_number(raw, "soc_steps")
+    if soc_steps is not None and (
+        soc_steps != int(soc_steps) or soc_steps > MAX_SOC_STEPS
+    ):
+        raise RequestError(
+            f"soc_steps must be a whole number up to {MAX_SOC_STEPS}, "
+            f"got {raw['soc_steps']!r}"
+        )
+    return ValueRequest(
+        battery=_battery(raw),
+        market=_text(raw, "market", required=True),
+        start=_text(raw, "start"),
+        end=_text(raw, "end"),
+        soc_steps=None if soc_steps is None else int(soc_steps),
+    )
+
+
+def _simulate_request(raw: Any) -> SimulateRequest:
+    raw = _expect_object(raw, fields=SimulateRequest)
+    return SimulateRequest(
+        battery=_battery(raw),
+        start=_text(raw, "start"),
+        end=_text(raw, "end"),
+        lookahead_hours=_positive_number(raw, "lookahead_hours"),
+        markets=_names(raw, "markets"),
+    )
+
+
+def _expect_object(raw: Any, *, fields: type) -> dict[str, Any]:
+    if not isinstance(raw, dict):
+        raise RequestError("Expected a JSON object")
+    unknown = sorted(set(raw) - {field.name for field in dataclasses.fields(fields)})
+    if unknown:
+        raise RequestError(f"Unknown keys {unknown}")
+    return raw
+
+
+def _battery(raw: dict[str, Any]) -> BatteryConfig:
+    if not isinstance(raw.get("battery"), dict):
+        raise RequestError("battery must be an object")
+    return parse_battery_config(raw["battery"], "request")
+
+
+def _text(raw: dict[str, Any], key: str, *, required: bool = False) -> Any:
+    if key not in raw and not required:
+        return None
+    if not isinstance(raw.get(key), str):
+        raise RequestError(f"{key} must be a string")
+    return raw[key]
+
+
+def _positive_number(raw: dict[str, Any], key: str) -> float | None:
+    if key not in raw:
+        return None
+    value = raw[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise RequestError(f"{key} must be a positive number, got {value!r}")
+    return float(value)
+
+
+def _names(raw: dict[str, Any], key: str) -> tuple[str, ...]:
+    names = raw.get(key, [])
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise RequestError(f"{key} must be a list of market names")
+    return tuple(names)
+
+
+def _parse_timestamp(value: str) -> pd.Timestamp:
+    try:
+        return pd.Timestamp(value)
+    except ValueError as error:
+        raise RequestError(f"Invalid timestamp {value!r}") from error
+
+
+def _commitment_json(commitment: BatteryCommitment) -> dict[str, Any]:
+    return {
+        "market": commitment.market.name,
+        "commitment_type": commitment.commitment_type.value,
+        "energy_mwh": commitment.energy_mwh,
+        "start_time": commitment.start_time.isoformat(),
+        "end_time": commitment.end_time.isoformat(),
+    }
+
+
+def _select_markets(
+    markets: dict[str, Market], *, names: Sequence[str]
+) -> list[Market]:
+    if len(names) == 0:
+        return list(markets.values())
+    return [markets[name] for name in names]
+
+
+def _window(market: Market, *, start: str | None, end: str | None) -> Market:
+    return market.slice(
+        start=None if start is None else _parse_timestamp(start),
+        end=None if end is None else _parse_timestamp(end),
+    )
+
+
+def _value(request: ValueRequest, markets: dict[str, Market]) -> dict[str, Any]:
+    from battery_dispatch.batch import build_battery
+    from battery_dispatch.optimal import SOC_STEPS, solve_optimal_dispatch
+
+    dispatch = solve_optimal_dispatch(
+        battery=build_battery(request.battery),
+        market=_window(markets[request.market], start=request.start, end=request.end),
+        soc_steps=SOC_STEPS if request.soc_steps is None else request.soc_steps,
+    )
+    return {**dataclasses.asdict(dispatch.result), "profit": dispatch.profit}
+
+
+def _simulate(request: SimulateRequest, markets: dict[str, Market]) -> dict[str, Any]:
+    from battery_dispatch.batch import build_battery
+    from battery_dispatch.core import run_battery_simulation_for_scenario
+
+    windows = [
+        _window(market, start=request.start, end=request.end)
+        for market in _select_markets(markets, names=request.markets)
+    ]
+    result = run_battery_simulation_for_scenario(
+        battery=build_battery(request.battery),
+        all_markets=[window for window in windows if len(window.prices) > 0],
+        output=False,
+        number_of_hours_to_look_ahead=request.lookahead_hours,
+        event_driven=True,
+    )
+    return {**dataclasses.asdict(result), "profit": result.profit}
+
+
+def _percentile(sorted_values: list[float], *, percentile: float) -> float:
+    # Nearest rank
+    rank = max(1, -(-len(sorted_values) * percentile // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _load_markets(market_configs: Sequence[MarketConfig]) -> dict[str, Market]:
+    from battery_dispatch.batch import _load_market
+
+    return {config.name: _load_market(config) for config in market_configs}
+
+
+_worker_markets: dict[str, Market] = {}
+
+
+def _initialise_worker(market_configs: tuple[MarketConfig, ...]) -> None:
+    # Each worker loads the markets once, rather than receiving them with every job
+    global _worker_markets
+    _worker_markets = _load_markets(market_configs)
+
+
+def _run_in_worker(
+    job: Callable[[Any, dict[str, Market]], dict[str, Any]], request: Any
+) -> dict[str, Any]:
+    return job(request, _worker_markets)
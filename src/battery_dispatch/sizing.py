@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, Mapping, Sequence
+
+from battery_dispatch.core import (
+    ScenarioTimeline,
+    SimulationResult,
+    build_scenario_timeline,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.parallel import fresh_battery
+from battery_dispatch.values.battery import Battery
+from battery_dispatch.values.market import Market
+
+# Searches battery sizes and lookaheads for the best profit net of capex. A coarse
+# grid over the bounds picks a starting point, then each round tries a step either
+# side of the best point along every parameter, moving when one of them is better
+# and halving the steps when none is. The markets, and one timeline per lookahead,
+# are shared by every evaluation, and each round's candidates run in parallel
+
+# max_power_mw sets the charge and discharge power together
+SIZING_PARAMETERS = (
+    "capacity_mwh",
+    "max_charge_mw",
+    "max_discharge_mw",
+    "max_power_mw",
+    "lookahead_hours",
+)
+COARSE_POINTS = 3
+# Without a resolution, parameters are searched down to this fraction of their range
+DEFAULT_RESOLUTION_FRACTION = 1 / 32
+# Moves that improve the objective by less than this fraction of it don't count
+OBJECTIVE_TOLERANCE = 1e-3
+MAX_EVALUATIONS = 100
+
+_Evaluate = Callable[[list[Battery], list[float | None]], list[SimulationResult]]
+
+
+@dataclasses.dataclass(frozen=True)
+class SizingParameter:
+    name: str
+    low: float
+    high: float
+    resolution: float | None = None
+
+    def __post_init__(self) -> None:
+        if self.name not in SIZING_PARAMETERS:
+            raise ValueError(
+                f"Unknown sizing parameter {self.name!r}, "
+                f"expected one of {SIZING_PARAMETERS}"
+            )
+        if not 0 <= self.low <= self.high:
+            raise ValueError(
+                f"Invalid bounds for {self.name}: {self.low} to {self.high}"
+            )
+        if self.resolution is not None and self.resolution <= 0:
+            raise ValueError(f"The resolution of {self.name} must be positive")
+
+    @property
+    def step(self) -> float:
+        if self.resolution is not None:
+            return self.resolution
+        return (self.high - self.low) * DEFAULT_RESOLUTION_FRACTION
+
+    def snap(self, value: float) -> float:
+        # Onto the parameter's grid, within its bounds
+        if self.high == self.low:
+            return self.low
+        steps = round((min(max(value, self.low), self.high) - self.low) / self.step)
+        return round(min(self.low + steps * self.step, self.high), 9)
+
+
+@dataclasses.dataclass(frozen=True)
+class CapexModel:
+    # Capital cost set against the simulated period, e.g. annualised costs for a
+    # year of prices. Power is costed at the larger of the charge and discharge power
+    cost_per_mwh: float = 0.0
+    cost_per_mw: float = 0.0
+
+    def capex(self, *, battery: Battery) -> float:
+        return self.cost_per_mwh * battery.capacity_mwh + self.cost_per_mw * max(
+            battery.max_charge_mw, battery.max_discharge_mw
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class SizingEvaluation:
+    parameters: dict[str, float]
+    result: SimulationResult
+    capex: float
+
+    @property
+    def objective(self) -> float:
+        return self.result.profit - self.result.degradation_cost - self.capex
+
+
+@dataclasses.dataclass(frozen=True)
+class SizingResult:
+    best: SizingEvaluation
+    # In the order they were run
+    evaluations: list[SizingEvaluation]
+    # Whether every step got below its parameter's resolution within the budget
+    converged: bool
+    rounds: int
+
+
+def optimise_sizing(
+    *,
+    battery: Battery,
+    all_markets: list[Market],
+    parameters: Sequence[SizingParameter],
+    capex: CapexModel,
+    number_of_hours_to_look_ahead: float | None = None,
+    coarse_points: int = COARSE_POINTS,
+    tolerance: float = OBJECTIVE_TOLERANCE,
+    max_evaluations: int = MAX_EVALUATIONS,
+    workers: int = 1,
+) -> SizingResult:
+    # The battery is the template for every candidate: whatever isn't searched is
+    # taken from it, and each candidate starts as full as it, relative to capacity.
+    # number_of_hours_to_look_ahead applies unless lookahead_hours is searched
+    names = [parameter.name for parameter in parameters]
+    if len(names) == 0:
+        raise ValueError("Nothing to size, expected at least one parameter")
+    if len(set(names)) < len(names):
+        raise ValueError(f"Duplicate sizing parameters in {names}")
+    if "max_power_mw" in names and {"max_charge_mw", "max_discharge_mw"} & set(names):
+        raise ValueError(
+            "max_power_mw can't be searched with the charge or discharge power"
+        )
+    if coarse_points < 2:
+        raise ValueError("The coarse grid needs at least two points per parameter")
+
+    evaluations: dict[tuple[float, ...], SizingEvaluation] = {}
+    with _evaluator(all_markets=all_markets, workers=workers) as evaluate:
+
+        def evaluate_points(points: list[tuple[float, ...]]) -> None:
+            # Points already run are looked up rather than run again
+            new_points = [
+                point for point in dict.fromkeys(points) if point not in evaluations
+            ]
+            new_points = new_points[: max(0, max_evaluations - len(evaluations))]
+            sized = [
+                sized_battery(battery=battery, parameters=dict(zip(names, point)))
+                for point in new_points
+            ]
+            lookaheads = [
+                dict(zip(names, point)).get(
+                    "lookahead_hours", number_of_hours_to_look_ahead
+                )
+                for point in new_points
+            ]
+            for point, sized_candidate, result in zip(
+                new_points, sized, evaluate(sized, lookaheads)
+            ):
+                evaluations[point] = SizingEvaluation(
+                    parameters=dict(zip(names, point)),
+                    result=result,
+                    capex=capex.capex(battery=sized_candidate),
+                )
+
+        evaluate_points(
+            list(
+                itertools.product(
+                    *(
+                        _coarse_values(parameter=parameter, points=coarse_points)
+                        for parameter in parameters
+                    )
+                )
+            )
+        )
+        best = max(evaluations, key=lambda point: evaluations[point].objective)
+        # Half the coarse spacing, so the first round looks between grid points
+        steps = [
+            (parameter.high - parameter.low) / (2 * (coarse_points - 1))
+            for parameter in parameters
+        ]
+        # Parameters fixed by their bounds are left where the coarse grid put them.
+        # The rest have steps above zero, which halve whenever a round doesn't move,
+        # so the search always gets below their resolutions
+        searched = [
+            axis
+            for axis, parameter in enumerate(parameters)
+            if parameter.high > parameter.low
+        ]
+        rounds = 0
+        converged = False
+        while True:
+            if all(steps[axis] < parameters[axis].step for axis in searched):
+                converged = True
+                break
+            if len(evaluations) >= max_evaluations:
+                break
+
+            candidates = [
+                best[:axis]
+                + (parameters[axis].snap(best[axis] + sign * steps[axis]),)
+                + best[axis + 1 :]
+                for axis in searched
+                if steps[axis] >= parameters[axis].step
+                for sign in (-1, 1)
+            ]
+            evaluate_points(candidates)
+            rounds += 1
+            best_objective = evaluations[best].objective
+            best_candidate = max(
+                (candidate for candidate in candidates if candidate in evaluations),
+                key=lambda point: evaluations[point].objective,
+                default=best,
+            )
+            if evaluations[best_candidate].objective > best_objective + tolerance * abs(
+                best_objective
+            ):
+                best = best_candidate
+            else:
+                steps = [step / 2 for step in steps]
+
+    ordered = list(evaluations.values())
+    return SizingResult(
+        best=max(ordered, key=lambda evaluation: evaluation.objective),
+        evaluations=ordered,
+        converged=converged,
+        rounds=rounds,
+    )
+
+
+def _coarse_values(*, parameter: SizingParameter, points: int) -> list[float]:
+    spacing = (parameter.high - parameter.low) / (points - 1)
+    return list(
+        dict.fromkeys(
+            parameter.snap(parameter.low + index * spacing) for index in range(points)
+        )
+    )
+
+
+def sized_battery(*, battery: Battery, parameters: Mapping[str, float]) -> Battery:
+    capacity_mwh = parameters.get("capacity_mwh", battery.capacity_mwh)
+    max_power_mw = parameters.get("max_power_mw")
+    state_of_charge_mwh = (
+        battery.state_of_charge_mwh * capacity_mwh / battery.capacity_mwh
+        if battery.capacity_mwh > 0
+        else 0.0
+    )
+    # Replacing the fresh copy re-adds the same starting point to its own rainflow
+    # counter, which ignores it, and leaves the template's books alone
+    return dataclasses.replace(
+        fresh_battery(battery=battery, state_of_charge_mwh=state_of_charge_mwh),
+        capacity_mwh=capacity_mwh,
+        max_charge_mw=parameters.get(
+            "max_charge_mw",
+            battery.max_charge_mw if max_power_mw is None else max_power_mw,
+        ),
+        max_discharge_mw=parameters.get(
+            "max_discharge_mw",
+            battery.max_discharge_mw if max_power_mw is None else max_power_mw,
+        ),
+    )
+
+
+@contextlib.contextmanager
+def _evaluator(*, all_markets: list[Market], workers: int) -> Iterator[_Evaluate]:
+    if workers <= 1:
+        timelines: dict[float | None, ScenarioTimeline] = {}
+
+        def evaluate(
+            batteries: list[Battery], lookaheads: list[float | None]
+        ) -> list[SimulationResult]:
+            return [
+                _simulate(
+                    battery=battery,
+                    all_markets=all_markets,
+                    timelines=timelines,
+                    number_of_hours_to_look_ahead=lookahead,
+                )
+                for battery, lookahead in zip(batteries, lookaheads)
+            ]
+
+        yield evaluate
+        return
+
+    # One pool for the whole search, so each worker receives the markets once and
+    # keeps its timelines between rounds
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_initialise_worker, initargs=(all_markets,)
+    ) as executor:
+
+        def evaluate_in_workers(
+            batteries: list[Battery], lookaheads: list[float | None]
+        ) -> list[SimulationResult]:
+            return list(executor.map(_simulate_in_worker, batteries, lookaheads))
+
+        yield evaluate_in_workers
+
+
+def _simulate(
+    *,
+    battery: Battery,
+    all_markets: list[Market],
+    timelines: dict[float | None, ScenarioTimeline],
+    number_of_hours_to_look_ahead: float | None,
+) -> SimulationResult:
+    # The timeline only depends on the lookahead, so each one is built once
+    timeline = timelines.get(number_of_hours_to_look_ahead)
+    if timeline is None:
+        timeline = timelines[number_of_hours_to_look_ahead] = build_scenario_timeline(
+            all_markets=all_markets,
+            number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+        )
+    return run_battery_simulation_for_scenario(
+        battery=battery,
+        all_markets=all_markets,
+        output=False,
+        number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+        event_driven=True,
+        timeline=timeline,
+    )
+
+
+_worker_markets: list[Market] = []
+_worker_timelines: dict[float | None, ScenarioTimeline] = {}
+
+
+def _initialise_worker(all_markets: list[Market]) -> None:
+    global _worker_markets, _worker_timelines
+    _worker_markets = all_markets
+    _worker_timelines = {}
+
+
+def _simulate_in_worker(
+    battery: Battery, number_of_hours_to_look_ahead: float | None
+) -> SimulationResult:
+    return _simulate(
+        battery=battery,
+        all_markets=_worker_markets,
+        timelines=_worker_timelines,
+        number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+    )
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import dataclasses
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from battery_dispatch._lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+
+    from battery_dispatch.values.market import Market
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+AGGREGATIONS = ("mean", "sum", "max", "min", "first")
+
+
+def interval_nanoseconds(interval_hours: float) -> int:
+    # Rounded so that resolutions like 5 minutes (1/12 h) land on whole nanoseconds
+    return int(round(interval_hours * 3600 * 1e9))
+
+
+def to_nanoseconds(timestamps: pd.Index | pd.Series) -> npt.NDArray[np.int64]:
+    # pandas may infer a coarser unit than nanoseconds when parsing
+    return pd.DatetimeIndex(timestamps).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+@dataclasses.dataclass(frozen=True)
+class MarketAlignment:
+    # A base grid fine enough to hold every market's interval starts, with integer
+    # maps from each base step to the interval of each market it falls in. Built
+    # once per scenario, after which moving prices between resolutions is just
+    # indexing and reductions
+    base_timestamps: pd.DatetimeIndex
+    base_interval_ns: int
+    # interval_indices[m][i] is the position in market m's prices of the interval
+    # containing base step i, or -1 if market m has no interval there
+    interval_indices: list[npt.NDArray[np.int64]]
+    interval_start_masks: list[npt.NDArray[np.bool_]]
+    market_lengths: list[int]
+
+    @classmethod
+    def build(cls, all_markets: list[Market]) -> MarketAlignment:
+        market_times = [to_nanoseconds(market.prices.index) for market in all_markets]
+        interval_ns = [
+            interval_nanoseconds(market.interval_hours) for market in all_markets
+        ]
+        non_empty = [times for times in market_times if len(times) > 0]
+        if len(non_empty) == 0:
+            raise ValueError("Cannot align markets without any prices")
+
+        open_time = min(int(times[0]) for times in non_empty)
+        # The base step has to divide every interval and every price's offset from
+        # the start, so that each interval start lands on the grid
+        base_interval_ns = int(
+            np.gcd.reduce(
+                np.concatenate(
+                    [np.array(interval_ns, dtype=np.int64)]
+                    + [times - open_time for times in non_empty]
+                )
+            )
+        )
+        # Runs to one longest interval past the last price, so that every
+        # commitment has a step to settle at
+        close_time = max(int(times[-1]) for times in non_empty) + max(interval_ns)
+        # Counted in steps, as np.arange's float length calculation can drop the last
+        # step at nanosecond epoch magnitudes
+        number_of_steps = (close_time - open_time) // base_interval_ns + 1
+        base_times = open_time + base_interval_ns * np.arange(
+            number_of_steps, dtype=np.int64
+        )
+
+        interval_indices = []
+        interval_start_masks = []
+        for times, interval in zip(market_times, interval_ns):
+            indices = np.searchsorted(times, base_times, side="right") - 1
+            inside = indices >= 0
+            inside[inside] = base_times[inside] < times[indices[inside]] + interval
+            indices = np.where(inside, indices, -1)
+            starts = np.zeros(len(base_times), dtype=bool)
+            starts[inside] = base_times[inside] == times[indices[inside]]
+            interval_indices.append(indices)
+            interval_start_masks.append(starts)
+
+        return cls(
+            base_timestamps=pd.DatetimeIndex(base_times.astype("datetime64[ns]")),
+            base_interval_ns=base_interval_ns,
+            interval_indices=interval_indices,
+            interval_start_masks=interval_start_masks,
+            market_lengths=[len(times) for times in market_times],
+        )
+
+    @property
+    def base_interval_hours(self) -> float:
+        return self.base_interval_ns / 3.6e12
+
+    @cached_property
+    def _open_time_ns(self) -> int:
+        return int(to_nanoseconds(self.base_timestamps[:1])[0])
+
+    def base_position(self, *, timestamp: pd.Timestamp) -> int:
+        # Position of a base grid timestamp, without a DatetimeIndex lookup
+        return (timestamp.value - self._open_time_ns) // self.base_interval_ns
+
+    def to_base(
+        self,
+        *,
+        market_index: int,
+        values: npt.ArrayLike,
+        starts_only: bool = False,
+        fill_value: float = float("nan"),
+        positions: slice = slice(None),
+    ) -> npt.NDArray[np.float64]:
+        # Up-samples one value per market interval onto the base grid, holding it
+        # across the interval (or only at its start). positions limits the result
+        # to part of the base grid
+        array = np.asarray(values, dtype=np.float64)
+        indices = self.interval_indices[market_index][positions]
+        covered = (
+            self.interval_start_masks[market_index][positions]
+            if starts_only
+            else indices >= 0
+        )
+        result = np.full(len(indices), fill_value)
+        result[covered] = array[indices[covered]]
+        return result
+
+    def from_base(
+        self, *, market_index: int, values: npt.ArrayLike, how: str = "mean"
+    ) -> npt.NDArray[np.float64]:
+        # Down-samples base grid values to one per market interval. NaNs are
+        # skipped, and intervals without any values give NaN
+        if how not in AGGREGATIONS:
+            raise ValueError(
+                f"Unknown aggregation {how!r}, expected one of {AGGREGATIONS}"
+            )
+
+        array = np.asarray(values, dtype=np.float64)
+        indices = self.interval_indices[market_index]
+        valid = (indices >= 0) & ~np.isnan(array)
+        indices = indices[valid]
+        array = array[valid]
+        length = self.market_lengths[market_index]
+
+        if how in ("mean", "sum"):
+            totals = np.bincount(indices, weights=array, minlength=length)
+            counts = np.bincount(indices, minlength=length)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                aggregated = totals / counts if how == "mean" else totals
+            return np.where(counts > 0, aggregated, np.nan)
+
+        result = np.full(length, np.nan)
+        if len(indices) == 0:
+            return result
+        # Base steps are in time order, so each interval's values are contiguous
+        group_starts = np.flatnonzero(np.diff(indices, prepend=-1) != 0)
+        if how == "first":
+            grouped = array[group_starts]
+        else:
+            reduce_fn = np.fmax if how == "max" else np.fmin
+            grouped = reduce_fn.reduceat(array, group_starts)
+        result[indices[group_starts]] = grouped
+        return result
+
+    def resample(
+        self,
+        *,
+        from_market_index: int,
+        to_market_index: int,
+        values: npt.ArrayLike,
+        how: str = "mean",
+    ) -> npt.NDArray[np.float64]:
+        # Moves one value per interval of one market onto the intervals of another,
+        # e.g. a time-weighted average of 5 minute prices per half hour, or the
+        # hourly price repeated for each of its half hours
+        return self.from_base(
+            market_index=to_market_index,
+            values=self.to_base(market_index=from_market_index, values=values),
+            how=how,
+        )
@@ -1,10 +1,30 @@
-import copy
+from __future__ import annotations
+
+import bisect
 import dataclasses
 from enum import Enum
+from typing import TYPE_CHECKING, Any, Sequence
 
-import pandas as pd
-
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.values.alignment import interval_nanoseconds, to_nanoseconds
+from battery_dispatch.values.degradation import DegradationModel, RainflowCounter
+from battery_dispatch.values.ledger import EnergyBalanceAudit, EnergyLedger
 from battery_dispatch.values.market import Market
+from battery_dispatch.values.pnl import PnlRollup
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# Allowance for floating point error when summing the power of split commitments
+POWER_TOLERANCE_MW = 1e-9
+# Allowance for floating point error when efficiency losses are applied to energy
+# that was sized from the state of charge
+ENERGY_TOLERANCE_MWH = 1e-9
 
 
 class CannotDispatchBatteryError(Exception):
@@ -25,8 +45,18 @@ class BatteryCommitment:
     market: Market
     commitment_type: BatteryCommitmentType
     energy_mwh: float
-    start_time: pd.DatetimeIndex
-    end_time: pd.DatetimeIndex
+    start_time: pd.Timestamp
+    end_time: pd.Timestamp
+
+    @property
+    def power_mw(self) -> float:
+        # Commitments always span exactly one market interval
+        return self.energy_mwh / self.market.interval_hours
+
+    def overlaps(self, other: BatteryCommitment) -> bool:
+        return bool(
+            self.start_time < other.end_time and other.start_time < self.end_time
+        )
 
 
 class BatteryState(Enum):
@@ -35,6 +65,17 @@ class BatteryState(Enum):
     DISCHARGING = "discharging"
 
 
+@dataclasses.dataclass(frozen=True)
+class CommitmentFeasibility:
+    # One entry per candidate commitment. feasible is what can_commit would say, and
+    # deliverable_mwh is how much of the candidate's energy the battery could take
+    # on, limited by the headroom available at the candidate's timestamp
+    feasible: npt.NDArray[np.bool_]
+    deliverable_mwh: npt.NDArray[np.float64]
+    power_headroom_mw: npt.NDArray[np.float64]
+    energy_headroom_mwh: npt.NDArray[np.float64]
+
+
 @dataclasses.dataclass
 class Battery:
     capacity_mwh: float
@@ -46,25 +87,59 @@ class Battery:
     commitments: list[BatteryCommitment] = dataclasses.field(default_factory=list)
     revenue: float = 0.0
     cost: float = 0.0
+    degradation: DegradationModel | None = None
+    degradation_cost: float = 0.0
+    throughput_mwh: float = 0.0
+    rainflow_counter: RainflowCounter = dataclasses.field(
+        default_factory=RainflowCounter, repr=False
+    )
+    energy_ledger: EnergyLedger = dataclasses.field(
+        default_factory=EnergyLedger, repr=False
+    )
+    # Optional P&L by market, day and month, e.g. PnlRollup.for_markets(all_markets)
+    pnl_rollup: PnlRollup | None = dataclasses.field(default=None, repr=False)
+    initial_state_of_charge_mwh: float = dataclasses.field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # Commitments are kept ordered by end time so expired ones can be taken
+        # from the front of the list without scanning the rest
+        self.commitments.sort(key=lambda commitment: commitment.end_time)
+        self.rainflow_counter.add(self.state_of_charge_mwh)
+        self.initial_state_of_charge_mwh = self.state_of_charge_mwh
 
     def commit_expired_commitments(
-        self, *, current_timestamp: pd.DatetimeIndex
+        self, *, current_timestamp: pd.Timestamp, output: bool = True
     ) -> None:
-        commitments_to_commit = [
-            commitment
-            for commitment in self.commitments
-            if commitment.end_time <= current_timestamp
-        ]
-        for commitment in commitments_to_commit:
+        while (
+            len(self.commitments) > 0
+            and self.commitments[0].end_time <= current_timestamp
+        ):
             # Remove commitment first to avoid its commitment being incorporated
             # into available capacity/state_of_charge calculations
-            self.commitments.remove(commitment)
-            self.commit(commitment=commitment)
+            commitment = self.commitments.pop(0)
+            final_commitment = self.commit(commitment=commitment, output=output)
+            # Prices may be stored as float32, but the books are kept in float64
+            value = commitment.energy_mwh * float(
+                commitment.market.prices[commitment.start_time]
+            )
             self._update_financial_state(
-                commitment_type=commitment.commitment_type,
-                value=commitment.energy_mwh
-                * commitment.market.prices[commitment.start_time],
+                commitment_type=commitment.commitment_type, value=value
+            )
+            closed_ranges = self._update_degradation_state(
+                energy_mwh=final_commitment.energy_mwh
             )
+            self._update_energy_ledger(commitment=final_commitment)
+            if self.pnl_rollup is not None:
+                is_charge = commitment.commitment_type is BatteryCommitmentType.CHARGE
+                self.pnl_rollup.record(
+                    market_name=commitment.market.name,
+                    timestamp=commitment.start_time,
+                    revenue=0.0 if is_charge else value,
+                    cost=value if is_charge else 0.0,
+                    throughput_mwh=final_commitment.energy_mwh,
+                    # In equivalent full cycles
+                    cycles=sum(closed_ranges) / self.capacity_mwh,
+                )
 
     def _update_financial_state(
         self, *, commitment_type: BatteryCommitmentType, value: float
@@ -74,7 +149,82 @@ class Battery:
         elif commitment_type is BatteryCommitmentType.DISCHARGE:
             self.revenue += value
 
-    def current_mode(self, *, current_timestamp: pd.DatetimeIndex) -> BatteryState:
+    def _update_energy_ledger(self, *, commitment: BatteryCommitment) -> None:
+        energy = commitment.energy_mwh
+        if commitment.commitment_type is BatteryCommitmentType.CHARGE:
+            self.energy_ledger.record(
+                start_time_ns=pd.Timestamp(commitment.start_time).value,
+                grid_import_mwh=energy,
+                grid_export_mwh=0.0,
+                losses_mwh=energy * (1 - self.charge_efficiency),
+            )
+        else:
+            self.energy_ledger.record(
+                start_time_ns=pd.Timestamp(commitment.start_time).value,
+                grid_import_mwh=0.0,
+                grid_export_mwh=energy,
+                losses_mwh=energy / self.discharge_efficiency - energy,
+            )
+
+    def audit_energy_balance(self) -> EnergyBalanceAudit:
+        # Run once at the end from the ledger so checking the books costs nothing
+        # while dispatching
+        return self.energy_ledger.audit(
+            initial_state_of_charge_mwh=self.initial_state_of_charge_mwh,
+            final_state_of_charge_mwh=self.state_of_charge_mwh,
+        )
+
+    @property
+    def round_trip_efficiency(self) -> float:
+        return self.charge_efficiency * self.discharge_efficiency
+
+    def _update_degradation_state(self, *, energy_mwh: float) -> list[float]:
+        # Returns the ranges of the cycles this closed
+        self.throughput_mwh += energy_mwh
+        # Cycles are counted incrementally so we never revisit the SoC history
+        closed_ranges = self.rainflow_counter.add(self.state_of_charge_mwh)
+        if self.degradation is None:
+            return closed_ranges
+
+        self.degradation_cost += self.degradation.throughput_cost_per_mwh * energy_mwh
+        for range_mwh in closed_ranges:
+            self.degradation_cost += self.degradation.cycle_cost_for_range(
+                range_mwh=range_mwh, capacity_mwh=self.capacity_mwh
+            )
+        return closed_ranges
+
+    def total_degradation_cost(self) -> float:
+        # Includes the half cycles that haven't been closed yet
+        if self.degradation is None:
+            return 0.0
+
+        return self.degradation_cost + sum(
+            0.5
+            * self.degradation.cycle_cost_for_range(
+                range_mwh=range_mwh, capacity_mwh=self.capacity_mwh
+            )
+            for range_mwh in self.rainflow_counter.residual_ranges()
+        )
+
+    def round_trip_degradation_cost(self, *, energy_mwh: float) -> float:
+        if self.degradation is None:
+            return 0.0
+
+        return self.degradation.round_trip_cost(
+            energy_mwh=energy_mwh, capacity_mwh=self.capacity_mwh
+        )
+
+    def round_trip_degradation_costs(
+        self, *, energies_mwh: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.float64]:
+        if self.degradation is None:
+            return np.zeros_like(energies_mwh)
+
+        return self.degradation.round_trip_costs(
+            energies_mwh=energies_mwh, capacity_mwh=self.capacity_mwh
+        )
+
+    def current_mode(self, *, current_timestamp: pd.Timestamp) -> BatteryState:
         for commitment in self.commitments:
             # We should only have one type of commitment at a time if we call can_commit()
             # properly, so can safely take the first one here
@@ -86,32 +236,71 @@ class Battery:
                 )
         return BatteryState.IDLE
 
-    def available_state_of_charge(
-        self, *, current_timestamp: pd.DatetimeIndex
-    ) -> float:
+    def available_state_of_charge(self, *, current_timestamp: pd.Timestamp) -> float:
+        # Energy that can still be delivered to the grid, after discharge losses
         discharge_commitment = sum(
             commitment.energy_mwh
             for commitment in self.commitments
             if commitment.commitment_type is BatteryCommitmentType.DISCHARGE
             and commitment.start_time <= current_timestamp < commitment.end_time
         )
-        return self.state_of_charge_mwh - discharge_commitment
+        return (
+            self.state_of_charge_mwh * self.discharge_efficiency - discharge_commitment
+        )
 
-    def available_capacity(self, *, current_timestamp: pd.DatetimeIndex) -> float:
+    def available_capacity(self, *, current_timestamp: pd.Timestamp) -> float:
+        # Energy that can still be drawn from the grid, before charge losses
         charge_commitment = sum(
             commitment.energy_mwh
             for commitment in self.commitments
             if commitment.commitment_type is BatteryCommitmentType.CHARGE
             and commitment.start_time <= current_timestamp < commitment.end_time
         )
-        return self.capacity_mwh - self.state_of_charge_mwh - charge_commitment
+        return (
+            self.capacity_mwh - self.state_of_charge_mwh
+        ) / self.charge_efficiency - charge_commitment
+
+    def committed_power_mw(
+        self,
+        *,
+        commitment_type: BatteryCommitmentType,
+        current_timestamp: pd.Timestamp,
+    ) -> float:
+        return sum(
+            commitment.power_mw
+            for commitment in self.commitments
+            if commitment.commitment_type is commitment_type
+            and commitment.start_time <= current_timestamp < commitment.end_time
+        )
+
+    def available_power_mw(
+        self,
+        *,
+        commitment_type: BatteryCommitmentType,
+        current_timestamp: pd.Timestamp,
+    ) -> float:
+        current_mode = self.current_mode(current_timestamp=current_timestamp)
+        if commitment_type is BatteryCommitmentType.CHARGE:
+            if current_mode is BatteryState.DISCHARGING:
+                return 0.0
+            max_power_mw = self.max_charge_mw
+        else:
+            assert commitment_type is BatteryCommitmentType.DISCHARGE
+            if current_mode is BatteryState.CHARGING:
+                return 0.0
+            max_power_mw = self.max_discharge_mw
+
+        committed_power_mw = self.committed_power_mw(
+            commitment_type=commitment_type, current_timestamp=current_timestamp
+        )
+        return max(max_power_mw - committed_power_mw, 0.0)
 
     def can_commit(
         self,
         *,
         energy_mwh: float,
         commitment_type: BatteryCommitmentType,
-        current_timestamp: pd.DatetimeIndex,
+        current_timestamp: pd.Timestamp,
     ) -> bool:
         # Check we aren't trying to discharge when we are charging (or vice versa)
         current_mode = self.current_mode(current_timestamp=current_timestamp)
@@ -132,17 +321,214 @@ class Battery:
         elif commitment_type is BatteryCommitmentType.DISCHARGE:
             return (
                 self.available_state_of_charge(current_timestamp=current_timestamp)
-                >= energy_mwh
+                >= energy_mwh - ENERGY_TOLERANCE_MWH
             )
 
-    def add_commitments(self, *, new_commitments: list[BatteryCommitment]) -> None:
-        if len(self.commitments) != 0 or len(new_commitments) != 1:
-            # Assume any current commitments are using the maximum power available,
-            # and we have committed to them already so we cannot take on more than one commitment
-            raise CannotAddCommitmentError(
-                "Cannot add new commitments to battery with existing commitments."
+    def check_commitments(
+        self,
+        *,
+        energies_mwh: npt.ArrayLike,
+        commitment_types: BatteryCommitmentType | Sequence[BatteryCommitmentType],
+        timestamps: pd.Timestamp | list[pd.Timestamp] | pd.DatetimeIndex,
+        interval_hours: float | Sequence[float] | None = None,
+    ) -> CommitmentFeasibility:
+        # can_commit, available_power_mw and available_capacity/available_state_of_charge
+        # for many candidates in one pass over the open commitments. A single type or
+        # timestamp applies to every candidate. With interval_hours, the deliverable
+        # energy is also limited to what the power headroom delivers over the interval
+        energies = np.atleast_1d(np.asarray(energies_mwh, dtype=float))
+        if isinstance(commitment_types, BatteryCommitmentType):
+            is_charge = np.full(
+                len(energies), commitment_types is BatteryCommitmentType.CHARGE
+            )
+        else:
+            is_charge = np.array(
+                [
+                    commitment_type is BatteryCommitmentType.CHARGE
+                    for commitment_type in commitment_types
+                ],
+                dtype=bool,
+            )
+
+        # Scalars for a single timestamp and arrays for many, which broadcast alike
+        committed: tuple[Any, ...]
+        if isinstance(timestamps, pd.Timestamp):
+            committed = self._committed_at(current_timestamp=timestamps)
+        else:
+            committed = self._committed_by_candidate(
+                times=to_nanoseconds(pd.DatetimeIndex(timestamps))
+            )
+        (
+            charge_mwh,
+            discharge_mwh,
+            charge_power_mw,
+            discharge_power_mw,
+            charging,
+            discharging,
+        ) = committed
+
+        mode_conflict = np.where(is_charge, discharging, charging)
+        energy_headroom_mwh = np.where(
+            is_charge,
+            (self.capacity_mwh - self.state_of_charge_mwh) / self.charge_efficiency
+            - charge_mwh,
+            self.state_of_charge_mwh * self.discharge_efficiency - discharge_mwh,
+        )
+        power_headroom_mw = np.where(
+            mode_conflict,
+            0.0,
+            np.maximum(
+                np.where(
+                    is_charge,
+                    self.max_charge_mw - charge_power_mw,
+                    self.max_discharge_mw - discharge_power_mw,
+                ),
+                0.0,
+            ),
+        )
+        # Charging allows zero headroom, as in can_commit
+        feasible = ~mode_conflict & (
+            energy_headroom_mwh
+            >= np.where(is_charge, 0.0, energies - ENERGY_TOLERANCE_MWH)
+        )
+
+        deliverable_mwh = np.minimum(energies, energy_headroom_mwh)
+        if interval_hours is not None:
+            # Same order of operations as power * duration.total_seconds() / 3600
+            seconds: float | npt.NDArray[np.float64]
+            if isinstance(interval_hours, (int, float)):
+                seconds = interval_nanoseconds(interval_hours) / 1e9
+            else:
+                seconds = (
+                    np.array([interval_nanoseconds(hours) for hours in interval_hours])
+                    / 1e9
+                )
+            deliverable_mwh = np.minimum(
+                deliverable_mwh, power_headroom_mw * seconds / 3600
             )
-        self.commitments += new_commitments
+        deliverable_mwh = np.where(mode_conflict, 0.0, np.maximum(deliverable_mwh, 0.0))
+
+        return CommitmentFeasibility(
+            feasible=feasible,
+            deliverable_mwh=deliverable_mwh,
+            power_headroom_mw=power_headroom_mw,
+            energy_headroom_mwh=energy_headroom_mwh,
+        )
+
+    def _committed_at(
+        self, *, current_timestamp: pd.Timestamp
+    ) -> tuple[float, float, float, float, bool, bool]:
+        # Energy and power committed in each direction, and whether the battery is
+        # charging or discharging, from one scan of the commitments
+        charge_mwh = discharge_mwh = charge_power_mw = discharge_power_mw = 0.0
+        current_mode = BatteryState.IDLE
+        for commitment in self.commitments:
+            if not commitment.start_time <= current_timestamp < commitment.end_time:
+                continue
+            if commitment.commitment_type is BatteryCommitmentType.CHARGE:
+                charge_mwh += commitment.energy_mwh
+                charge_power_mw += commitment.power_mw
+                mode = BatteryState.CHARGING
+            else:
+                discharge_mwh += commitment.energy_mwh
+                discharge_power_mw += commitment.power_mw
+                mode = BatteryState.DISCHARGING
+            # As in current_mode, the first open commitment sets the mode
+            if current_mode is BatteryState.IDLE:
+                current_mode = mode
+        return (
+            charge_mwh,
+            discharge_mwh,
+            charge_power_mw,
+            discharge_power_mw,
+            current_mode is BatteryState.CHARGING,
+            current_mode is BatteryState.DISCHARGING,
+        )
+
+    def _committed_by_candidate(
+        self, *, times: npt.NDArray[np.int64]
+    ) -> tuple[npt.NDArray[Any], ...]:
+        # As _committed_at, for candidates at different timestamps, from a candidates
+        # by commitments matrix of which commitments are open
+        if len(self.commitments) == 0:
+            zeros = np.zeros(len(times))
+            return zeros, zeros, zeros, zeros, zeros > 0, zeros > 0
+
+        starts = to_nanoseconds(
+            pd.DatetimeIndex([c.start_time for c in self.commitments])
+        )
+        ends = to_nanoseconds(pd.DatetimeIndex([c.end_time for c in self.commitments]))
+        is_charge = np.array(
+            [
+                c.commitment_type is BatteryCommitmentType.CHARGE
+                for c in self.commitments
+            ]
+        )
+        energies = np.array([c.energy_mwh for c in self.commitments])
+        powers = np.array([c.power_mw for c in self.commitments])
+
+        active = (starts <= times[:, None]) & (times[:, None] < ends)
+        active_charge = active & is_charge
+        active_discharge = active & ~is_charge
+        first_is_charge = is_charge[active.argmax(axis=1)]
+        return (
+            np.where(active_charge, energies, 0.0).sum(axis=1),
+            np.where(active_discharge, energies, 0.0).sum(axis=1),
+            np.where(active_charge, powers, 0.0).sum(axis=1),
+            np.where(active_discharge, powers, 0.0).sum(axis=1),
+            active.any(axis=1) & first_is_charge,
+            active.any(axis=1) & ~first_is_charge,
+        )
+
+    def add_commitments(self, *, new_commitments: list[BatteryCommitment]) -> None:
+        # Validate everything before adding anything so a rejected batch leaves
+        # the battery untouched
+        accepted: list[BatteryCommitment] = []
+        for new_commitment in new_commitments:
+            overlapping = [
+                commitment
+                for commitment in self.commitments + accepted
+                if commitment.overlaps(new_commitment)
+            ]
+            if any(
+                commitment.commitment_type is not new_commitment.commitment_type
+                for commitment in overlapping
+            ):
+                # The battery can't charge and discharge at the same time
+                raise CannotAddCommitmentError(
+                    "Cannot add a commitment overlapping one in the opposite direction."
+                )
+
+            if new_commitment.commitment_type is BatteryCommitmentType.CHARGE:
+                max_power_mw = self.max_charge_mw
+            else:
+                max_power_mw = self.max_discharge_mw
+
+            # Power drawn within the new commitment's window only changes when an
+            # overlapping commitment starts, so it is enough to check those points
+            check_times = [new_commitment.start_time] + [
+                commitment.start_time
+                for commitment in overlapping
+                if new_commitment.start_time < commitment.start_time
+            ]
+            for check_time in check_times:
+                committed_power_mw = sum(
+                    commitment.power_mw
+                    for commitment in overlapping
+                    if commitment.start_time <= check_time < commitment.end_time
+                )
+                if (
+                    committed_power_mw + new_commitment.power_mw
+                    > max_power_mw + POWER_TOLERANCE_MW
+                ):
+                    raise CannotAddCommitmentError(
+                        "Cannot add commitment exceeding the battery's power limit."
+                    )
+
+            accepted.append(new_commitment)
+
+        for commitment in accepted:
+            bisect.insort_right(self.commitments, commitment, key=lambda c: c.end_time)
 
     def commit(
         self,
@@ -161,20 +547,27 @@ class Battery:
                 "Cannot commit to the requested battery operation."
             )
 
+        # Commitments are in grid energy, so only part of a charge reaches the
+        # battery and a discharge drains more than it delivers
         actual_energy_committed = energy
 
         if commitment.commitment_type is BatteryCommitmentType.CHARGE:
-            new_state_of_charge = self.state_of_charge_mwh + energy
+            new_state_of_charge = (
+                self.state_of_charge_mwh + energy * self.charge_efficiency
+            )
             if new_state_of_charge > self.capacity_mwh:
                 new_state_of_charge = self.capacity_mwh
-                actual_energy_committed = new_state_of_charge - self.state_of_charge_mwh
+                actual_energy_committed = (
+                    new_state_of_charge - self.state_of_charge_mwh
+                ) / self.charge_efficiency
             self.state_of_charge_mwh = new_state_of_charge
 
         else:
             assert commitment.commitment_type is BatteryCommitmentType.DISCHARGE
-            self.state_of_charge_mwh -= energy
-            if self.state_of_charge_mwh < 0:
+            self.state_of_charge_mwh -= energy / self.discharge_efficiency
+            if self.state_of_charge_mwh < -ENERGY_TOLERANCE_MWH:
                 raise ValueError("State of charge cannot be negative after discharge.")
+            self.state_of_charge_mwh = max(self.state_of_charge_mwh, 0.0)
 
         if output:
             print(
@@ -185,6 +578,5 @@ class Battery:
                 f"Current state of charge: {self.state_of_charge_mwh} MWh."
             )
 
-        commitment_copy = copy.deepcopy(commitment)
-        commitment_copy.energy_mwh = actual_energy_committed
-        return commitment_copy
+        # Shallow copy, as the market is shared and can be large
+        return dataclasses.replace(commitment, energy_mwh=actual_energy_committed)
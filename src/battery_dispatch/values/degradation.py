@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+
+
+@dataclasses.dataclass(frozen=True)
+class DegradationModel:
+    # Cost of every MWh moved into or out of the battery
+    throughput_cost_per_mwh: float = 0.0
+    # Cost of one full cycle (empty -> full -> empty); shallower cycles cost
+    # cycle_cost * depth ** cycle_depth_exponent, where depth is a fraction of capacity
+    cycle_cost: float = 0.0
+    cycle_depth_exponent: float = 1.0
+
+    def cycle_cost_for_range(self, *, range_mwh: float, capacity_mwh: float) -> float:
+        depth = range_mwh / capacity_mwh
+        return float(self.cycle_cost * depth**self.cycle_depth_exponent)
+
+    def round_trip_cost(self, *, energy_mwh: float, capacity_mwh: float) -> float:
+        # Buying and later selling (or vice versa) the same energy moves it through the
+        # battery twice and adds one full cycle of the corresponding depth
+        return 2 * self.throughput_cost_per_mwh * energy_mwh + (
+            self.cycle_cost_for_range(range_mwh=energy_mwh, capacity_mwh=capacity_mwh)
+        )
+
+    def round_trip_costs(
+        self, *, energies_mwh: npt.NDArray[np.float64], capacity_mwh: float
+    ) -> npt.NDArray[np.float64]:
+        # round_trip_cost for each of several energies at once
+        depths = energies_mwh / capacity_mwh
+        return (
+            2 * self.throughput_cost_per_mwh * energies_mwh
+            + self.cycle_cost * depths**self.cycle_depth_exponent
+        )
+
+
+@dataclasses.dataclass
+class RainflowCounter:
+    # Streaming four-point rainflow count over the state of charge trajectory.
+    # The stack holds the unclosed turning points followed by the latest point, so
+    # each point is pushed and popped at most once (amortised O(1) per step)
+    _stack: list[float] = dataclasses.field(default_factory=list)
+
+    def add(self, value: float) -> list[float]:
+        # Returns the ranges of any full cycles closed by this point
+        if len(self._stack) < 2:
+            if len(self._stack) == 0 or value != self._stack[-1]:
+                self._stack.append(value)
+            return []
+
+        previous_move = self._stack[-1] - self._stack[-2]
+        move = value - self._stack[-1]
+        if move == 0:
+            return []
+        if (move > 0) == (previous_move > 0):
+            # Still heading the same way, so the latest point just moves further out
+            self._stack[-1] = value
+        else:
+            self._stack.append(value)
+
+        closed_ranges: list[float] = []
+        while len(self._stack) >= 4:
+            a, b, c, d = self._stack[-4:]
+            inner_range = abs(c - b)
+            if inner_range > abs(b - a) or inner_range > abs(d - c):
+                break
+            # b -> c is enclosed by its neighbours, so it forms a full cycle
+            closed_ranges.append(inner_range)
+            del self._stack[-3:-1]
+
+        return closed_ranges
+
+    def residual_ranges(self) -> list[float]:
+        # Each remaining move counts as a half cycle
+        return [
+            abs(end - start) for start, end in zip(self._stack[:-1], self._stack[1:])
+        ]
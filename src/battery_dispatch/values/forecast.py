@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.values.alignment import interval_nanoseconds, to_nanoseconds
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+
+class ForecastError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class ForecastStore:
+    # Price forecasts for one market, one row per vintage. Row v was issued at
+    # issue_times[v] and holds the forecasts for consecutive intervals starting at
+    # first_target_times[v]; shorter vintages are padded with NaN. Times are
+    # nanoseconds since the epoch so the arrays can be memory-mapped as they are
+    issue_times: npt.NDArray[np.int64]
+    first_target_times: npt.NDArray[np.int64]
+    values: npt.NDArray[np.float64]
+    interval_hours: float
+
+    def __post_init__(self) -> None:
+        if self.values.ndim != 2 or len(self.values) != len(self.issue_times):
+            raise ForecastError("Expected one row of forecasts per vintage")
+        if len(self.first_target_times) != len(self.issue_times):
+            raise ForecastError("Expected one first target time per vintage")
+        if np.any(np.diff(self.issue_times) <= 0):
+            raise ForecastError("Vintages must be in strictly increasing issue order")
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, *, interval_hours: float) -> ForecastStore:
+        # Long format with issue_time, target_time and price columns
+        issue_times = to_nanoseconds(frame["issue_time"])
+        target_times = to_nanoseconds(frame["target_time"])
+        interval_ns = interval_nanoseconds(interval_hours)
+
+        unique_issue_times, vintages = np.unique(issue_times, return_inverse=True)
+        first_target_times = np.full(len(unique_issue_times), np.iinfo(np.int64).max)
+        np.minimum.at(first_target_times, vintages, target_times)
+        offsets, remainders = np.divmod(
+            target_times - first_target_times[vintages], interval_ns
+        )
+        if np.any(remainders != 0):
+            raise ForecastError(
+                f"Target times must be {interval_hours}h apart within a vintage"
+            )
+
+        width = int(offsets.max()) + 1 if len(offsets) > 0 else 0
+        values = np.full((len(unique_issue_times), width), np.nan)
+        values[vintages, offsets] = frame["price"].to_numpy(dtype=float)
+        return cls(
+            issue_times=unique_issue_times,
+            first_target_times=first_target_times,
+            values=values,
+            interval_hours=interval_hours,
+        )
+
+    def save(self, directory: str) -> None:
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "issue_times.npy", self.issue_times)
+        np.save(path / "first_target_times.npy", self.first_target_times)
+        np.save(path / "values.npy", self.values)
+        (path / "metadata.json").write_text(
+            json.dumps({"interval_hours": self.interval_hours})
+        )
+
+    @classmethod
+    def load(cls, directory: str, *, memory_map: bool = True) -> ForecastStore:
+        # Memory-mapped by default, so only the pages a run touches are read in
+        path = Path(directory)
+        if not (path / "metadata.json").is_file():
+            raise ForecastError(f"No forecast store found in {directory}")
+
+        mmap_mode: Literal["r"] | None = "r" if memory_map else None
+        metadata = json.loads((path / "metadata.json").read_text())
+        return cls(
+            issue_times=np.load(path / "issue_times.npy"),
+            first_target_times=np.load(path / "first_target_times.npy"),
+            values=np.load(path / "values.npy", mmap_mode=mmap_mode),
+            interval_hours=float(metadata["interval_hours"]),
+        )
+
+    def vintage_indices(self, *, timestamps: pd.DatetimeIndex) -> npt.NDArray[np.int64]:
+        # The latest vintage issued at or before each timestamp, or -1 if none was
+        return (
+            np.searchsorted(self.issue_times, to_nanoseconds(timestamps), side="right")
+            - 1
+        )
+
+    def lookahead_extrema(
+        self, *, interval_starts: pd.DatetimeIndex, number_of_intervals: int
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        # For a decision at each interval start, the highest and lowest forecast over
+        # the following number_of_intervals intervals, taken from the latest vintage
+        # available at that decision. Intervals without a forecast are skipped, and
+        # decisions without any give NaN, as the realised lookahead does at the end
+        starts = to_nanoseconds(interval_starts)
+        highest = np.full(len(starts), np.nan)
+        lowest = np.full(len(starts), np.nan)
+        if len(self.issue_times) == 0:
+            return highest, lowest
+
+        vintages = self.vintage_indices(timestamps=interval_starts)
+        has_vintage = vintages >= 0
+        first_target_times = self.first_target_times[np.maximum(vintages, 0)]
+        interval_ns = interval_nanoseconds(self.interval_hours)
+        width = self.values.shape[1]
+
+        # One pass per step ahead keeps memory linear in the number of decisions
+        for step in range(1, number_of_intervals + 1):
+            offsets, remainders = np.divmod(
+                starts + step * interval_ns - first_target_times, interval_ns
+            )
+            available = (
+                has_vintage & (remainders == 0) & (offsets >= 0) & (offsets < width)
+            )
+            forecast = np.full(len(starts), np.nan)
+            forecast[available] = self.values[vintages[available], offsets[available]]
+            highest = np.fmax(highest, forecast)
+            lowest = np.fmin(lowest, forecast)
+        return highest, lowest
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import dataclasses
+from array import array
+from typing import TYPE_CHECKING
+
+from battery_dispatch._lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    np = lazy_import("numpy")
+
+# Allowance for floating point error accumulated over a run's settlements
+ENERGY_BALANCE_TOLERANCE_MWH = 1e-6
+
+
+class EnergyBalanceError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class EnergyBalanceAudit:
+    grid_import_mwh: float
+    grid_export_mwh: float
+    losses_mwh: float
+    change_in_state_of_charge_mwh: float
+
+    @property
+    def residual_mwh(self) -> float:
+        return (
+            self.grid_import_mwh
+            - self.grid_export_mwh
+            - self.losses_mwh
+            - self.change_in_state_of_charge_mwh
+        )
+
+    @property
+    def is_balanced(self) -> bool:
+        return abs(self.residual_mwh) <= ENERGY_BALANCE_TOLERANCE_MWH
+
+
+@dataclasses.dataclass
+class EnergyLedger:
+    # One entry per settled commitment. Appending to typed arrays keeps settlement
+    # cheap, and the audit reads them as NumPy arrays without copying
+    # The start of the interval each commitment settled, in nanoseconds since the epoch
+    start_times_ns: array[int] = dataclasses.field(default_factory=lambda: array("q"))
+    grid_import_mwh: array[float] = dataclasses.field(
+        default_factory=lambda: array("d")
+    )
+    grid_export_mwh: array[float] = dataclasses.field(
+        default_factory=lambda: array("d")
+    )
+    losses_mwh: array[float] = dataclasses.field(default_factory=lambda: array("d"))
+
+    def __len__(self) -> int:
+        return len(self.losses_mwh)
+
+    def record(
+        self,
+        *,
+        start_time_ns: int,
+        grid_import_mwh: float,
+        grid_export_mwh: float,
+        losses_mwh: float,
+    ) -> None:
+        self.start_times_ns.append(start_time_ns)
+        self.grid_import_mwh.append(grid_import_mwh)
+        self.grid_export_mwh.append(grid_export_mwh)
+        self.losses_mwh.append(losses_mwh)
+
+    def audit(
+        self,
+        *,
+        initial_state_of_charge_mwh: float,
+        final_state_of_charge_mwh: float,
+    ) -> EnergyBalanceAudit:
+        return EnergyBalanceAudit(
+            grid_import_mwh=float(np.frombuffer(self.grid_import_mwh).sum()),
+            grid_export_mwh=float(np.frombuffer(self.grid_export_mwh).sum()),
+            losses_mwh=float(np.frombuffer(self.losses_mwh).sum()),
+            change_in_state_of_charge_mwh=final_state_of_charge_mwh
+            - initial_state_of_charge_mwh,
+        )
@@ -1,10 +1,27 @@
 from __future__ import annotations
 
+import builtins
 import dataclasses
+import hashlib
 from functools import cached_property
+from typing import TYPE_CHECKING
 
-import numpy as np
-import pandas as pd
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.values.alignment import interval_nanoseconds, to_nanoseconds
+from battery_dispatch.values.forecast import ForecastStore
+from battery_dispatch.values.price_validation import PriceValidationReport
+from battery_dispatch.values.range_query import RangeExtremaIndex
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+
+PRICE_DTYPES = ("float64", "float32")
 
 
 @dataclasses.dataclass
@@ -14,17 +31,247 @@ class Market:
     highest_price_across_next_n_hours: pd.Series[float]
     lowest_price_across_next_n_hours: pd.Series[float]
     interval_hours: float
+    # When set, lookahead queries see these forecasts rather than the realised prices,
+    # which are still what commitments settle at
+    forecasts: ForecastStore | None = None
+    # What was found and fixed in the price data when it was loaded
+    validation_report: PriceValidationReport | None = None
+    # A slice answers range queries from the market it was sliced from, whose data
+    # starts _source_offset intervals before the slice's
+    _source: Market | None = dataclasses.field(default=None, repr=False, compare=False)
+    _source_offset: int = dataclasses.field(default=0, repr=False, compare=False)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        *,
+        name: str,
+        timestamps: pd.DatetimeIndex,
+        prices: npt.ArrayLike,
+        highest_price_across_next_n_hours: npt.ArrayLike,
+        lowest_price_across_next_n_hours: npt.ArrayLike,
+        interval_hours: float,
+        forecasts: ForecastStore | None = None,
+        dtype: str = "float64",
+    ) -> Market:
+        # The three series are views onto the rows of one read-only block and share
+        # one index, so a market costs a timestamp and three prices per interval,
+        # or a timestamp and three float32s with dtype="float32"
+        if dtype not in PRICE_DTYPES:
+            raise ValueError(
+                f"Unknown price dtype {dtype!r}, expected one of {PRICE_DTYPES}"
+            )
+
+        block = np.empty((3, len(timestamps)), dtype=dtype)
+        block[0] = prices
+        block[1] = highest_price_across_next_n_hours
+        block[2] = lowest_price_across_next_n_hours
+        block.flags.writeable = False
+        return cls(
+            name=name,
+            prices=pd.Series(block[0], index=timestamps, copy=False),
+            highest_price_across_next_n_hours=pd.Series(
+                block[1], index=timestamps, copy=False
+            ),
+            lowest_price_across_next_n_hours=pd.Series(
+                block[2], index=timestamps, copy=False
+            ),
+            interval_hours=interval_hours,
+            forecasts=forecasts,
+        )
+
+    def slice(
+        self,
+        *,
+        start: pd.Timestamp | str | None = None,
+        end: pd.Timestamp | str | None = None,
+    ) -> Market:
+        # The intervals starting in [start, end), as views onto this market's data.
+        # Lookaheads, both the stored ones and those queried for other horizons,
+        # are over the full data, so decisions near the end of the slice still see
+        # the prices that follow it, as they would in a full run
+        index = self.prices.index
+        start_position = 0 if start is None else index.searchsorted(pd.Timestamp(start))
+        end_position = (
+            len(index) if end is None else index.searchsorted(pd.Timestamp(end))
+        )
+        positions = slice(int(start_position), int(end_position))
+        timestamps = index[positions]
+        return dataclasses.replace(
+            self,
+            _source=self._source if self._source is not None else self,
+            _source_offset=self._source_offset + positions.start,
+            prices=_view(self.prices, positions=positions, index=timestamps),
+            highest_price_across_next_n_hours=_view(
+                self.highest_price_across_next_n_hours,
+                positions=positions,
+                index=timestamps,
+            ),
+            lowest_price_across_next_n_hours=_view(
+                self.lowest_price_across_next_n_hours,
+                positions=positions,
+                index=timestamps,
+            ),
+        )
 
     def interval_timedelta(self) -> pd.Timedelta:
-        return pd.Timedelta(hours=self.interval_hours)
+        return self._interval_timedelta
+
+    @cached_property
+    def _interval_timedelta(self) -> pd.Timedelta:
+        return pd.Timedelta(self.interval_ns, unit="ns")
+
+    @cached_property
+    def interval_ns(self) -> int:
+        return interval_nanoseconds(self.interval_hours)
+
+    @cached_property
+    def _grid_origin_ns(self) -> int:
+        # Intervals run back to back from the first price
+        if len(self.prices) == 0:
+            return 0
+        return int(to_nanoseconds(self.prices.index[:1])[0])
 
     def is_interval_start(self, *, timestamp: pd.Timestamp) -> bool:
-        if self.interval_hours == 1.0:
-            return bool(timestamp.minute == 0)
-        elif self.interval_hours == 0.5:
-            return timestamp.minute in (0, 30)
-        return False
+        return (timestamp.value - self._grid_origin_ns) % self.interval_ns == 0
+
+    def interval_start_mask(
+        self, *, timestamps: pd.DatetimeIndex
+    ) -> npt.NDArray[np.bool_]:
+        # Vectorised is_interval_start
+        mask: npt.NDArray[np.bool_] = (
+            to_nanoseconds(timestamps) - self._grid_origin_ns
+        ) % self.interval_ns == 0
+        return mask
+
+    @cached_property
+    def price_values(self) -> npt.NDArray[np.floating]:
+        # In the market's own dtype, so a float32 market isn't copied up to float64
+        return self.prices.to_numpy()
+
+    @cached_property
+    def fingerprint(self) -> str:
+        # Identifies the price data regardless of the market's name, so results
+        # computed from it can be reused
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(self.interval_hours).encode())
+        digest.update(to_nanoseconds(self.prices.index).tobytes())
+        digest.update(self.prices.to_numpy(dtype=float).tobytes())
+        return digest.hexdigest()
 
     @cached_property
     def average_price(self) -> float:
         return float(np.mean(list(self.prices)))
+
+    @cached_property
+    def price_range_index(self) -> RangeExtremaIndex:
+        # Over the realised prices, which are what commitments settle at. Queries
+        # made from a decision's point of view go through the forecasts instead, when
+        # the market has them. A slice shares the index of the market it was sliced
+        # from, in which its own positions start at _source_offset
+        if self._source is not None:
+            return self._source.price_range_index
+        return RangeExtremaIndex.build(self.prices.to_numpy(dtype=float))
+
+    def number_of_intervals_in(self, *, number_of_hours: float) -> int:
+        return int(interval_nanoseconds(number_of_hours) // self.interval_ns)
+
+    def highest_price_between(self, *, start_index: int, end_index: int) -> float:
+        # Highest price over the intervals (start_index, end_index], as seen when
+        # deciding at the start of interval start_index
+        if self.forecasts is not None:
+            highest, _ = self._forecast_between(
+                start_index=start_index, end_index=end_index
+            )
+            return highest
+        return self.price_range_index.max_between(
+            start_index + self._source_offset, end_index + self._source_offset
+        )
+
+    def lowest_price_between(self, *, start_index: int, end_index: int) -> float:
+        # Lowest price over the intervals (start_index, end_index], as seen when
+        # deciding at the start of interval start_index
+        if self.forecasts is not None:
+            _, lowest = self._forecast_between(
+                start_index=start_index, end_index=end_index
+            )
+            return lowest
+        return self.price_range_index.min_between(
+            start_index + self._source_offset, end_index + self._source_offset
+        )
+
+    def price_extrema_over_next_hours(
+        self, *, number_of_hours: float
+    ) -> tuple[pd.Series[float], pd.Series[float]]:
+        # The highest and lowest lookahead series together, so forecasts are only
+        # scanned once for both
+        if self.forecasts is not None:
+            return self._forecast_lookahead(number_of_hours=number_of_hours)
+        return (
+            self.highest_prices_over_next_hours(number_of_hours=number_of_hours),
+            self.lowest_prices_over_next_hours(number_of_hours=number_of_hours),
+        )
+
+    def highest_prices_over_next_hours(
+        self, *, number_of_hours: float
+    ) -> pd.Series[float]:
+        if self.forecasts is not None:
+            return self._forecast_lookahead(number_of_hours=number_of_hours)[0]
+        return pd.Series(
+            self.price_range_index.max_over_next(
+                self.number_of_intervals_in(number_of_hours=number_of_hours),
+                positions=self._source_positions,
+            ),
+            index=self.prices.index,
+        )
+
+    def lowest_prices_over_next_hours(
+        self, *, number_of_hours: float
+    ) -> pd.Series[float]:
+        if self.forecasts is not None:
+            return self._forecast_lookahead(number_of_hours=number_of_hours)[1]
+        return pd.Series(
+            self.price_range_index.min_over_next(
+                self.number_of_intervals_in(number_of_hours=number_of_hours),
+                positions=self._source_positions,
+            ),
+            index=self.prices.index,
+        )
+
+    @property
+    def _source_positions(self) -> builtins.slice:
+        return slice(self._source_offset, self._source_offset + len(self.prices))
+
+    def _forecast_between(
+        self, *, start_index: int, end_index: int
+    ) -> tuple[float, float]:
+        assert self.forecasts is not None
+        decision_time = pd.DatetimeIndex(
+            [pd.Timestamp(self._grid_origin_ns + start_index * self.interval_ns)]
+        )
+        highest, lowest = self.forecasts.lookahead_extrema(
+            interval_starts=decision_time,
+            number_of_intervals=max(end_index - start_index, 0),
+        )
+        return float(highest[0]), float(lowest[0])
+
+    def _forecast_lookahead(
+        self, *, number_of_hours: float
+    ) -> tuple[pd.Series[float], pd.Series[float]]:
+        assert self.forecasts is not None
+        highest, lowest = self.forecasts.lookahead_extrema(
+            interval_starts=pd.DatetimeIndex(self.prices.index),
+            number_of_intervals=self.number_of_intervals_in(
+                number_of_hours=number_of_hours
+            ),
+        )
+        return (
+            pd.Series(highest, index=self.prices.index),
+            pd.Series(lowest, index=self.prices.index),
+        )
+
+
+def _view(
+    series: pd.Series[float], *, positions: slice, index: pd.Index
+) -> pd.Series[float]:
+    return pd.Series(series.to_numpy()[positions], index=index, copy=False)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING
+
+from battery_dispatch._lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+
+    from battery_dispatch.values.market import Market
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# P&L by market and by day and month, accumulated as each commitment settles. The
+# accumulators are sized up front from the markets' date range, so each settlement
+# adds into a few array cells and reporting never has to group a timeline
+
+PNL_METRICS = ("revenue", "cost", "throughput_mwh", "cycles")
+
+
+@dataclasses.dataclass
+class PnlRollup:
+    market_names: tuple[str, ...]
+    # Proleptic Gregorian ordinal of the first day, and year * 12 + month - 1 of the
+    # first month
+    first_day: int
+    first_month: int
+    # Metric by market by period
+    daily: npt.NDArray[np.float64]
+    monthly: npt.NDArray[np.float64]
+    _market_positions: dict[str, int] = dataclasses.field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._market_positions = {
+            name: position for position, name in enumerate(self.market_names)
+        }
+
+    @classmethod
+    def for_markets(cls, all_markets: list[Market]) -> PnlRollup:
+        # Markets are told apart by name
+        market_names = tuple(dict.fromkeys(market.name for market in all_markets))
+        timestamps = [
+            timestamp
+            for market in all_markets
+            if len(market.prices) > 0
+            for timestamp in (market.prices.index[0], market.prices.index[-1])
+        ]
+        if len(timestamps) == 0:
+            raise ValueError("Can't size a P&L rollup for markets without prices")
+
+        first, last = min(timestamps), max(timestamps)
+        first_month = _month(first)
+        return cls(
+            market_names=market_names,
+            first_day=first.toordinal(),
+            first_month=first_month,
+            daily=np.zeros(
+                (
+                    len(PNL_METRICS),
+                    len(market_names),
+                    last.toordinal() - first.toordinal() + 1,
+                )
+            ),
+            monthly=np.zeros(
+                (len(PNL_METRICS), len(market_names), _month(last) - first_month + 1)
+            ),
+        )
+
+    def cleared(self) -> PnlRollup:
+        return dataclasses.replace(
+            self, daily=np.zeros_like(self.daily), monthly=np.zeros_like(self.monthly)
+        )
+
+    def copy(self) -> PnlRollup:
+        return dataclasses.replace(
+            self, daily=self.daily.copy(), monthly=self.monthly.copy()
+        )
+
+    def record(
+        self,
+        *,
+        market_name: str,
+        timestamp: pd.Timestamp,
+        revenue: float,
+        cost: float,
+        throughput_mwh: float,
+        cycles: float,
+    ) -> None:
+        market = self._market_positions[market_name]
+        day = timestamp.toordinal() - self.first_day
+        month = _month(timestamp) - self.first_month
+        if not 0 <= day < self.daily.shape[2]:
+            raise ValueError(f"{timestamp} is outside the P&L rollup's date range")
+
+        daily = self.daily
+        daily[0, market, day] += revenue
+        daily[1, market, day] += cost
+        daily[2, market, day] += throughput_mwh
+        daily[3, market, day] += cycles
+        monthly = self.monthly
+        monthly[0, market, month] += revenue
+        monthly[1, market, month] += cost
+        monthly[2, market, month] += throughput_mwh
+        monthly[3, market, month] += cycles
+
+    def by_day(self) -> pd.DataFrame:
+        first_day = pd.Timestamp.fromordinal(self.first_day)
+        return self._frame(
+            self.daily,
+            periods=pd.date_range(
+                start=first_day, periods=self.daily.shape[2], freq="D"
+            ),
+            period_name="day",
+        )
+
+    def by_month(self) -> pd.DataFrame:
+        year, month = divmod(self.first_month, 12)
+        return self._frame(
+            self.monthly,
+            periods=pd.date_range(
+                start=pd.Timestamp(year=year, month=month + 1, day=1),
+                periods=self.monthly.shape[2],
+                freq="MS",
+            ),
+            period_name="month",
+        )
+
+    def by_market(self) -> pd.DataFrame:
+        frame = pd.DataFrame(
+            self.daily.sum(axis=2).T,
+            index=pd.Index(self.market_names, name="market"),
+            columns=list(PNL_METRICS),
+        )
+        frame.insert(2, "profit", frame["revenue"] - frame["cost"])
+        return frame
+
+    def _frame(
+        self,
+        values: npt.NDArray[np.float64],
+        *,
+        periods: pd.DatetimeIndex,
+        period_name: str,
+    ) -> pd.DataFrame:
+        # One row per market and period
+        frame = pd.DataFrame(
+            values.reshape(len(PNL_METRICS), -1).T,
+            index=pd.MultiIndex.from_product(
+                [self.market_names, periods], names=["market", period_name]
+            ),
+            columns=list(PNL_METRICS),
+        )
+        frame.insert(2, "profit", frame["revenue"] - frame["cost"])
+        return frame
+
+
+def _month(timestamp: pd.Timestamp) -> int:
+    return timestamp.year * 12 + timestamp.month - 1
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING
+
+from battery_dispatch._lazy import lazy_import
+from battery_dispatch.values.alignment import interval_nanoseconds, to_nanoseconds
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+# Price data is checked once when it's loaded, so that the simulation can assume
+# one finite price per interval on a regular grid. Every check works on the whole
+# timestamp and price arrays at once
+
+FILL_POLICIES = ("interpolate", "forward_fill", "raise")
+# Repeated timestamps are usually the repeated hour when clocks go back
+DUPLICATE_POLICIES = ("mean", "first", "last", "raise")
+OUTLIER_POLICIES = ("keep", "clip", "fill")
+# Prices further than this many robust standard deviations (scaled median absolute
+# deviation) from the median are reported as outliers. Genuine price spikes can
+# be further out than this, so outliers are only reported unless asked otherwise
+OUTLIER_THRESHOLD = 10.0
+MAD_TO_STANDARD_DEVIATION = 1.4826
+
+
+class PriceValidationError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class PriceValidationReport:
+    number_of_prices: int
+    number_of_intervals: int
+    out_of_order: int
+    duplicate_timestamps: int
+    missing_intervals: int
+    missing_prices: int
+    outliers: int
+    filled: int
+
+    @property
+    def is_clean(self) -> bool:
+        # Outliers aren't counted, as they may well be genuine
+        return (
+            self.out_of_order
+            == self.duplicate_timestamps
+            == self.missing_intervals
+            == self.missing_prices
+            == 0
+        )
+
+    def describe(self) -> str:
+        return (
+            f"{self.number_of_prices} prices over {self.number_of_intervals} "
+            f"intervals: {self.out_of_order} out of order, "
+            f"{self.duplicate_timestamps} duplicate timestamps, "
+            f"{self.missing_intervals} missing intervals, "
+            f"{self.missing_prices} missing prices, {self.outliers} outliers, "
+            f"{self.filled} filled"
+        )
+
+
+def validate_price_series(
+    price_series: pd.Series[float],
+    *,
+    interval_hours: float,
+    fill_policy: str = "interpolate",
+    duplicate_policy: str = "mean",
+    outlier_policy: str = "keep",
+    outlier_threshold: float = OUTLIER_THRESHOLD,
+) -> tuple[pd.Series[float], PriceValidationReport]:
+    # Returns the prices on a dense grid of interval_hours steps from the first
+    # timestamp, in order, with one finite price per interval
+    _check_policy(fill_policy, FILL_POLICIES, "fill")
+    _check_policy(duplicate_policy, DUPLICATE_POLICIES, "duplicate")
+    _check_policy(outlier_policy, OUTLIER_POLICIES, "outlier")
+
+    times = to_nanoseconds(price_series.index)
+    values = np.asarray(price_series, dtype=np.float64)
+    if len(times) == 0:
+        return price_series.astype(float), PriceValidationReport(
+            number_of_prices=0,
+            number_of_intervals=0,
+            out_of_order=0,
+            duplicate_timestamps=0,
+            missing_intervals=0,
+            missing_prices=0,
+            outliers=0,
+            filled=0,
+        )
+
+    out_of_order = int(np.count_nonzero(np.diff(times) < 0))
+    if out_of_order > 0:
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        values = values[order]
+
+    unique_times, values, duplicate_timestamps = _merge_duplicates(
+        times=times, values=values, duplicate_policy=duplicate_policy
+    )
+
+    interval_ns = interval_nanoseconds(interval_hours)
+    offsets, remainders = np.divmod(unique_times - unique_times[0], interval_ns)
+    off_grid = np.flatnonzero(remainders != 0)
+    if len(off_grid) > 0:
+        raise PriceValidationError(
+            f"{len(off_grid)} timestamps aren't on the {interval_hours}h grid from "
+            f"{pd.Timestamp(unique_times[0])}, the first is "
+            f"{pd.Timestamp(unique_times[off_grid[0]])}"
+        )
+
+    number_of_intervals = int(offsets[-1]) + 1
+    prices = np.full(number_of_intervals, np.nan)
+    prices[offsets] = values
+    missing_prices = int(np.count_nonzero(np.isnan(values)))
+
+    outliers = _outlier_mask(prices=prices, threshold=outlier_threshold)
+    if outlier_policy == "clip" and outliers.any():
+        finite = prices[~np.isnan(prices)]
+        median = np.median(finite)
+        limit = outlier_threshold * _robust_standard_deviation(finite)
+        prices = np.clip(prices, median - limit, median + limit)
+    elif outlier_policy == "fill":
+        prices[outliers] = np.nan
+
+    missing = np.isnan(prices)
+    if missing.any():
+        if fill_policy == "raise":
+            raise PriceValidationError(
+                f"{number_of_intervals - len(unique_times)} missing intervals and "
+                f"{missing_prices} missing prices, the first at "
+                f"{pd.Timestamp(unique_times[0] + interval_ns * np.argmax(missing))}"
+            )
+        prices = _fill(prices=prices, missing=missing, fill_policy=fill_policy)
+
+    index = pd.DatetimeIndex(
+        (
+            unique_times[0]
+            + interval_ns * np.arange(number_of_intervals, dtype=np.int64)
+        ).astype("datetime64[ns]")
+    )
+    if isinstance(price_series.index, pd.DatetimeIndex) and price_series.index.tz:
+        index = index.tz_localize("UTC").tz_convert(price_series.index.tz)
+
+    return pd.Series(prices, index=index, name=price_series.name), (
+        PriceValidationReport(
+            number_of_prices=len(times),
+            number_of_intervals=number_of_intervals,
+            out_of_order=out_of_order,
+            duplicate_timestamps=duplicate_timestamps,
+            missing_intervals=number_of_intervals - len(unique_times),
+            missing_prices=missing_prices,
+            outliers=int(np.count_nonzero(outliers)),
+            filled=int(np.count_nonzero(missing)),
+        )
+    )
+
+
+def _check_policy(policy: str, policies: tuple[str, ...], kind: str) -> None:
+    if policy not in policies:
+        raise ValueError(
+            f"Unknown {kind} policy {policy!r}, expected one of {policies}"
+        )
+
+
+def _merge_duplicates(
+    *,
+    times: npt.NDArray[np.int64],
+    values: npt.NDArray[np.float64],
+    duplicate_policy: str,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64], int]:
+    # times must be sorted, so each timestamp's prices are contiguous
+    unique_times, first_positions, counts = np.unique(
+        times, return_index=True, return_counts=True
+    )
+    duplicate_timestamps = int(np.count_nonzero(counts > 1))
+    if duplicate_timestamps == 0:
+        return unique_times, values, 0
+
+    if duplicate_policy == "raise":
+        raise PriceValidationError(
+            f"{duplicate_timestamps} timestamps appear more than once, the first is "
+            f"{pd.Timestamp(unique_times[np.argmax(counts > 1)])}"
+        )
+    if duplicate_policy == "first":
+        return unique_times, values[first_positions], duplicate_timestamps
+    if duplicate_policy == "last":
+        return (
+            unique_times,
+            values[first_positions + counts - 1],
+            duplicate_timestamps,
+        )
+
+    # Mean of the prices that are there
+    groups = np.repeat(np.arange(len(unique_times)), counts)
+    known = ~np.isnan(values)
+    totals = np.bincount(
+        groups[known], weights=values[known], minlength=len(unique_times)
+    )
+    known_counts = np.bincount(groups[known], minlength=len(unique_times))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(known_counts > 0, totals / known_counts, np.nan)
+    return unique_times, means, duplicate_timestamps
+
+
+def _robust_standard_deviation(values: npt.NDArray[np.float64]) -> float:
+    return float(
+        MAD_TO_STANDARD_DEVIATION * np.median(np.abs(values - np.median(values)))
+    )
+
+
+def _outlier_mask(
+    *, prices: npt.NDArray[np.float64], threshold: float
+) -> npt.NDArray[np.bool_]:
+    known = ~np.isnan(prices)
+    outliers = np.zeros(len(prices), dtype=bool)
+    if not known.any():
+        return outliers
+
+    deviation = _robust_standard_deviation(prices[known])
+    if deviation == 0:
+        return outliers
+    outliers[known] = (
+        np.abs(prices[known] - np.median(prices[known])) > threshold * deviation
+    )
+    return outliers
+
+
+def _fill(
+    *,
+    prices: npt.NDArray[np.float64],
+    missing: npt.NDArray[np.bool_],
+    fill_policy: str,
+) -> npt.NDArray[np.float64]:
+    known = np.flatnonzero(~missing)
+    if len(known) == 0:
+        raise PriceValidationError("There are no prices to fill the gaps from")
+
+    positions = np.arange(len(prices))
+    if fill_policy == "interpolate":
+        # Gaps at either end take the nearest price
+        return np.interp(positions, known, prices[known])
+
+    assert fill_policy == "forward_fill"
+    # Leading gaps take the first price
+    last_known = np.maximum.accumulate(np.where(missing, -1, positions))
+    return prices[np.where(last_known < 0, known[0], last_known)]
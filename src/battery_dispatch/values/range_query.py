@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import TYPE_CHECKING, Any, Callable
+
+from battery_dispatch._lazy import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+else:
+    np = lazy_import("numpy")
+
+
+@dataclasses.dataclass(frozen=True)
+class RangeExtremaIndex:
+    # Sparse tables over a price array: level k holds the max/min of
+    # values[j : j + 2 ** k], so any range is covered by two overlapping blocks.
+    # Built once in O(n log n), after which every range query is O(1). NaNs are
+    # skipped, as pandas does, and empty ranges give NaN
+    maxima: list[npt.NDArray[np.float64]]
+    minima: list[npt.NDArray[np.float64]]
+
+    @classmethod
+    def build(cls, values: npt.ArrayLike) -> RangeExtremaIndex:
+        array = np.asarray(values, dtype=np.float64)
+        maxima = [array]
+        minima = [array]
+        width = 1
+        while 2 * width <= len(array):
+            maxima.append(np.fmax(maxima[-1][:-width], maxima[-1][width:]))
+            minima.append(np.fmin(minima[-1][:-width], minima[-1][width:]))
+            width *= 2
+        return cls(maxima=maxima, minima=minima)
+
+    def __len__(self) -> int:
+        return len(self.maxima[0])
+
+    def max_between(self, start_index: int, end_index: int) -> float:
+        # Max over the intervals (start_index, end_index]
+        return self._query(self.maxima, np.fmax, start_index, end_index)
+
+    def min_between(self, start_index: int, end_index: int) -> float:
+        # Min over the intervals (start_index, end_index]
+        return self._query(self.minima, np.fmin, start_index, end_index)
+
+    def max_over_next(
+        self, number_of_intervals: int, positions: slice = slice(None)
+    ) -> npt.NDArray[np.float64]:
+        # For every i in positions, the max over (i, i + number_of_intervals]
+        return self._query_all(self.maxima, np.fmax, number_of_intervals, positions)
+
+    def min_over_next(
+        self, number_of_intervals: int, positions: slice = slice(None)
+    ) -> npt.NDArray[np.float64]:
+        # For every i in positions, the min over (i, i + number_of_intervals]
+        return self._query_all(self.minima, np.fmin, number_of_intervals, positions)
+
+    def _query(
+        self,
+        levels: list[npt.NDArray[np.float64]],
+        combine: Callable[[Any, Any], Any],
+        start_index: int,
+        end_index: int,
+    ) -> float:
+        start = max(start_index + 1, 0)
+        stop = min(end_index + 1, len(self))
+        if stop <= start:
+            return float("nan")
+
+        level = (stop - start).bit_length() - 1
+        return float(combine(levels[level][start], levels[level][stop - (1 << level)]))
+
+    def _query_all(
+        self,
+        levels: list[npt.NDArray[np.float64]],
+        combine: Callable[[Any, Any], Any],
+        number_of_intervals: int,
+        positions: slice,
+    ) -> npt.NDArray[np.float64]:
+        length = len(self)
+        first, last, _ = positions.indices(length)
+        starts = np.arange(first + 1, max(last, first) + 1)
+        stops = np.minimum(starts + number_of_intervals, length)
+        widths = stops - starts
+
+        result = np.full(len(starts), np.nan)
+        # Windows only shrink at the very end of the series, so there are only a
+        # handful of distinct levels to look up
+        non_empty = widths > 0
+        query_levels = np.zeros(len(starts), dtype=np.int64)
+        query_levels[non_empty] = np.floor(np.log2(widths[non_empty])).astype(np.int64)
+        for level in np.unique(query_levels[non_empty]):
+            mask = non_empty & (query_levels == level)
+            result[mask] = combine(
+                levels[level][starts[mask]],
+                levels[level][stops[mask] - (1 << int(level))],
+            )
+        return result
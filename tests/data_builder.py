@@ -9,6 +9,7 @@ from battery_dispatch.values.battery import (
     BatteryCommitment,
     BatteryCommitmentType,
 )
+from battery_dispatch.values.degradation import DegradationModel
 from battery_dispatch.values.market import Market
 from utils import Undefined, undefined
 
@@ -23,6 +24,7 @@ class DataBuilder:
         discharge_efficiency: Union[Undefined, float] = undefined,
         state_of_charge_mwh: Union[Undefined, float] = undefined,
         commitments: Union[Undefined, list[BatteryCommitment]] = undefined,
+        degradation: Union[Undefined, DegradationModel, None] = undefined,
     ) -> Battery:
         if capacity_mwh is undefined:
             capacity_mwh = 100.0
@@ -45,6 +47,9 @@ class DataBuilder:
         if commitments is undefined:
             commitments = []
 
+        if degradation is undefined:
+            degradation = None
+
         return Battery(
             capacity_mwh=capacity_mwh,
             max_charge_mw=max_charge_mw,
@@ -53,6 +58,7 @@ class DataBuilder:
             discharge_efficiency=discharge_efficiency,
             state_of_charge_mwh=state_of_charge_mwh,
             commitments=commitments,
+            degradation=degradation,
         )
 
     def add_market(
@@ -104,8 +110,8 @@ class DataBuilder:
         market: Union[Undefined, Market] = undefined,
         commitment_type: Union[Undefined, BatteryCommitmentType] = undefined,
         energy_mwh: Union[Undefined, float] = undefined,
-        start_time: Union[Undefined, str] = undefined,
-        end_time: Union[Undefined, str] = undefined,
+        start_time: Union[Undefined, str, pd.Timestamp] = undefined,
+        end_time: Union[Undefined, str, pd.Timestamp] = undefined,
     ) -> BatteryCommitment:
         if market is undefined:
             market = self.add_market()
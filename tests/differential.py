@@ -0,0 +1,360 @@
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import time
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import (
+    SimulationResult,
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.incremental import IncrementalSimulation
+from battery_dispatch.parallel import run_battery_simulation_in_blocks
+from battery_dispatch.values.battery import (
+    Battery,
+    BatteryCommitment,
+    BatteryCommitmentType,
+)
+from battery_dispatch.values.degradation import DegradationModel
+from battery_dispatch.values.market import Market
+from battery_dispatch.values.pnl import PnlRollup
+from tests.data_builder import DataBuilder
+
+# Runs randomly generated scenarios through the reference loop
+# (run_battery_simulation_for_scenario) and through each faster engine, and checks
+# they agree on the books and on every commitment taken on. Run it directly for a
+# table of speed-ups:
+#
+#     PYTHONPATH=src python -m tests.differential --cases 20
+
+RELATIVE_TOLERANCE = 1e-9
+ABSOLUTE_TOLERANCE = 1e-6
+INTERVAL_COMBINATIONS = ([0.5], [1.0], [0.5, 1.0], [0.25, 1.0], [0.25, 0.5, 1.0])
+
+
+@dataclasses.dataclass(frozen=True)
+class DispatchRecord:
+    start_time: pd.Timestamp
+    end_time: pd.Timestamp
+    market_name: str
+    commitment_type: BatteryCommitmentType
+    energy_mwh: float
+
+
+@dataclasses.dataclass
+class RecordingBattery(Battery):
+    # Logs every commitment taken on. The log is an init field so that the copies
+    # the engines make with dataclasses.replace keep appending to it
+    dispatch_log: list[DispatchRecord] = dataclasses.field(
+        default_factory=list, repr=False, compare=False
+    )
+
+    def add_commitments(self, *, new_commitments: list[BatteryCommitment]) -> None:
+        super().add_commitments(new_commitments=new_commitments)
+        self.dispatch_log += [
+            DispatchRecord(
+                start_time=pd.Timestamp(commitment.start_time),
+                end_time=pd.Timestamp(commitment.end_time),
+                market_name=commitment.market.name,
+                commitment_type=commitment.commitment_type,
+                energy_mwh=commitment.energy_mwh,
+            )
+            for commitment in new_commitments
+        ]
+
+
+@dataclasses.dataclass(frozen=True)
+class DifferentialCase:
+    seed: int
+    battery_kwargs: dict[str, Any]
+    all_markets: list[Market]
+    # Whether the battery rolls up its P&L by market, day and month as it settles
+    with_pnl_rollup: bool = False
+
+    def battery(self) -> RecordingBattery:
+        battery = DataBuilder().add_battery(**self.battery_kwargs)
+        if self.with_pnl_rollup:
+            battery.pnl_rollup = PnlRollup.for_markets(self.all_markets)
+        return RecordingBattery(
+            **{
+                field.name: getattr(battery, field.name)
+                for field in dataclasses.fields(Battery)
+                if field.init
+            }
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class EngineRun:
+    result: SimulationResult
+    dispatches: list[DispatchRecord]
+    seconds: float
+    pnl_rollup: PnlRollup | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class DifferentialOutcome:
+    case: DifferentialCase
+    engine: str
+    reference: EngineRun
+    candidate: EngineRun
+
+    @property
+    def speed_up(self) -> float:
+        return self.reference.seconds / self.candidate.seconds
+
+    def mismatches(self) -> list[str]:
+        found = []
+        for field in (
+            "revenue",
+            "cost",
+            "final_state_of_charge_mwh",
+            "throughput_mwh",
+            "degradation_cost",
+        ):
+            expected = getattr(self.reference.result, field)
+            actual = getattr(self.candidate.result, field)
+            if actual != pytest.approx(
+                expected, rel=RELATIVE_TOLERANCE, abs=ABSOLUTE_TOLERANCE
+            ):
+                found.append(f"{field}: expected {expected}, got {actual}")
+
+        if len(self.candidate.dispatches) != len(self.reference.dispatches):
+            found.append(
+                f"expected {len(self.reference.dispatches)} commitments, "
+                f"got {len(self.candidate.dispatches)}"
+            )
+        for expected, actual in zip(
+            self.reference.dispatches, self.candidate.dispatches
+        ):
+            if dataclasses.replace(actual, energy_mwh=0.0) != dataclasses.replace(
+                expected, energy_mwh=0.0
+            ) or actual.energy_mwh != pytest.approx(
+                expected.energy_mwh, rel=RELATIVE_TOLERANCE, abs=ABSOLUTE_TOLERANCE
+            ):
+                found.append(f"first differing commitment: {expected} vs {actual}")
+                break
+
+        if self.reference.pnl_rollup is not None:
+            if self.candidate.pnl_rollup is None:
+                found.append("expected a P&L rollup, got none")
+            else:
+                for period in ("daily", "monthly"):
+                    expected_rollup = getattr(self.reference.pnl_rollup, period)
+                    actual_rollup = getattr(self.candidate.pnl_rollup, period)
+                    if not np.allclose(
+                        actual_rollup,
+                        expected_rollup,
+                        rtol=RELATIVE_TOLERANCE,
+                        atol=ABSOLUTE_TOLERANCE,
+                    ):
+                        found.append(f"{period} P&L rollup differs")
+        return found
+
+    def describe(self) -> str:
+        return (
+            f"seed {self.case.seed:>4} {self.engine:<14} "
+            f"{len(self.reference.dispatches):>5} commitments  "
+            f"reference {self.reference.seconds * 1000:8.1f}ms  "
+            f"{self.engine} {self.candidate.seconds * 1000:8.1f}ms  "
+            f"speed-up {self.speed_up:5.2f}x"
+        )
+
+
+def random_case(seed: int) -> DifferentialCase:
+    rng = np.random.default_rng(seed)
+    interval_combination = INTERVAL_COMBINATIONS[
+        rng.integers(len(INTERVAL_COMBINATIONS))
+    ]
+    number_of_days = int(rng.integers(2, 6))
+    start = pd.Timestamp("2025-01-01") + pd.Timedelta(days=int(rng.integers(365)))
+    all_markets = [
+        create_market_from_price_series(
+            price_series=random_prices(
+                rng=rng,
+                start=start,
+                number_of_intervals=int(number_of_days * 24 / interval_hours),
+                interval_hours=interval_hours,
+            ),
+            interval_hours=interval_hours,
+            name=f"Market_{index}_{interval_hours}h",
+        )
+        for index, interval_hours in enumerate(interval_combination)
+    ]
+
+    capacity_mwh = float(rng.uniform(1.0, 10.0))
+    battery_kwargs = {
+        "capacity_mwh": capacity_mwh,
+        "max_charge_mw": float(rng.uniform(0.25, 1.0) * capacity_mwh),
+        "max_discharge_mw": float(rng.uniform(0.25, 1.0) * capacity_mwh),
+        "charge_efficiency": float(rng.uniform(0.8, 1.0)),
+        "discharge_efficiency": float(rng.uniform(0.8, 1.0)),
+        "state_of_charge_mwh": float(rng.uniform(0.0, capacity_mwh)),
+        "degradation": (
+            DegradationModel(
+                throughput_cost_per_mwh=float(rng.uniform(0.0, 5.0)),
+                cycle_cost=float(rng.uniform(0.0, 100.0)),
+            )
+            if rng.random() < 0.5
+            else None
+        ),
+    }
+    # Decided by the seed rather than the generator, so adding it left the
+    # earlier cases as they were
+    return DifferentialCase(
+        seed=seed,
+        battery_kwargs=battery_kwargs,
+        all_markets=all_markets,
+        with_pnl_rollup=seed % 2 == 1,
+    )
+
+
+def random_prices(
+    *,
+    rng: np.random.Generator,
+    start: pd.Timestamp,
+    number_of_intervals: int,
+    interval_hours: float,
+) -> pd.Series:
+    # A daily shape plus a mean-reverting walk, with the odd spike and dip below zero
+    hours = np.arange(number_of_intervals) * interval_hours
+    walk = np.zeros(number_of_intervals)
+    shocks = rng.normal(0.0, 4.0, size=number_of_intervals)
+    for position in range(1, number_of_intervals):
+        walk[position] = 0.9 * walk[position - 1] + shocks[position]
+    spikes = rng.random(number_of_intervals) < 0.01
+    prices = (
+        45.0
+        + 20.0 * np.sin(2 * np.pi * (hours - 6.0) / 24.0)
+        + walk
+        + spikes * rng.choice([-120.0, 300.0], size=number_of_intervals)
+    )
+    return pd.Series(
+        data=np.round(prices, 2),
+        index=pd.date_range(
+            start=start,
+            periods=number_of_intervals,
+            freq=pd.Timedelta(hours=interval_hours),
+        ),
+    )
+
+
+def run_reference(case: DifferentialCase) -> EngineRun:
+    battery = case.battery()
+    start = time.perf_counter()
+    result = run_battery_simulation_for_scenario(
+        battery=battery, all_markets=case.all_markets, output=False
+    )
+    return EngineRun(
+        result=result,
+        dispatches=battery.dispatch_log,
+        seconds=time.perf_counter() - start,
+        pnl_rollup=battery.pnl_rollup,
+    )
+
+
+def _run_event_driven(case: DifferentialCase) -> EngineRun:
+    battery = case.battery()
+    start = time.perf_counter()
+    result = run_battery_simulation_for_scenario(
+        battery=battery, all_markets=case.all_markets, output=False, event_driven=True
+    )
+    return EngineRun(
+        result=result,
+        dispatches=battery.dispatch_log,
+        seconds=time.perf_counter() - start,
+        pnl_rollup=battery.pnl_rollup,
+    )
+
+
+def _run_blocks(case: DifferentialCase) -> EngineRun:
+    # Blocks are simulated in worker processes, so only the commitments the true
+    # battery took on while stitching and replaying end up in its log. One worker
+    # would run the serial loop instead
+    battery = case.battery()
+    start = time.perf_counter()
+    result = run_battery_simulation_in_blocks(
+        battery=battery,
+        all_markets=case.all_markets,
+        output=False,
+        block_frequency="D",
+        workers=2,
+    )
+    return EngineRun(
+        result=result,
+        dispatches=battery.dispatch_log,
+        seconds=time.perf_counter() - start,
+        pnl_rollup=battery.pnl_rollup,
+    )
+
+
+def _run_incremental(case: DifferentialCase) -> EngineRun:
+    start = time.perf_counter()
+    simulation = IncrementalSimulation.run(
+        battery=case.battery(), all_markets=case.all_markets
+    )
+    seconds = time.perf_counter() - start
+    return EngineRun(
+        result=simulation.result,
+        dispatches=[
+            DispatchRecord(
+                start_time=pd.Timestamp(action.start_time),
+                end_time=pd.Timestamp(action.end_time),
+                market_name=simulation.all_markets[action.market_index].name,
+                commitment_type=action.commitment_type,
+                energy_mwh=action.energy_mwh,
+            )
+            for position in sorted(simulation.actions)
+            for action in simulation.actions[position]
+        ],
+        seconds=seconds,
+        pnl_rollup=simulation.pnl_rollup,
+    )
+
+
+ENGINES: dict[str, Callable[[DifferentialCase], EngineRun]] = {
+    "event_driven": _run_event_driven,
+    "blocks": _run_blocks,
+    "incremental": _run_incremental,
+}
+
+
+def run_differential(case: DifferentialCase, *, engine: str) -> DifferentialOutcome:
+    return DifferentialOutcome(
+        case=case,
+        engine=engine,
+        reference=run_reference(case),
+        candidate=ENGINES[engine](case),
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare the faster engines against the reference loop"
+    )
+    parser.add_argument("--cases", type=int, default=10)
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--engine", choices=list(ENGINES), action="append")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for seed in range(args.first_seed, args.first_seed + args.cases):
+        case = random_case(seed)
+        for engine in args.engine or list(ENGINES):
+            outcome = run_differential(case, engine=engine)
+            mismatches = outcome.mismatches()
+            failures += len(mismatches) > 0
+            print(outcome.describe() + ("  MISMATCH" if mismatches else ""))
+            for mismatch in mismatches:
+                print(f"    {mismatch}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
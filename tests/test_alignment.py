@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.values.alignment import MarketAlignment, interval_nanoseconds
+from tests.data_builder import DataBuilder
+
+
+class TestMarketAlignment:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        self._five_minute = self._data_builder.add_market(
+            prices=pd.Series(
+                data=np.arange(12, dtype=float),
+                index=pd.date_range(start="2025-01-01", periods=12, freq="5min"),
+            ),
+            interval_hours=1 / 12,
+        )
+        self._quarter_hour = self._data_builder.add_market(
+            prices=pd.Series(
+                data=[10.0, 20.0, 30.0, 40.0],
+                index=pd.date_range(start="2025-01-01", periods=4, freq="15min"),
+            ),
+            interval_hours=0.25,
+        )
+
+    def test_interval_nanoseconds(self):
+        assert interval_nanoseconds(1 / 12) == 5 * 60 * 10**9
+        assert interval_nanoseconds(0.25) == 15 * 60 * 10**9
+
+    def test_build(self):
+        alignment = MarketAlignment.build([self._five_minute, self._quarter_hour])
+
+        assert alignment.base_interval_hours == pytest.approx(1 / 12)
+        # Runs one longest interval past the last price
+        assert alignment.base_timestamps[0] == pd.Timestamp("2025-01-01 00:00")
+        assert alignment.base_timestamps[-1] == pd.Timestamp("2025-01-01 01:10")
+        assert list(alignment.interval_indices[0]) == list(range(12)) + [-1, -1, -1]
+        assert list(alignment.interval_indices[1]) == [
+            0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, -1, -1, -1
+        ]  # fmt: skip
+        assert list(np.flatnonzero(alignment.interval_start_masks[1])) == [0, 3, 6, 9]
+
+    def test_build_with_offset_market(self):
+        offset = self._data_builder.add_market(
+            prices=pd.Series(
+                data=[1.0, 2.0],
+                index=pd.date_range(start="2025-01-01 00:10", periods=2, freq="15min"),
+            ),
+            interval_hours=0.25,
+        )
+        alignment = MarketAlignment.build([self._quarter_hour, offset])
+
+        assert alignment.base_interval_ns == interval_nanoseconds(1 / 12)
+        assert list(np.flatnonzero(alignment.interval_start_masks[1])) == [2, 5]
+
+    def test_up_and_down_sampling(self):
+        alignment = MarketAlignment.build([self._five_minute, self._quarter_hour])
+        quarter_hour_prices = self._quarter_hour.prices.to_numpy()
+
+        base = alignment.to_base(market_index=1, values=quarter_hour_prices)
+        assert list(base[:4]) == [10.0, 10.0, 10.0, 20.0]
+        assert np.isnan(base[-1])
+        starts = alignment.to_base(
+            market_index=1, values=quarter_hour_prices, starts_only=True, fill_value=0
+        )
+        assert list(starts[:4]) == [10.0, 0.0, 0.0, 20.0]
+
+        five_minute_prices = self._five_minute.prices.to_numpy()
+        for how, expected in [
+            ("mean", [1.0, 4.0, 7.0, 10.0]),
+            ("sum", [3.0, 12.0, 21.0, 30.0]),
+            ("max", [2.0, 5.0, 8.0, 11.0]),
+            ("min", [0.0, 3.0, 6.0, 9.0]),
+            ("first", [0.0, 3.0, 6.0, 9.0]),
+        ]:
+            assert (
+                list(
+                    alignment.resample(
+                        from_market_index=0,
+                        to_market_index=1,
+                        values=five_minute_prices,
+                        how=how,
+                    )
+                )
+                == expected
+            )
+
+        assert (
+            list(
+                alignment.resample(
+                    from_market_index=1,
+                    to_market_index=0,
+                    values=quarter_hour_prices,
+                )
+            )
+            == [10.0] * 3 + [20.0] * 3 + [30.0] * 3 + [40.0] * 3
+        )
+
+    def test_from_base_skips_missing_values(self):
+        alignment = MarketAlignment.build([self._five_minute, self._quarter_hour])
+        values = np.arange(15, dtype=float)
+        values[[0, 3, 4, 5]] = np.nan
+
+        mean = alignment.from_base(market_index=1, values=values, how="max")
+        assert np.isnan(mean[1])
+        assert list(mean[[0, 2, 3]]) == [2.0, 8.0, 11.0]
+
+        with pytest.raises(ValueError, match="Unknown aggregation"):
+            alignment.from_base(market_index=1, values=values, how="median")
@@ -7,6 +7,7 @@ from battery_dispatch.values.battery import (
     CannotAddCommitmentError,
     CannotDispatchBatteryError,
 )
+from battery_dispatch.values.degradation import DegradationModel
 from tests.data_builder import DataBuilder
 
 
@@ -136,6 +137,74 @@ class TestBattery:
         with pytest.raises(CannotAddCommitmentError):
             battery.add_commitments(new_commitments=[commitment_2])
 
+    def test_can_add_concurrent_commitments_within_power_limit(self):
+        market_half_hour = self._data_builder.add_market(interval_hours=0.5)
+        market_one_hour = self._data_builder.add_market(interval_hours=1.0)
+        battery = self._data_builder.add_battery(max_charge_mw=20)
+        commitment_1 = self._data_builder.add_battery_commitment(
+            market=market_one_hour,
+            commitment_type=BatteryCommitmentType.CHARGE,
+            energy_mwh=15,
+            start_time=pd.Timestamp("2025-01-01 00:00:00"),
+            end_time=pd.Timestamp("2025-01-01 01:00:00"),
+        )
+        commitment_2 = self._data_builder.add_battery_commitment(
+            market=market_half_hour,
+            commitment_type=BatteryCommitmentType.CHARGE,
+            energy_mwh=2.5,
+            start_time=pd.Timestamp("2025-01-01 00:00:00"),
+            end_time=pd.Timestamp("2025-01-01 00:30:00"),
+        )
+        battery.add_commitments(new_commitments=[commitment_1, commitment_2])
+
+        # Ordered by end time so expiry only looks at the front of the list
+        assert battery.commitments == [commitment_2, commitment_1]
+        assert (
+            battery.available_power_mw(
+                commitment_type=BatteryCommitmentType.CHARGE,
+                current_timestamp=pd.Timestamp("2025-01-01 00:00:00"),
+            )
+            == 0
+        )
+        assert (
+            battery.available_power_mw(
+                commitment_type=BatteryCommitmentType.CHARGE,
+                current_timestamp=pd.Timestamp("2025-01-01 00:30:00"),
+            )
+            == 5
+        )
+        assert (
+            battery.available_power_mw(
+                commitment_type=BatteryCommitmentType.DISCHARGE,
+                current_timestamp=pd.Timestamp("2025-01-01 00:30:00"),
+            )
+            == 0
+        )
+
+    def test_cannot_add_commitments_exceeding_power_limit(self):
+        market_half_hour = self._data_builder.add_market(interval_hours=0.5)
+        market_one_hour = self._data_builder.add_market(interval_hours=1.0)
+        battery = self._data_builder.add_battery(max_charge_mw=20)
+        commitment_1 = self._data_builder.add_battery_commitment(
+            market=market_one_hour,
+            commitment_type=BatteryCommitmentType.CHARGE,
+            energy_mwh=15,
+            start_time=pd.Timestamp("2025-01-01 00:00:00"),
+            end_time=pd.Timestamp("2025-01-01 01:00:00"),
+        )
+        battery.add_commitments(new_commitments=[commitment_1])
+
+        commitment_2 = self._data_builder.add_battery_commitment(
+            market=market_half_hour,
+            commitment_type=BatteryCommitmentType.CHARGE,
+            energy_mwh=5,
+            start_time=pd.Timestamp("2025-01-01 00:30:00"),
+            end_time=pd.Timestamp("2025-01-01 01:00:00"),
+        )
+        with pytest.raises(CannotAddCommitmentError):
+            battery.add_commitments(new_commitments=[commitment_2])
+        assert battery.commitments == [commitment_1]
+
     def cannot_add_multiple_commitments_at_once(self):
         battery = self._data_builder.add_battery()
         commitment_1 = self._data_builder.add_battery_commitment(
@@ -310,3 +379,216 @@ class TestBattery:
         )
         assert battery.revenue == 543.21
         assert battery.cost == 123.45
+
+    def test_update_degradation_state(self):
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100,
+            state_of_charge_mwh=0,
+            degradation=DegradationModel(
+                throughput_cost_per_mwh=1.0, cycle_cost=1000.0
+            ),
+        )
+        for state_of_charge_mwh in [50.0, 20.0, 40.0, 0.0]:
+            energy_mwh = abs(state_of_charge_mwh - battery.state_of_charge_mwh)
+            battery.state_of_charge_mwh = state_of_charge_mwh
+            battery._update_degradation_state(energy_mwh=energy_mwh)
+
+        assert battery.throughput_mwh == 140
+        # A 20 MWh cycle closes, leaving two 50 MWh half cycles
+        assert battery.degradation_cost == 140 + 200
+        assert battery.total_degradation_cost() == 140 + 200 + 500
+
+    def test_available_energy_with_efficiency(self):
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100,
+            state_of_charge_mwh=50,
+            charge_efficiency=0.8,
+            discharge_efficiency=0.5,
+        )
+        # 62.5 MWh from the grid fills the remaining 50 MWh
+        assert (
+            battery.available_capacity(current_timestamp=pd.Timestamp("2025-01-01"))
+            == 62.5
+        )
+        # Only half of what is stored reaches the grid
+        assert (
+            battery.available_state_of_charge(
+                current_timestamp=pd.Timestamp("2025-01-01")
+            )
+            == 25
+        )
+
+    def test_commit_applies_efficiency(self):
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100,
+            state_of_charge_mwh=50,
+            charge_efficiency=0.8,
+            discharge_efficiency=0.5,
+        )
+        charge_commitment = self._data_builder.add_battery_commitment(
+            commitment_type=BatteryCommitmentType.CHARGE,
+            energy_mwh=20,
+            start_time="2025-01-01 00:00:00",
+            end_time="2025-01-01 01:00:00",
+        )
+        battery.commit(commitment=charge_commitment)
+        assert battery.state_of_charge_mwh == 66
+
+        discharge_commitment = self._data_builder.add_battery_commitment(
+            commitment_type=BatteryCommitmentType.DISCHARGE,
+            energy_mwh=30,
+            start_time="2025-01-01 02:00:00",
+            end_time="2025-01-01 03:00:00",
+        )
+        battery.commit(commitment=discharge_commitment)
+        assert battery.state_of_charge_mwh == 6
+
+    def test_committing_more_than_capacity_with_efficiency(self):
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100, state_of_charge_mwh=92, charge_efficiency=0.8
+        )
+        commitment = self._data_builder.add_battery_commitment(
+            commitment_type=BatteryCommitmentType.CHARGE,
+            energy_mwh=20,
+            start_time="2025-01-01 00:00:00",
+            end_time="2025-01-01 01:00:00",
+        )
+        final_commitment = battery.commit(commitment=commitment)
+        assert battery.state_of_charge_mwh == 100
+        # Only the grid energy needed to fill the battery is drawn
+        assert final_commitment.energy_mwh == 10
+
+    def test_audit_energy_balance(self):
+        market = self._data_builder.add_market(
+            prices=pd.Series(
+                data=[50.0, 60.0, 70.0],
+                index=pd.date_range(start="2025-01-01", periods=3, freq="1h"),
+            ),
+        )
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100,
+            state_of_charge_mwh=50,
+            charge_efficiency=0.9,
+            discharge_efficiency=0.8,
+            commitments=[
+                self._data_builder.add_battery_commitment(
+                    market=market,
+                    commitment_type=BatteryCommitmentType.CHARGE,
+                    energy_mwh=20,
+                    start_time=pd.Timestamp("2025-01-01 00:00:00"),
+                    end_time=pd.Timestamp("2025-01-01 01:00:00"),
+                ),
+                self._data_builder.add_battery_commitment(
+                    market=market,
+                    commitment_type=BatteryCommitmentType.DISCHARGE,
+                    energy_mwh=16,
+                    start_time=pd.Timestamp("2025-01-01 01:00:00"),
+                    end_time=pd.Timestamp("2025-01-01 02:00:00"),
+                ),
+            ],
+        )
+        battery.commit_expired_commitments(
+            current_timestamp=pd.Timestamp("2025-01-01 02:00:00")
+        )
+
+        audit = battery.audit_energy_balance()
+        assert audit.grid_import_mwh == 20
+        assert audit.grid_export_mwh == 16
+        assert audit.losses_mwh == pytest.approx(2 + 4)
+        assert audit.change_in_state_of_charge_mwh == pytest.approx(18 - 20)
+        assert audit.is_balanced
+
+    def test_check_commitments_matches_scalar_queries(self):
+        market = self._data_builder.add_market(interval_hours=1.0)
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100,
+            max_charge_mw=30,
+            max_discharge_mw=25,
+            state_of_charge_mwh=40,
+            charge_efficiency=0.9,
+            discharge_efficiency=0.8,
+            commitments=[
+                self._data_builder.add_battery_commitment(
+                    market=market,
+                    commitment_type=BatteryCommitmentType.CHARGE,
+                    energy_mwh=20,
+                    start_time=pd.Timestamp("2025-01-01 00:00:00"),
+                    end_time=pd.Timestamp("2025-01-01 01:00:00"),
+                ),
+                self._data_builder.add_battery_commitment(
+                    market=market,
+                    commitment_type=BatteryCommitmentType.DISCHARGE,
+                    energy_mwh=10,
+                    start_time=pd.Timestamp("2025-01-01 02:00:00"),
+                    end_time=pd.Timestamp("2025-01-01 03:00:00"),
+                ),
+            ],
+        )
+        candidates = [
+            (energy, commitment_type, pd.Timestamp(timestamp))
+            for energy in (5.0, 23.0)
+            for commitment_type in BatteryCommitmentType
+            for timestamp in (
+                "2025-01-01 00:30:00",
+                "2025-01-01 01:30:00",
+                "2025-01-01 02:30:00",
+            )
+        ]
+
+        feasibility = battery.check_commitments(
+            energies_mwh=[energy for energy, _, _ in candidates],
+            commitment_types=[commitment_type for _, commitment_type, _ in candidates],
+            timestamps=[timestamp for _, _, timestamp in candidates],
+        )
+
+        for index, (energy, commitment_type, timestamp) in enumerate(candidates):
+            assert feasibility.feasible[index] == battery.can_commit(
+                energy_mwh=energy,
+                commitment_type=commitment_type,
+                current_timestamp=timestamp,
+            )
+            assert feasibility.power_headroom_mw[index] == battery.available_power_mw(
+                commitment_type=commitment_type, current_timestamp=timestamp
+            )
+            if commitment_type is BatteryCommitmentType.CHARGE:
+                energy_headroom = battery.available_capacity(
+                    current_timestamp=timestamp
+                )
+            else:
+                energy_headroom = battery.available_state_of_charge(
+                    current_timestamp=timestamp
+                )
+            assert feasibility.energy_headroom_mwh[index] == energy_headroom
+
+    def test_check_commitments_at_one_timestamp(self):
+        battery = self._data_builder.add_battery(
+            capacity_mwh=10,
+            max_charge_mw=4,
+            max_discharge_mw=4,
+            state_of_charge_mwh=3,
+            commitments=[
+                self._data_builder.add_battery_commitment(
+                    commitment_type=BatteryCommitmentType.CHARGE,
+                    energy_mwh=1,
+                    start_time=pd.Timestamp("2025-01-01 00:00:00"),
+                    end_time=pd.Timestamp("2025-01-01 01:00:00"),
+                ),
+            ],
+        )
+
+        feasibility = battery.check_commitments(
+            energies_mwh=[10.0, 1.0, 1.0],
+            commitment_types=[
+                BatteryCommitmentType.CHARGE,
+                BatteryCommitmentType.CHARGE,
+                BatteryCommitmentType.DISCHARGE,
+            ],
+            timestamps=pd.Timestamp("2025-01-01 00:00:00"),
+            interval_hours=[1.0, 0.25, 1.0],
+        )
+
+        # Charging is limited by the remaining capacity, then by the remaining power
+        # over the interval; discharging conflicts with the open charge
+        assert list(feasibility.feasible) == [True, True, False]
+        assert list(feasibility.deliverable_mwh) == [3.0, 0.75, 0.0]
+        assert list(feasibility.power_headroom_mw) == [3.0, 3.0, 0.0]
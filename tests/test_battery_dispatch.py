@@ -1,12 +1,21 @@
+from typing import Any
+
+import numpy as np
 import pandas as pd
 import pytest
 
 from battery_dispatch.core import (
     NUMBER_OF_HOURS_TO_LOOK_AHEAD,
+    _allocate_power_across_markets,
     _get_highest_price_across_next_n_hours_series,
     _get_lowest_price_across_next_n_hours_series,
+    build_scenario_timeline,
+    create_market_from_price_series,
+    find_dispatch_candidates,
     run_battery_simulation_for_scenario,
 )
+from battery_dispatch.values.degradation import DegradationModel
+from battery_dispatch.values.market import Market
 from tests.data_builder import DataBuilder
 
 
@@ -139,12 +148,281 @@ class TestBatteryDispatchIntegration:
         # Cost from charging: (20*10*1) = 200
         assert battery.cost == 200.0
 
+    def test_battery_dispatch_skips_trades_not_covering_degradation(self):
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100.0,
+            max_charge_mw=10.0,
+            max_discharge_mw=20.0,
+            state_of_charge_mwh=50.0,
+            # Every MWh traded now and reversed later costs 12 in wear
+            degradation=DegradationModel(throughput_cost_per_mwh=6.0),
+        )
+        market = self._add_market_with_lookahead(
+            prices=pd.Series(
+                data=[30.0, 40.0, 50.0, 60.0, 50.0, 40.0],
+                index=pd.date_range(start="2025-01-01 00:00:00", periods=6, freq="1h"),
+            ),
+            interval_hours=1.0,
+        )
+
+        run_battery_simulation_for_scenario(battery=battery, all_markets=[market])
+
+        # Same as the simple scenario, except discharging at 50 only has a spread
+        # of 10 to the 40 that follows, which no longer covers the wear
+        assert battery.state_of_charge_mwh == 50.0
+        assert battery.revenue == 1200.0
+        assert battery.cost == 700.0
+        assert battery.throughput_mwh == 40.0
+        assert battery.degradation_cost == 240.0
+
+    def test_battery_dispatch_with_efficiency_losses(self):
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100.0,
+            max_charge_mw=10.0,
+            max_discharge_mw=20.0,
+            charge_efficiency=0.8,
+            discharge_efficiency=0.8,
+            state_of_charge_mwh=50.0,
+        )
+        market = self._add_market_with_lookahead(
+            prices=pd.Series(
+                data=[30.0, 40.0, 50.0, 60.0, 50.0, 40.0],
+                index=pd.date_range(start="2025-01-01 00:00:00", periods=6, freq="1h"),
+            ),
+            interval_hours=1.0,
+        )
+
+        run_battery_simulation_for_scenario(battery=battery, all_markets=[market])
+
+        # With 64% round trip efficiency only buying at 30 to sell at 60 still pays,
+        # e.g. selling at 60 means buying back at 40 / 0.64 = 62.5
+        assert battery.cost == 300.0
+        assert battery.revenue == 0.0
+        # 10 MWh drawn from the grid only stores 8 MWh
+        assert battery.state_of_charge_mwh == 58.0
+        assert battery.audit_energy_balance().is_balanced
+
+    def test_battery_dispatch_splits_power_across_markets(self):
+        # Only 7.5 MWh of headroom with 10 MW available, so the best use is to split
+        # the power between the half-hourly and hourly markets
+        battery = self._data_builder.add_battery(
+            capacity_mwh=100.0,
+            max_charge_mw=10.0,
+            max_discharge_mw=10.0,
+            state_of_charge_mwh=92.5,
+        )
+        half_hourly_market = self._add_market_with_lookahead(
+            prices=pd.Series(
+                data=[18.0, 30.0, 50.0, 50.0, 50.0, 50.0],
+                index=pd.date_range(
+                    start="2025-01-01 00:00:00", periods=6, freq="30min"
+                ),
+            ),
+            interval_hours=0.5,
+        )
+        hourly_market = self._add_market_with_lookahead(
+            prices=pd.Series(
+                data=[20.0, 50.0, 50.0],
+                index=pd.date_range(start="2025-01-01 00:00:00", periods=3, freq="1h"),
+            ),
+            interval_hours=1.0,
+        )
+
+        run_battery_simulation_for_scenario(
+            battery=battery,
+            all_markets=[half_hourly_market, hourly_market],
+        )
+
+        # 5 MW to each market: 2.5 MWh at 18 and 5 MWh at 20
+        assert battery.state_of_charge_mwh == 100.0
+        assert battery.cost == 18.0 * 2.5 + 20.0 * 5.0
+        assert battery.revenue == 0.0
+
+    def test_battery_dispatch_with_requested_lookahead(self):
+        prices = pd.Series(
+            data=[30.0, 40.0, 35.0, 60.0, 20.0, 50.0, 45.0, 30.0],
+            index=pd.date_range(start="2025-01-01 00:00:00", periods=8, freq="1h"),
+        )
+        # Built with the default lookahead, but run with a one hour lookahead
+        default_battery = self._data_builder.add_battery()
+        market = self._add_market_with_lookahead(prices=prices, interval_hours=1.0)
+        result = run_battery_simulation_for_scenario(
+            battery=default_battery,
+            all_markets=[market],
+            number_of_hours_to_look_ahead=1,
+        )
+
+        expected_battery = self._data_builder.add_battery()
+        expected_market = self._data_builder.add_market(
+            prices=prices,
+            highest_price_across_next_n_hours=_get_highest_price_across_next_n_hours_series(
+                price_series=prices, number_of_intervals_to_look_ahead=1
+            ),
+            lowest_price_across_next_n_hours=_get_lowest_price_across_next_n_hours_series(
+                price_series=prices, number_of_intervals_to_look_ahead=1
+            ),
+            interval_hours=1.0,
+        )
+        expected_result = run_battery_simulation_for_scenario(
+            battery=expected_battery, all_markets=[expected_market]
+        )
+
+        assert result == expected_result
+        assert result != run_battery_simulation_for_scenario(
+            battery=self._data_builder.add_battery(), all_markets=[market]
+        )
+
+    def _add_market_with_lookahead(
+        self, prices: pd.Series, interval_hours: float
+    ) -> Market:
+        number_of_intervals_to_look_ahead = int(
+            NUMBER_OF_HOURS_TO_LOOK_AHEAD / interval_hours
+        )
+        return self._data_builder.add_market(
+            prices=prices,
+            highest_price_across_next_n_hours=_get_highest_price_across_next_n_hours_series(
+                price_series=prices,
+                number_of_intervals_to_look_ahead=number_of_intervals_to_look_ahead,
+            ),
+            lowest_price_across_next_n_hours=_get_lowest_price_across_next_n_hours_series(
+                price_series=prices,
+                number_of_intervals_to_look_ahead=number_of_intervals_to_look_ahead,
+            ),
+            interval_hours=interval_hours,
+        )
+
+
+class TestEventDrivenSimulation:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=7)
+        half_hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(480) / 8) + rng.normal(0, 5, size=480),
+            index=pd.date_range(start="2025-01-01", periods=480, freq="30min"),
+        )
+        hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(240) / 4) + rng.normal(0, 5, size=240),
+            index=pd.date_range(start="2025-01-01", periods=240, freq="1h"),
+        )
+        self._markets = [
+            create_market_from_price_series(
+                price_series=half_hourly_prices, interval_hours=0.5
+            ),
+            create_market_from_price_series(
+                price_series=hourly_prices, interval_hours=1.0
+            ),
+        ]
+
+    @pytest.mark.parametrize(
+        "battery_kwargs",
+        [
+            {},
+            {"charge_efficiency": 0.9, "discharge_efficiency": 0.85},
+            {
+                "capacity_mwh": 4.0,
+                "max_charge_mw": 2.0,
+                "max_discharge_mw": 1.0,
+                "state_of_charge_mwh": 0.0,
+                "degradation": DegradationModel(
+                    throughput_cost_per_mwh=2.0, cycle_cost=50.0
+                ),
+            },
+        ],
+    )
+    def test_event_driven_matches_stepwise(self, battery_kwargs: dict[str, Any]):
+        stepwise_battery = self._data_builder.add_battery(**battery_kwargs)
+        stepwise_result = run_battery_simulation_for_scenario(
+            battery=stepwise_battery, all_markets=self._markets, output=False
+        )
+        event_driven_battery = self._data_builder.add_battery(**battery_kwargs)
+        event_driven_result = run_battery_simulation_for_scenario(
+            battery=event_driven_battery,
+            all_markets=self._markets,
+            output=False,
+            event_driven=True,
+        )
+
+        assert event_driven_result == stepwise_result
+        assert event_driven_battery == stepwise_battery
+        assert event_driven_result.steps_evaluated < stepwise_result.steps_evaluated
+
+    def test_event_driven_matches_stepwise_at_finer_resolutions(self):
+        rng = np.random.default_rng(seed=5)
+        markets = [
+            create_market_from_price_series(
+                price_series=pd.Series(
+                    data=50 + rng.normal(0, 10, size=periods),
+                    index=pd.date_range(start="2025-01-01", periods=periods, freq=freq),
+                ),
+                interval_hours=interval_hours,
+            )
+            for periods, freq, interval_hours in [
+                (576, "5min", 1 / 12),
+                (192, "15min", 0.25),
+            ]
+        ]
+        timeline = build_scenario_timeline(all_markets=markets)
+        assert timeline.timestamps[1] - timeline.timestamps[0] == pd.Timedelta("5min")
+
+        stepwise_result = run_battery_simulation_for_scenario(
+            battery=self._data_builder.add_battery(),
+            all_markets=markets,
+            output=False,
+        )
+        event_driven_result = run_battery_simulation_for_scenario(
+            battery=self._data_builder.add_battery(),
+            all_markets=markets,
+            output=False,
+            event_driven=True,
+        )
+
+        assert stepwise_result.throughput_mwh > 0
+        assert event_driven_result == stepwise_result
+
+    def test_find_dispatch_candidates(self):
+        battery = self._data_builder.add_battery()
+        timeline = build_scenario_timeline(all_markets=self._markets)
+        could_charge, could_discharge = find_dispatch_candidates(
+            battery=battery, all_markets=self._markets, timeline=timeline
+        )
+
+        assert len(could_charge) == len(timeline.timestamps)
+        for position in np.flatnonzero(could_charge):
+            timestamp = timeline.timestamps[int(position)]
+            assert any(
+                market.is_interval_start(timestamp=timestamp)
+                and market.prices[timestamp]
+                < timeline.lowest_price_across_next_n_hours[timestamp]
+                for market in self._markets
+            )
+
 
 class TestBatteryDispatchFunctions:
     @pytest.fixture(autouse=True)
     def setup(self) -> None:
         self._data_builder = DataBuilder()
 
+    def test_allocate_power_across_markets_prefers_single_market_when_power_bound(
+        self,
+    ):
+        energies = _allocate_power_across_markets(
+            unit_profits=[12.0, 10.0],
+            interval_hours=[0.5, 1.0],
+            power_mw=10.0,
+            energy_mwh=100.0,
+        )
+        assert energies == [0.0, 10.0]
+
+    def test_allocate_power_across_markets_splits_when_energy_bound(self):
+        energies = _allocate_power_across_markets(
+            unit_profits=[12.0, 10.0],
+            interval_hours=[0.5, 1.0],
+            power_mw=10.0,
+            energy_mwh=7.5,
+        )
+        assert energies == [2.5, 5.0]
+
     def test_commit_charge(self): ...
 
     def test_commit_discharge(self): ...
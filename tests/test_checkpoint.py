@@ -0,0 +1,187 @@
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import battery_dispatch.core
+from battery_dispatch.checkpoint import (
+    LEDGER_ENTRY_BYTES,
+    LEDGER_FILE,
+    STATE_FILE,
+    CheckpointError,
+)
+from battery_dispatch.core import (
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.values.battery import Battery
+from battery_dispatch.values.degradation import DegradationModel
+from tests.data_builder import DataBuilder
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+class TestCheckpoint:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self._data_builder = DataBuilder()
+        self._checkpoint_directory = str(tmp_path / "checkpoint")
+        rng = np.random.default_rng(seed=13)
+        self._markets = [
+            create_market_from_price_series(
+                price_series=pd.Series(
+                    data=50
+                    + 20 * np.sin(np.arange(periods) / 8)
+                    + rng.normal(0, 5, size=periods),
+                    index=pd.date_range(start="2025-01-01", periods=periods, freq=freq),
+                ),
+                interval_hours=interval_hours,
+            )
+            for periods, freq, interval_hours in [(480, "30min", 0.5), (240, "1h", 1.0)]
+        ]
+
+    def _add_battery(self) -> Battery:
+        return self._data_builder.add_battery(
+            capacity_mwh=4.0,
+            max_charge_mw=2.0,
+            max_discharge_mw=2.0,
+            charge_efficiency=0.9,
+            discharge_efficiency=0.9,
+            state_of_charge_mwh=1.0,
+            degradation=DegradationModel(throughput_cost_per_mwh=1.0, cycle_cost=20.0),
+        )
+
+    def _crash_after(self, monkeypatch: pytest.MonkeyPatch, number_of_steps: int):
+        dispatch = battery_dispatch.core.dispatch_at_timestamp
+        calls = 0
+
+        def crashing_dispatch(**kwargs):
+            nonlocal calls
+            calls += 1
+            if calls > number_of_steps:
+                raise SimulatedCrash()
+            return dispatch(**kwargs)
+
+        monkeypatch.setattr(
+            battery_dispatch.core, "dispatch_at_timestamp", crashing_dispatch
+        )
+
+    @pytest.mark.parametrize("event_driven", [False, True])
+    def test_resume_matches_uninterrupted_run(
+        self, monkeypatch: pytest.MonkeyPatch, event_driven: bool
+    ):
+        expected_battery = self._add_battery()
+        expected = run_battery_simulation_for_scenario(
+            battery=expected_battery,
+            all_markets=self._markets,
+            output=False,
+            event_driven=event_driven,
+        )
+
+        with monkeypatch.context() as patch:
+            self._crash_after(patch, number_of_steps=300 if not event_driven else 150)
+            with pytest.raises(SimulatedCrash):
+                run_battery_simulation_for_scenario(
+                    battery=self._add_battery(),
+                    all_markets=self._markets,
+                    output=False,
+                    event_driven=event_driven,
+                    checkpoint_directory=self._checkpoint_directory,
+                    checkpoint_every=50,
+                )
+        with (Path(self._checkpoint_directory) / STATE_FILE).open("rb") as state_file:
+            checkpoint = pickle.load(state_file)
+        assert checkpoint.position > 0
+        # The ledger is appended to its own file rather than pickled with the state
+        ledger_path = Path(self._checkpoint_directory) / LEDGER_FILE
+        assert not hasattr(checkpoint, "energy_ledger")
+        assert checkpoint.ledger_entries > 0
+        assert (
+            ledger_path.stat().st_size == checkpoint.ledger_entries * LEDGER_ENTRY_BYTES
+        )
+        # As if the run had crashed between appending to the ledger and saving
+        # the state, which the resumed run drops
+        with ledger_path.open("ab") as ledger_file:
+            ledger_file.write(bytes(2 * LEDGER_ENTRY_BYTES))
+
+        resumed_battery = self._add_battery()
+        resumed = run_battery_simulation_for_scenario(
+            battery=resumed_battery,
+            all_markets=self._markets,
+            output=False,
+            event_driven=event_driven,
+            checkpoint_directory=self._checkpoint_directory,
+            checkpoint_every=50,
+        )
+
+        assert resumed == expected
+        assert resumed.steps_evaluated == expected.steps_evaluated
+        assert resumed_battery == expected_battery
+        # A finished run leaves nothing behind to resume
+        assert list(Path(self._checkpoint_directory).iterdir()) == []
+
+    def test_refuses_checkpoint_of_another_scenario(
+        self, monkeypatch: pytest.MonkeyPatch
+    ):
+        with monkeypatch.context() as patch:
+            self._crash_after(patch, number_of_steps=100)
+            with pytest.raises(SimulatedCrash):
+                run_battery_simulation_for_scenario(
+                    battery=self._add_battery(),
+                    all_markets=self._markets,
+                    output=False,
+                    checkpoint_directory=self._checkpoint_directory,
+                    checkpoint_every=10,
+                )
+
+        with pytest.raises(CheckpointError, match="different scenario"):
+            run_battery_simulation_for_scenario(
+                battery=self._add_battery(),
+                all_markets=self._markets,
+                output=False,
+                number_of_hours_to_look_ahead=2.0,
+                checkpoint_directory=self._checkpoint_directory,
+            )
+
+    def test_finish_only_removes_the_checkpoint_files(
+        self, monkeypatch: pytest.MonkeyPatch
+    ):
+        directory = Path(self._checkpoint_directory)
+        directory.mkdir()
+        (directory / "notes.txt").write_text("kept")
+        (directory / "timeline").mkdir()
+        (directory / "timeline" / "other.npy").write_bytes(b"kept")
+
+        with monkeypatch.context() as patch:
+            self._crash_after(patch, number_of_steps=100)
+            with pytest.raises(SimulatedCrash):
+                run_battery_simulation_for_scenario(
+                    battery=self._add_battery(),
+                    all_markets=self._markets,
+                    output=False,
+                    checkpoint_directory=self._checkpoint_directory,
+                    checkpoint_every=10,
+                )
+        assert (directory / STATE_FILE).is_file()
+        assert (directory / "timeline" / "metadata.json").is_file()
+
+        run_battery_simulation_for_scenario(
+            battery=self._add_battery(),
+            all_markets=self._markets,
+            output=False,
+            checkpoint_directory=self._checkpoint_directory,
+            checkpoint_every=10,
+        )
+
+        assert sorted(path.name for path in directory.iterdir()) == [
+            "notes.txt",
+            "timeline",
+        ]
+        assert (directory / "notes.txt").read_text() == "kept"
+        assert [path.name for path in (directory / "timeline").iterdir()] == [
+            "other.npy"
+        ]
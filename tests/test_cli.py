@@ -0,0 +1,170 @@
+import csv
+import http.client
+import json
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from battery_dispatch.cli import main
+
+SCENARIO_FILE = """
+[markets.hourly]
+csv_path = "hourly.csv"
+interval_hours = 1.0
+
+[[scenarios]]
+name = "one_hour"
+markets = ["hourly"]
+lookahead_hours = 1
+
+[scenarios.battery]
+capacity_mwh = 100.0
+max_charge_mw = 10.0
+max_discharge_mw = 20.0
+state_of_charge_mwh = 50.0
+
+[[scenarios]]
+name = "three_hours"
+markets = ["hourly"]
+lookahead_hours = 3
+
+[scenarios.battery]
+capacity_mwh = 100.0
+max_charge_mw = 10.0
+max_discharge_mw = 20.0
+state_of_charge_mwh = 50.0
+"""
+
+
+class TestCli:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self._tmp_path = tmp_path
+        prices = [30.0, 40.0, 50.0, 60.0, 50.0, 40.0]
+        (tmp_path / "hourly.csv").write_text(
+            "timestamp,price [£/MWh]\n"
+            + "".join(
+                f"1/1/25 {hour}:00,{price}\n" for hour, price in enumerate(prices)
+            )
+        )
+        self._scenario_file = tmp_path / "scenarios.toml"
+        self._scenario_file.write_text(SCENARIO_FILE)
+
+    def test_run_writes_results(self):
+        output = self._tmp_path / "results.csv"
+        assert main(["run", str(self._scenario_file), "-o", str(output)]) == 0
+
+        with output.open() as output_file:
+            rows = list(csv.DictReader(output_file))
+        assert [row["scenario"] for row in rows] == ["one_hour", "three_hours"]
+        # Same outcome as the simple single market integration test
+        assert float(rows[1]["profit"]) == 2200.0 - 700.0
+
+    def test_run_in_parallel_matches_serial(self):
+        serial_output = self._tmp_path / "serial.json"
+        parallel_output = self._tmp_path / "parallel.json"
+        main(["run", str(self._scenario_file), "-o", str(serial_output)])
+        main(
+            [
+                "run",
+                str(self._scenario_file),
+                "-o",
+                str(parallel_output),
+                "--workers",
+                "2",
+            ]
+        )
+        assert json.loads(serial_output.read_text()) == json.loads(
+            parallel_output.read_text()
+        )
+
+    def test_run_with_checkpoints_matches_plain_run(self):
+        plain_output = self._tmp_path / "plain.json"
+        checkpointed_output = self._tmp_path / "checkpointed.json"
+        checkpoint_directory = self._tmp_path / "checkpoints"
+        main(["run", str(self._scenario_file), "-o", str(plain_output)])
+        main(
+            [
+                "run",
+                str(self._scenario_file),
+                "-o",
+                str(checkpointed_output),
+                "--checkpoint-dir",
+                str(checkpoint_directory),
+            ]
+        )
+        assert json.loads(plain_output.read_text()) == json.loads(
+            checkpointed_output.read_text()
+        )
+        assert not any(checkpoint_directory.iterdir())
+
+    def test_run_with_results_store_skips_stored_scenarios(self, monkeypatch):
+        results_path = str(self._tmp_path / "results.sqlite")
+        first_output = self._tmp_path / "first.json"
+        second_output = self._tmp_path / "second.json"
+        arguments = ["run", str(self._scenario_file), "--results-db", results_path]
+        main(arguments + ["-o", str(first_output), "--store-timelines"])
+
+        def fail(*args, **kwargs):
+            raise AssertionError("Stored scenarios shouldn't run again")
+
+        monkeypatch.setattr("battery_dispatch.batch._run_scenario_for_store", fail)
+        main(arguments + ["-o", str(second_output)])
+
+        assert json.loads(first_output.read_text()) == json.loads(
+            second_output.read_text()
+        )
+
+    def test_store_timelines_needs_results_store(self, capsys):
+        output = self._tmp_path / "results.csv"
+        arguments = ["run", str(self._scenario_file), "-o", str(output)]
+        assert main(arguments + ["--store-timelines"]) == 2
+        assert "--results-db" in capsys.readouterr().err
+
+    def test_validate_reports_errors(self, capsys):
+        self._scenario_file.write_text(
+            SCENARIO_FILE.replace("lookahead_hours = 1", "lookahead_hours = 0")
+        )
+        assert main(["validate", str(self._scenario_file)]) == 2
+        assert "lookahead_hours must be positive" in capsys.readouterr().err
+
+    def test_validate_does_not_import_pandas(self):
+        code = (
+            "import sys\n"
+            "from battery_dispatch.cli import main\n"
+            f"assert main(['validate', {str(self._scenario_file)!r}]) == 0\n"
+            "assert 'pandas' not in sys.modules\n"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_serve_answers_requests_until_interrupted(self):
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "battery_dispatch",
+                "serve",
+                str(self._scenario_file),
+                "--port",
+                "0",
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert server.stdout is not None
+        try:
+            address = server.stdout.readline().split()[-1]
+            connection = http.client.HTTPConnection(address.removeprefix("http://"))
+            connection.request("GET", "/markets")
+            response = connection.getresponse()
+            markets = json.loads(response.read())
+        finally:
+            server.send_signal(signal.SIGINT)
+            return_code = server.wait(timeout=30)
+
+        assert response.status == 200
+        assert [market["name"] for market in markets] == ["hourly"]
+        assert return_code == 0
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import pytest
+
+from battery_dispatch.config import ConfigError, load_scenario_file
+
+SCENARIO_FILE = """
+[markets.hourly]
+csv_path = "hourly.csv"
+interval_hours = 1.0
+
+[[scenarios]]
+name = "base"
+markets = ["hourly"]
+lookahead_hours = 2
+
+[scenarios.battery]
+capacity_mwh = 4.0
+max_charge_mw = 2.0
+max_discharge_mw = 2.0
+charge_efficiency = 0.9
+
+[scenarios.battery.degradation]
+cycle_cost = 10.0
+"""
+
+
+class TestLoadScenarioFile:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self._tmp_path = tmp_path
+        (tmp_path / "hourly.csv").write_text("timestamp,price [£/MWh]\n")
+
+    def _write(self, name: str, contents: str) -> str:
+        path = self._tmp_path / name
+        path.write_text(contents)
+        return str(path)
+
+    def test_load_toml(self):
+        [scenario] = load_scenario_file(self._write("scenarios.toml", SCENARIO_FILE))
+        assert scenario.name == "base"
+        assert scenario.strategy == "lookahead"
+        assert scenario.lookahead_hours == 2.0
+        [market] = scenario.markets
+        assert market.name == "hourly"
+        assert market.csv_path == str(self._tmp_path / "hourly.csv")
+        assert market.forecast_path is None
+        assert scenario.battery.charge_efficiency == 0.9
+        assert scenario.battery.discharge_efficiency == 1.0
+        assert scenario.battery.degradation is not None
+        assert scenario.battery.degradation.cycle_cost == 10.0
+
+    def test_load_yaml(self):
+        pytest.importorskip("yaml")
+        path = self._write(
+            "scenarios.yaml",
+            """
+markets:
+  hourly: {csv_path: hourly.csv, interval_hours: 1.0}
+scenarios:
+  - name: base
+    markets: [hourly]
+    battery: {capacity_mwh: 4, max_charge_mw: 2, max_discharge_mw: 2}
+""",
+        )
+        [scenario] = load_scenario_file(path)
+        assert scenario.battery.capacity_mwh == 4.0
+        assert scenario.lookahead_hours == 3.0
+
+    @pytest.mark.parametrize(
+        "old, new, message",
+        [
+            ('markets = ["hourly"]', 'markets = ["daily"]', "unknown markets"),
+            ("lookahead_hours = 2", 'strategy = "perfect"', "unknown strategy"),
+            ("capacity_mwh = 4.0", "capacity_mwh = -4.0", "must be positive"),
+            ("charge_efficiency = 0.9", "charge_efficiency = 1.5", "(0, 1]"),
+            ("charge_efficiency = 0.9", "charge_efficiency = true", "number"),
+            ("cycle_cost = 10.0", "cycle_costs = 10.0", "unknown keys"),
+            ('csv_path = "hourly.csv"', 'csv_path = "missing.csv"', "not found"),
+            (
+                "interval_hours = 1.0",
+                'interval_hours = 1.0\nforecast_path = "forecasts"',
+                "directory not found",
+            ),
+        ],
+    )
+    def test_invalid_config(self, old: str, new: str, message: str):
+        path = self._write("scenarios.toml", SCENARIO_FILE.replace(old, new))
+        with pytest.raises(ConfigError, match=message.replace("(", r"\(")):
+            load_scenario_file(path)
+
+    def test_forecast_path(self):
+        (self._tmp_path / "forecasts").mkdir()
+        contents = SCENARIO_FILE.replace(
+            "interval_hours = 1.0", 'interval_hours = 1.0\nforecast_path = "forecasts"'
+        )
+        [scenario] = load_scenario_file(self._write("scenarios.toml", contents))
+        [market] = scenario.markets
+        assert market.forecast_path == str(self._tmp_path / "forecasts")
+
+    def test_unsupported_file_type(self):
+        with pytest.raises(ConfigError, match="Unsupported"):
+            load_scenario_file(self._write("scenarios.json", "{}"))
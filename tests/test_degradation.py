@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from battery_dispatch.values.degradation import DegradationModel, RainflowCounter
+
+
+class TestRainflowCounter:
+    def test_closes_enclosed_cycle(self):
+        counter = RainflowCounter()
+        closed_ranges = [counter.add(value) for value in [0.0, 4.0, 1.0, 3.0, 0.0]]
+        assert closed_ranges == [[], [], [], [], [2.0]]
+        assert counter.residual_ranges() == [4.0, 4.0]
+
+    def test_monotonic_moves_are_merged(self):
+        counter = RainflowCounter()
+        for value in [0.0, 1.0, 2.0, 2.0, 3.0, 1.0]:
+            counter.add(value)
+        assert counter.residual_ranges() == [3.0, 2.0]
+
+    def test_repeated_cycles_do_not_grow_residue(self):
+        counter = RainflowCounter()
+        closed_ranges = []
+        counter.add(0.0)
+        for _ in range(1000):
+            closed_ranges += counter.add(4.0)
+            closed_ranges += counter.add(0.0)
+        assert len(closed_ranges) == 999
+        assert len(counter.residual_ranges()) <= 3
+
+
+class TestDegradationModel:
+    def test_cycle_cost_for_range(self):
+        model = DegradationModel(cycle_cost=100.0, cycle_depth_exponent=2.0)
+        assert model.cycle_cost_for_range(range_mwh=2.0, capacity_mwh=4.0) == 25.0
+
+    def test_round_trip_cost(self):
+        model = DegradationModel(throughput_cost_per_mwh=1.5, cycle_cost=100.0)
+        assert model.round_trip_cost(energy_mwh=2.0, capacity_mwh=4.0) == pytest.approx(
+            2 * 1.5 * 2.0 + 50.0
+        )
+
+    def test_round_trip_costs_match_round_trip_cost(self):
+        model = DegradationModel(
+            throughput_cost_per_mwh=1.5, cycle_cost=100.0, cycle_depth_exponent=2.0
+        )
+        energies = np.array([0.0, 0.5, 2.0, 4.0])
+
+        np.testing.assert_allclose(
+            model.round_trip_costs(energies_mwh=energies, capacity_mwh=4.0),
+            [
+                model.round_trip_cost(energy_mwh=energy, capacity_mwh=4.0)
+                for energy in energies.tolist()
+            ],
+        )
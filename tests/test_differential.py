@@ -0,0 +1,36 @@
+import dataclasses
+
+import pytest
+
+from tests.differential import ENGINES, random_case, run_differential
+
+SEEDS = range(8)
+
+
+class TestDifferential:
+    @pytest.mark.parametrize("engine", list(ENGINES))
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_engine_matches_reference(self, engine: str, seed: int):
+        outcome = run_differential(random_case(seed), engine=engine)
+
+        assert outcome.mismatches() == []
+        assert outcome.speed_up > 0
+
+    def test_random_cases_are_reproducible(self):
+        first = random_case(3)
+        second = random_case(3)
+
+        assert first.battery_kwargs == second.battery_kwargs
+        for first_market, second_market in zip(first.all_markets, second.all_markets):
+            assert first_market.prices.equals(second_market.prices)
+
+    def test_mismatches_are_reported(self):
+        outcome = run_differential(random_case(0), engine="event_driven")
+        wrong = dataclasses.replace(
+            outcome,
+            candidate=dataclasses.replace(
+                outcome.candidate, dispatches=outcome.candidate.dispatches[:-1]
+            ),
+        )
+
+        assert any("commitments" in mismatch for mismatch in wrong.mismatches())
@@ -0,0 +1,213 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import (
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.values.alignment import to_nanoseconds
+from battery_dispatch.values.forecast import ForecastError, ForecastStore
+from tests.data_builder import DataBuilder
+
+
+def _perfect_forecasts(prices: pd.Series, interval_hours: float) -> ForecastStore:
+    # One vintage per day, issued at midnight, covering that whole day
+    rows = [
+        {"issue_time": timestamp.normalize(), "target_time": timestamp, "price": price}
+        for timestamp, price in zip(pd.DatetimeIndex(prices.index), prices)
+    ]
+    return ForecastStore.from_frame(pd.DataFrame(rows), interval_hours=interval_hours)
+
+
+class TestForecastStore:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+
+    def test_from_frame(self):
+        frame = pd.DataFrame(
+            {
+                "issue_time": ["2025-01-01 00:00"] * 3 + ["2025-01-01 01:00"] * 2,
+                "target_time": [
+                    "2025-01-01 01:00",
+                    "2025-01-01 02:00",
+                    "2025-01-01 03:00",
+                    "2025-01-01 02:00",
+                    "2025-01-01 04:00",
+                ],
+                "price": [10.0, 20.0, 30.0, 25.0, 40.0],
+            }
+        )
+        store = ForecastStore.from_frame(frame, interval_hours=1.0)
+
+        assert list(store.issue_times) == list(
+            to_nanoseconds(pd.to_datetime(["2025-01-01 00:00", "2025-01-01 01:00"]))
+        )
+        np.testing.assert_array_equal(
+            store.values, [[10.0, 20.0, 30.0], [25.0, np.nan, 40.0]]
+        )
+
+    def test_from_frame_rejects_misaligned_targets(self):
+        frame = pd.DataFrame(
+            {
+                "issue_time": ["2025-01-01 00:00"] * 2,
+                "target_time": ["2025-01-01 01:00", "2025-01-01 01:30"],
+                "price": [10.0, 20.0],
+            }
+        )
+        with pytest.raises(ForecastError, match="1.0h apart"):
+            ForecastStore.from_frame(frame, interval_hours=1.0)
+
+    def test_lookahead_uses_latest_vintage(self):
+        frame = pd.DataFrame(
+            {
+                "issue_time": ["2025-01-01 00:00"] * 3 + ["2025-01-01 01:00"] * 2,
+                "target_time": [
+                    "2025-01-01 01:00",
+                    "2025-01-01 02:00",
+                    "2025-01-01 03:00",
+                    "2025-01-01 02:00",
+                    "2025-01-01 03:00",
+                ],
+                "price": [10.0, 20.0, 30.0, 25.0, 5.0],
+            }
+        )
+        store = ForecastStore.from_frame(frame, interval_hours=1.0)
+        highest, lowest = store.lookahead_extrema(
+            interval_starts=pd.date_range("2024-12-31 23:00", periods=5, freq="1h"),
+            number_of_intervals=2,
+        )
+
+        # Nothing issued yet, then the first vintage, then the revised one
+        np.testing.assert_array_equal(highest, [np.nan, 20.0, 25.0, 5.0, np.nan])
+        np.testing.assert_array_equal(lowest, [np.nan, 10.0, 5.0, 5.0, np.nan])
+
+    def test_save_and_load_memory_mapped(self, tmp_path: Path):
+        prices = pd.Series(
+            data=[50.0, 45.0, 55.0, 60.0],
+            index=pd.date_range(start="2025-01-01 00:00", periods=4, freq="1h"),
+        )
+        store = _perfect_forecasts(prices, interval_hours=1.0)
+        store.save(str(tmp_path / "store"))
+        loaded = ForecastStore.load(str(tmp_path / "store"))
+
+        assert isinstance(loaded.values, np.memmap)
+        np.testing.assert_array_equal(loaded.values, store.values)
+        np.testing.assert_array_equal(loaded.issue_times, store.issue_times)
+        assert loaded.interval_hours == 1.0
+
+        with pytest.raises(ForecastError, match="No forecast store"):
+            ForecastStore.load(str(tmp_path / "missing"))
+
+    def test_perfect_forecasts_match_realised_lookahead(self):
+        rng = np.random.default_rng(seed=11)
+        prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(192) / 8) + rng.normal(0, 5, size=192),
+            index=pd.date_range(start="2025-01-01", periods=192, freq="30min"),
+        )
+        realised = create_market_from_price_series(
+            price_series=prices, interval_hours=0.5
+        )
+        # Vintages issued at midnight only cover that day, so compare decisions whose
+        # lookahead stays within the day
+        forecast = create_market_from_price_series(
+            price_series=prices,
+            interval_hours=0.5,
+            forecasts=_perfect_forecasts(prices, interval_hours=0.5),
+        )
+        within_day = pd.DatetimeIndex(prices.index).hour < 21
+        pd.testing.assert_series_equal(
+            forecast.highest_price_across_next_n_hours[within_day],
+            realised.highest_price_across_next_n_hours[within_day],
+        )
+        pd.testing.assert_series_equal(
+            forecast.lowest_prices_over_next_hours(number_of_hours=1.0)[within_day],
+            realised.lowest_prices_over_next_hours(number_of_hours=1.0)[within_day],
+        )
+
+    def test_range_queries_see_the_forecasts(self, monkeypatch):
+        prices = pd.Series(
+            data=[50.0, 45.0, 55.0, 60.0],
+            index=pd.date_range(start="2025-01-01 00:00", periods=4, freq="1h"),
+        )
+        frame = pd.DataFrame(
+            {
+                "issue_time": ["2025-01-01 00:00"] * 4 + ["2025-01-01 01:00"] * 3,
+                "target_time": list(prices.index) + list(prices.index[1:]),
+                "price": [50.0, 45.0, 100.0, 60.0, 45.0, 20.0, 70.0],
+            }
+        )
+        market = create_market_from_price_series(
+            price_series=prices,
+            interval_hours=1.0,
+            forecasts=ForecastStore.from_frame(frame, interval_hours=1.0),
+        )
+
+        # From midnight the spike is forecast; from 01:00 a dip and a later high
+        assert market.highest_price_between(start_index=0, end_index=3) == 100.0
+        assert market.lowest_price_between(start_index=0, end_index=3) == 45.0
+        assert market.highest_price_between(start_index=1, end_index=3) == 70.0
+        assert market.lowest_price_between(start_index=1, end_index=2) == 20.0
+        assert np.isnan(market.highest_price_between(start_index=1, end_index=1))
+
+        scans = []
+        lookahead_extrema = ForecastStore.lookahead_extrema
+
+        def counted(store, **kwargs):
+            scans.append(kwargs)
+            return lookahead_extrema(store, **kwargs)
+
+        monkeypatch.setattr(ForecastStore, "lookahead_extrema", counted)
+        highest, lowest = market.price_extrema_over_next_hours(number_of_hours=2.0)
+
+        assert len(scans) == 1
+        np.testing.assert_array_equal(highest, [100.0, 70.0, 70.0, np.nan])
+        pd.testing.assert_series_equal(
+            lowest, market.lowest_prices_over_next_hours(number_of_hours=2.0)
+        )
+
+    def test_forecast_interval_must_match_market(self):
+        prices = self._data_builder.add_market().prices
+        with pytest.raises(ForecastError, match="0.5h intervals"):
+            create_market_from_price_series(
+                price_series=prices,
+                interval_hours=1.0,
+                forecasts=_perfect_forecasts(prices, interval_hours=0.5),
+            )
+
+    def test_settles_at_realised_prices(self):
+        prices = pd.Series(
+            data=[50.0, 45.0, 55.0, 60.0],
+            index=pd.date_range(start="2025-01-01 00:00", periods=4, freq="1h"),
+        )
+        # The forecast expects a spike that never comes
+        frame = pd.DataFrame(
+            {
+                "issue_time": ["2025-01-01 00:00"] * 4,
+                "target_time": prices.index,
+                "price": [50.0, 45.0, 100.0, 60.0],
+            }
+        )
+        market = create_market_from_price_series(
+            price_series=prices,
+            interval_hours=1.0,
+            forecasts=ForecastStore.from_frame(frame, interval_hours=1.0),
+        )
+        battery = self._data_builder.add_battery(
+            capacity_mwh=1.0,
+            max_charge_mw=1.0,
+            max_discharge_mw=1.0,
+            state_of_charge_mwh=0.0,
+        )
+        result = run_battery_simulation_for_scenario(
+            battery=battery, all_markets=[market], output=False
+        )
+
+        # Charged at 45 for a spike that never came, and at 02:00 held on for a
+        # forecast 60 at 03:00, which had nothing after it to sell against
+        assert result.cost == 45.0
+        assert result.revenue == 0.0
+        assert result.final_state_of_charge_mwh == 1.0
@@ -0,0 +1,33 @@
+import subprocess
+import sys
+
+import pytest
+
+from battery_dispatch._lazy import lazy_import
+
+
+class TestImportTime:
+    @pytest.mark.parametrize(
+        "module",
+        [
+            "battery_dispatch.core",
+            "battery_dispatch.cli",
+            "battery_dispatch.batch",
+            "battery_dispatch.results_store",
+            "battery_dispatch.service",
+        ],
+    )
+    def test_import_does_not_load_heavy_modules(self, module: str):
+        code = (
+            "import sys\n"
+            f"import {module}\n"
+            "heavy = [name for name in ('pandas', 'numpy') if name in sys.modules]\n"
+            "assert not heavy, heavy\n"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_lazy_import_loads_on_first_use(self):
+        lazy_json = lazy_import("json")
+        assert "dumps" not in vars(lazy_json)
+        assert lazy_json.dumps([1]) == "[1]"
+        assert "dumps" in vars(lazy_json)
@@ -0,0 +1,177 @@
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import (
+    SimulationResult,
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.incremental import IncrementalSimulation
+from battery_dispatch.values.degradation import DegradationModel
+from battery_dispatch.values.market import Market
+from battery_dispatch.values.pnl import PnlRollup
+from tests.data_builder import DataBuilder
+
+BATTERY_KWARGS = [
+    {},
+    {
+        "capacity_mwh": 4.0,
+        "max_charge_mw": 2.0,
+        "max_discharge_mw": 1.0,
+        "charge_efficiency": 0.9,
+        "discharge_efficiency": 0.85,
+        "state_of_charge_mwh": 1.0,
+        "degradation": DegradationModel(throughput_cost_per_mwh=2.0, cycle_cost=50.0),
+    },
+]
+
+
+class TestIncrementalSimulation:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=5)
+        half_hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(960) / 8) + rng.normal(0, 5, size=960),
+            index=pd.date_range(start="2025-01-01", periods=960, freq="30min"),
+        )
+        hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(480) / 4) + rng.normal(0, 5, size=480),
+            index=pd.date_range(start="2025-01-01", periods=480, freq="1h"),
+        )
+        self._markets = [
+            create_market_from_price_series(
+                price_series=half_hourly_prices, interval_hours=0.5
+            ),
+            create_market_from_price_series(
+                price_series=hourly_prices, interval_hours=1.0
+            ),
+        ]
+
+    def _full_run(
+        self, battery_kwargs: dict[str, Any], all_markets: list[Market]
+    ) -> SimulationResult:
+        markets = [
+            create_market_from_price_series(
+                price_series=market.prices, interval_hours=market.interval_hours
+            )
+            for market in all_markets
+        ]
+        return run_battery_simulation_for_scenario(
+            battery=self._data_builder.add_battery(**battery_kwargs),
+            all_markets=markets,
+            output=False,
+        )
+
+    @pytest.mark.parametrize("battery_kwargs", BATTERY_KWARGS)
+    def test_run_matches_simulation(self, battery_kwargs: dict[str, Any]):
+        simulation = IncrementalSimulation.run(
+            battery=self._data_builder.add_battery(**battery_kwargs),
+            all_markets=self._markets,
+            snapshot_every=32,
+        )
+
+        assert simulation.result == self._full_run(battery_kwargs, self._markets)
+
+    @pytest.mark.parametrize("battery_kwargs", BATTERY_KWARGS)
+    def test_revisions_match_full_rerun(self, battery_kwargs: dict[str, Any]):
+        simulation = IncrementalSimulation.run(
+            battery=self._data_builder.add_battery(**battery_kwargs),
+            all_markets=self._markets,
+            snapshot_every=32,
+        )
+        number_of_steps = len(simulation.timeline.timestamps)
+        rng = np.random.default_rng(seed=11)
+
+        for market_index, first, length in [(0, 100, 12), (1, 300, 6), (0, 700, 24)]:
+            prices = simulation.all_markets[market_index].prices
+            revised_prices = prices.iloc[first : first + length] * rng.uniform(
+                0.2, 2.0, size=length
+            )
+            result = simulation.revise_prices(
+                market_index=market_index, revised_prices=revised_prices
+            )
+            expected = self._full_run(battery_kwargs, simulation.all_markets)
+
+            assert result.revenue == pytest.approx(expected.revenue)
+            assert result.cost == pytest.approx(expected.cost)
+            assert result.throughput_mwh == pytest.approx(expected.throughput_mwh)
+            assert result.degradation_cost == pytest.approx(expected.degradation_cost)
+            assert result.final_state_of_charge_mwh == pytest.approx(
+                expected.final_state_of_charge_mwh
+            )
+            if "degradation" not in battery_kwargs:
+                assert result.steps_evaluated < number_of_steps / 2
+
+    def test_revision_changes_dispatch(self):
+        battery_kwargs: dict[str, Any] = {
+            "capacity_mwh": 4.0,
+            "max_charge_mw": 2.0,
+            "max_discharge_mw": 2.0,
+            "state_of_charge_mwh": 0.0,
+        }
+        simulation = IncrementalSimulation.run(
+            battery=self._data_builder.add_battery(**battery_kwargs),
+            all_markets=self._markets,
+        )
+        before = simulation.result
+        prices = simulation.all_markets[0].prices
+        revised_prices = pd.Series(data=1000.0, index=prices.index[200:204])
+
+        result = simulation.revise_prices(market_index=0, revised_prices=revised_prices)
+
+        assert result.revenue > before.revenue
+        assert simulation.all_markets[0].prices.iloc[200] == 1000.0
+        assert result.revenue == pytest.approx(
+            self._full_run(battery_kwargs, simulation.all_markets).revenue
+        )
+
+    def test_revisions_keep_the_pnl_rollup(self):
+        battery = self._data_builder.add_battery()
+        battery.pnl_rollup = PnlRollup.for_markets(self._markets)
+        simulation = IncrementalSimulation.run(
+            battery=battery, all_markets=self._markets, snapshot_every=32
+        )
+        number_of_steps = len(simulation.timeline.timestamps)
+
+        for market_index, first in [(0, 100), (1, 300), (0, 700)]:
+            prices = simulation.all_markets[market_index].prices
+            result = simulation.revise_prices(
+                market_index=market_index,
+                revised_prices=prices.iloc[first : first + 4] * 3.0,
+            )
+            markets = [
+                create_market_from_price_series(
+                    price_series=market.prices, interval_hours=market.interval_hours
+                )
+                for market in simulation.all_markets
+            ]
+            expected_battery = self._data_builder.add_battery()
+            expected_battery.pnl_rollup = PnlRollup.for_markets(markets)
+            run_battery_simulation_for_scenario(
+                battery=expected_battery, all_markets=markets, output=False
+            )
+
+            assert simulation.pnl_rollup is not None
+            np.testing.assert_allclose(
+                simulation.pnl_rollup.daily, expected_battery.pnl_rollup.daily
+            )
+            np.testing.assert_allclose(
+                simulation.pnl_rollup.monthly, expected_battery.pnl_rollup.monthly
+            )
+            assert result.steps_evaluated < number_of_steps / 2
+
+    def test_unknown_intervals_are_rejected(self):
+        simulation = IncrementalSimulation.run(
+            battery=self._data_builder.add_battery(),
+            all_markets=self._markets,
+        )
+        revised_prices = pd.Series(
+            data=[10.0], index=pd.DatetimeIndex(["2030-01-01 00:00"])
+        )
+
+        with pytest.raises(ValueError, match="intervals the market has"):
+            simulation.revise_prices(market_index=0, revised_prices=revised_prices)
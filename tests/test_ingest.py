@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import create_market_from_data
+from battery_dispatch.ingest import (
+    IngestError,
+    discover_price_files,
+    infer_interval_hours,
+    load_markets,
+)
+from battery_dispatch.values.alignment import to_nanoseconds
+
+
+def _write_prices(path, prices: pd.Series) -> None:
+    pd.DataFrame(
+        {
+            "timestamp": pd.DatetimeIndex(prices.index).strftime("%m/%d/%y %H:%M"),
+            "price [£/MWh]": prices.to_numpy(),
+        }
+    ).to_csv(path, index=False)
+
+
+class TestLoadMarkets:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path) -> None:
+        self._directory = tmp_path
+        rng = np.random.default_rng(seed=2)
+        self._prices = {}
+        for market, frequency in [("dayahead", "1h"), ("intraday", "30min")]:
+            index = pd.date_range(
+                start="2025-01-01", end="2025-03-31 23:30", freq=frequency
+            )
+            prices = pd.Series(np.round(rng.normal(50, 10, len(index)), 2), index)
+            self._prices[market] = prices
+            for month in pd.date_range(start="2025-01-01", periods=3, freq="MS"):
+                # Each file also holds the first interval of the next month
+                month_prices = prices[month : month + pd.offsets.MonthBegin(1)]
+                _write_prices(tmp_path / f"{market}_{month:%Y-%m}.csv", month_prices)
+
+    @pytest.mark.parametrize(
+        "workers, executor", [(1, "thread"), (2, "thread"), (2, "process")]
+    )
+    def test_markets_are_concatenated(self, workers: int, executor: str):
+        markets = load_markets(str(self._directory), workers=workers, executor=executor)
+
+        assert list(markets) == ["dayahead", "intraday"]
+        for name, market in markets.items():
+            assert market.name == name
+            assert (market.prices.index == self._prices[name].index).all()
+            assert (market.prices.to_numpy() == self._prices[name].to_numpy()).all()
+            assert market.validation_report is not None
+            assert market.validation_report.duplicate_timestamps == 2
+            assert market.validation_report.missing_intervals == 0
+        assert markets["dayahead"].interval_hours == 1.0
+        assert markets["intraday"].interval_hours == 0.5
+
+    def test_matches_single_file_load(self):
+        _write_prices(self._directory / "dayahead_full.csv", self._prices["dayahead"])
+
+        market = load_markets(str(self._directory / "dayahead_2025-*.csv"), workers=1)[
+            "dayahead"
+        ]
+        expected = create_market_from_data(
+            csv_path=str(self._directory / "dayahead_full.csv"), interval_hours=1.0
+        )
+
+        assert market.prices.equals(expected.prices)
+        assert market.highest_price_across_next_n_hours.equals(
+            expected.highest_price_across_next_n_hours
+        )
+
+    def test_later_files_win_overlaps(self):
+        revised = self._prices["dayahead"]["2025-02-01":"2025-02-01 05:00"] + 1000
+        _write_prices(self._directory / "dayahead_2025-02.csv", revised)
+
+        market = load_markets(
+            str(self._directory / "dayahead_*.csv"),
+            interval_hours={"dayahead": 1.0},
+            workers=1,
+        )["dayahead"]
+
+        assert market.prices["2025-02-01 00:00"] == revised.iloc[0]
+        # The rest of February is now missing and filled
+        assert market.validation_report is not None
+        assert market.validation_report.filled > 0
+
+    def test_unmatched_files_are_rejected(self):
+        _write_prices(self._directory / "prices.csv", self._prices["dayahead"])
+
+        with pytest.raises(IngestError, match="prices.csv"):
+            discover_price_files(str(self._directory))
+
+    def test_no_files(self):
+        with pytest.raises(IngestError, match="No price files"):
+            load_markets(str(self._directory / "missing_*.csv"))
+
+    def test_infer_interval_hours(self):
+        times = to_nanoseconds(
+            pd.date_range(start="2025-01-01", periods=12, freq="5min")
+        )
+
+        assert infer_interval_hours(np.delete(times, 4)) == pytest.approx(1 / 12)
@@ -0,0 +1,28 @@
+from battery_dispatch.values.ledger import EnergyLedger
+
+
+class TestEnergyLedger:
+    def test_audit_empty_ledger(self):
+        audit = EnergyLedger().audit(
+            initial_state_of_charge_mwh=10, final_state_of_charge_mwh=10
+        )
+        assert audit.residual_mwh == 0
+        assert audit.is_balanced
+
+    def test_audit_detects_unexplained_energy(self):
+        ledger = EnergyLedger()
+        ledger.record(
+            start_time_ns=0, grid_import_mwh=10, grid_export_mwh=0, losses_mwh=1
+        )
+        ledger.record(
+            start_time_ns=1, grid_import_mwh=0, grid_export_mwh=4, losses_mwh=1
+        )
+        assert len(ledger) == 2
+
+        audit = ledger.audit(initial_state_of_charge_mwh=0, final_state_of_charge_mwh=4)
+        assert audit.residual_mwh == 0
+        assert audit.is_balanced
+
+        audit = ledger.audit(initial_state_of_charge_mwh=0, final_state_of_charge_mwh=5)
+        assert audit.residual_mwh == -1
+        assert not audit.is_balanced
@@ -0,0 +1,254 @@
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import battery_dispatch.live
+from battery_dispatch.core import (
+    build_scenario_timeline,
+    create_market_from_price_series,
+    dispatch_at_timestamp,
+)
+from battery_dispatch.live import (
+    DispatchDecision,
+    decide_dispatch,
+    lookahead_decisions,
+)
+from battery_dispatch.values.battery import (
+    Battery,
+    BatteryCommitment,
+    BatteryCommitmentType,
+)
+from battery_dispatch.values.pnl import PnlRollup
+from tests.data_builder import DataBuilder
+
+
+class TestDecideDispatch:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=3)
+        half_hourly_prices = pd.Series(
+            data=50 + 30 * np.sin(np.arange(192) / 8) + rng.normal(0, 5, size=192),
+            index=pd.date_range(start="2025-01-01", periods=192, freq="30min"),
+        )
+        hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(96) / 4) + rng.normal(0, 5, size=96),
+            index=pd.date_range(start="2025-01-01", periods=96, freq="1h"),
+        )
+        self._markets = [
+            create_market_from_price_series(
+                price_series=half_hourly_prices, interval_hours=0.5
+            ),
+            create_market_from_price_series(
+                price_series=hourly_prices, interval_hours=1.0, name="Hourly"
+            ),
+        ]
+
+    def _battery(self, **kwargs: Any) -> Battery:
+        return self._data_builder.add_battery(
+            **{
+                "capacity_mwh": 4.0,
+                "max_charge_mw": 2.0,
+                "max_discharge_mw": 2.0,
+                "charge_efficiency": 0.95,
+                "discharge_efficiency": 0.95,
+                "state_of_charge_mwh": 0.0,
+                **kwargs,
+            }
+        )
+
+    @pytest.mark.parametrize("number_of_hours_to_look_ahead", [None, 2.0, 5.5])
+    def test_lookahead_decisions_match_the_simulation(
+        self, number_of_hours_to_look_ahead
+    ):
+        battery = self._battery()
+        timeline = build_scenario_timeline(
+            all_markets=self._markets,
+            number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+        )
+        decided = 0
+        for timestamp in timeline.timestamps:
+            battery.commit_expired_commitments(
+                current_timestamp=timestamp, output=False
+            )
+            if timestamp > self._markets[0].prices.index[-1]:
+                # The end of the data, where nothing can be traded
+                with pytest.raises(ValueError):
+                    decide_dispatch(
+                        battery=battery,
+                        all_markets=self._markets,
+                        timestamp=timestamp,
+                        deadline_seconds=0.0,
+                    )
+                continue
+
+            decision = decide_dispatch(
+                battery=battery,
+                all_markets=self._markets,
+                timestamp=timestamp,
+                deadline_seconds=0.0,
+                number_of_hours_to_look_ahead=number_of_hours_to_look_ahead,
+            )
+            open_commitments = list(battery.commitments)
+            commitments = dispatch_at_timestamp(
+                battery=battery,
+                all_markets=self._markets,
+                timestamp=timestamp,
+                timeline=timeline,
+            )
+
+            assert decision.tier == "lookahead"
+            assert decision.commitments == commitments
+            assert battery.commitments[: len(open_commitments)] == open_commitments
+            decided += len(commitments) > 0
+
+        assert decided > 10
+
+    def test_lookahead_decisions_leave_the_batteries_unchanged(self):
+        battery = self._battery(state_of_charge_mwh=2.0)
+        battery.pnl_rollup = PnlRollup.for_markets(self._markets)
+        timeline = build_scenario_timeline(all_markets=self._markets)
+        timestamps = self._markets[0].prices.index
+        for timestamp in timestamps[:24]:
+            battery.commit_expired_commitments(
+                current_timestamp=timestamp, output=False
+            )
+            dispatch_at_timestamp(
+                battery=battery,
+                all_markets=self._markets,
+                timestamp=timestamp,
+                timeline=timeline,
+            )
+        # As metered, which the rainflow counter hasn't seen yet
+        battery.state_of_charge_mwh = round(battery.state_of_charge_mwh + 0.3, 6)
+        commitments = list(battery.commitments)
+        rainflow_stack = list(battery.rainflow_counter._stack)
+        ledger_entries = len(battery.energy_ledger)
+        daily = battery.pnl_rollup.daily.copy()
+
+        for timestamp in timestamps[24:32]:
+            lookahead_decisions(
+                batteries=[battery], all_markets=self._markets, timestamp=timestamp
+            )
+
+        assert battery.commitments == commitments
+        assert battery.rainflow_counter._stack == rainflow_stack
+        assert len(battery.energy_ledger) == ledger_entries
+        np.testing.assert_array_equal(battery.pnl_rollup.daily, daily)
+
+    def test_refines_with_exact_horizons_within_the_budget(self):
+        seen: list[DispatchDecision] = []
+
+        decision = decide_dispatch(
+            battery=self._battery(),
+            all_markets=self._markets,
+            timestamp=pd.Timestamp("2025-01-01 03:00"),
+            deadline_seconds=60.0,
+            exact_horizons_hours=(12.0, 6.0),
+            on_decision=seen.append,
+        )
+
+        assert [(tier.tier, tier.horizon_hours) for tier in decision.timings] == [
+            ("lookahead", None),
+            ("exact", 6.0),
+            ("exact", 12.0),
+        ]
+        assert all(tier.seconds >= 0 for tier in decision.timings)
+        assert [seen_decision.tier for seen_decision in seen] == [
+            "lookahead",
+            "exact",
+            "exact",
+        ]
+        assert seen[-1] == decision
+        assert (decision.tier, decision.horizon_hours) == ("exact", 12.0)
+        assert decision.skipped_horizons_hours == ()
+
+    def test_falls_back_to_the_heuristic_without_budget(self):
+        decision = decide_dispatch(
+            battery=self._battery(),
+            all_markets=self._markets,
+            timestamp=pd.Timestamp("2025-01-01 03:00"),
+            deadline_seconds=0.0,
+        )
+
+        assert decision.tier == "lookahead"
+        assert len(decision.timings) == 1
+        assert decision.skipped_horizons_hours == (6.0, 12.0, 24.0, 48.0)
+
+    def test_keeps_the_heuristic_with_a_tiny_deadline(self):
+        decision = decide_dispatch(
+            battery=self._battery(),
+            all_markets=self._markets,
+            timestamp=pd.Timestamp("2025-01-01 03:00"),
+            deadline_seconds=0.02,
+            exact_horizons_hours=(48.0,),
+        )
+
+        assert decision.tier == "lookahead"
+        assert len(decision.timings) == 1
+        assert decision.skipped_horizons_hours + decision.overrun_horizons_hours == (
+            48.0,
+        )
+
+    def test_discards_a_horizon_that_finishes_after_the_deadline(self, monkeypatch):
+        exact_decision = battery_dispatch.live._exact_decision
+
+        def slow(**kwargs: Any) -> list[BatteryCommitment]:
+            time.sleep(0.2)
+            return exact_decision(**kwargs)
+
+        monkeypatch.setattr(battery_dispatch.live, "_exact_decision", slow)
+        seen: list[DispatchDecision] = []
+
+        decision = decide_dispatch(
+            battery=self._battery(),
+            all_markets=self._markets,
+            timestamp=pd.Timestamp("2025-01-01 03:00"),
+            deadline_seconds=0.1,
+            exact_horizons_hours=(0.5, 6.0),
+            on_decision=seen.append,
+        )
+
+        assert [seen_decision.tier for seen_decision in seen] == ["lookahead"]
+        assert decision.commitments == seen[0].commitments
+        assert decision.tier == "lookahead"
+        assert decision.overrun_horizons_hours == (0.5,)
+        assert decision.skipped_horizons_hours == (6.0,)
+
+    def test_exact_tier_charges_before_a_peak(self):
+        market = create_market_from_price_series(
+            price_series=pd.Series(
+                data=[10.0, 20.0, 15.0, 100.0, 30.0, 30.0],
+                index=pd.date_range(start="2025-01-01", periods=6, freq="1h"),
+            ),
+            interval_hours=1.0,
+        )
+        battery = self._battery(charge_efficiency=1.0, discharge_efficiency=1.0)
+
+        decision = decide_dispatch(
+            battery=battery,
+            all_markets=[market],
+            timestamp=pd.Timestamp("2025-01-01 00:00"),
+            deadline_seconds=60.0,
+            exact_horizons_hours=(6.0,),
+        )
+
+        (commitment,) = decision.commitments
+        assert decision.tier == "exact"
+        assert commitment.market is market
+        assert commitment.commitment_type is BatteryCommitmentType.CHARGE
+        assert commitment.energy_mwh == pytest.approx(2.0)
+        assert commitment.end_time == pd.Timestamp("2025-01-01 01:00")
+        assert battery.commitments == []
+
+    def test_rejects_timestamps_between_intervals(self):
+        with pytest.raises(ValueError):
+            decide_dispatch(
+                battery=self._battery(),
+                all_markets=self._markets,
+                timestamp=pd.Timestamp("2025-01-01 00:10"),
+                deadline_seconds=1.0,
+            )
@@ -1,6 +1,11 @@
+import numpy as np
 import pandas as pd
 import pytest
 
+from battery_dispatch.core import (
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
 from tests.data_builder import DataBuilder
 
 
@@ -29,6 +34,34 @@ class TestMarket:
             timestamp=pd.Timestamp("2025-01-01 00:30:00")
         )
 
+    def test_market_is_interval_start_at_finer_resolutions(self):
+        market_five_minutes = self._data_builder.add_market(interval_hours=1 / 12)
+        assert market_five_minutes.is_interval_start(
+            timestamp=pd.Timestamp("2025-01-01 00:05:00")
+        )
+        assert not market_five_minutes.is_interval_start(
+            timestamp=pd.Timestamp("2025-01-01 00:07:30")
+        )
+        assert market_five_minutes.interval_timedelta() == pd.Timedelta(minutes=5)
+
+        market_quarter_hour = self._data_builder.add_market(interval_hours=0.25)
+        assert market_quarter_hour.is_interval_start(
+            timestamp=pd.Timestamp("2025-01-01 00:45:00")
+        )
+        assert not market_quarter_hour.is_interval_start(
+            timestamp=pd.Timestamp("2025-01-01 00:50:00")
+        )
+        assert market_quarter_hour.number_of_intervals_in(number_of_hours=3) == 12
+
+    def test_market_interval_start_mask(self):
+        timestamps = pd.date_range(start="2025-01-01", periods=12, freq="5min")
+        for interval_hours in (1 / 12, 0.25, 0.5, 1.0):
+            market = self._data_builder.add_market(interval_hours=interval_hours)
+            assert list(market.interval_start_mask(timestamps=timestamps)) == [
+                market.is_interval_start(timestamp=timestamp)
+                for timestamp in timestamps
+            ]
+
     def test_market_average_price(self) -> None:
         prices = pd.Series(
             data=[50.0, 60.0, 70.0],
@@ -36,3 +69,151 @@ class TestMarket:
         )
         market = self._data_builder.add_market(prices=prices)
         assert market.average_price == 60.0
+
+    def test_lookahead_queries(self) -> None:
+        prices = pd.Series(
+            data=[50.0, 45.0, 55.0, 60.0, 40.0],
+            index=pd.date_range(start="2025-01-01 00:00:00", periods=5, freq="30min"),
+        )
+        market = self._data_builder.add_market(prices=prices, interval_hours=0.5)
+
+        assert market.highest_price_between(start_index=0, end_index=2) == 55.0
+        assert market.lowest_price_between(start_index=1, end_index=4) == 40.0
+
+        highest = market.highest_prices_over_next_hours(number_of_hours=1.0)
+        lowest = market.lowest_prices_over_next_hours(number_of_hours=1.0)
+        assert highest.index.equals(prices.index)
+        assert list(highest)[:4] == [55.0, 60.0, 60.0, 40.0]
+        assert list(lowest)[:4] == [45.0, 55.0, 40.0, 40.0]
+        assert pd.isna(highest.iloc[-1]) and pd.isna(lowest.iloc[-1])
+
+
+class TestMarketBlock:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=4)
+        self._prices = pd.Series(
+            data=np.round(
+                50 + 20 * np.sin(np.arange(480) / 8) + rng.normal(0, 5, 480), 2
+            ),
+            index=pd.date_range(start="2025-01-01", periods=480, freq="30min"),
+        )
+
+    def test_series_share_one_read_only_block(self):
+        market = create_market_from_price_series(
+            price_series=self._prices, interval_hours=0.5
+        )
+
+        assert market.prices.index is market.highest_price_across_next_n_hours.index
+        assert market.prices.index is market.lowest_price_across_next_n_hours.index
+        block = market.prices.to_numpy().base
+        assert block is not None
+        assert block.shape == (3, 480)
+        assert not block.flags.writeable
+        for series in (
+            market.highest_price_across_next_n_hours,
+            market.lowest_price_across_next_n_hours,
+        ):
+            assert np.shares_memory(series.to_numpy(), block)
+
+    def test_slice_is_a_view(self):
+        market = create_market_from_price_series(
+            price_series=self._prices, interval_hours=0.5
+        )
+
+        sliced = market.slice(start="2025-01-03", end="2025-01-05")
+
+        assert sliced.prices.index[0] == pd.Timestamp("2025-01-03")
+        assert sliced.prices.index[-1] == pd.Timestamp("2025-01-04 23:30")
+        assert sliced.prices.index is sliced.highest_price_across_next_n_hours.index
+        assert np.shares_memory(sliced.prices.to_numpy(), market.prices.to_numpy())
+        assert np.shares_memory(
+            sliced.prices.index.to_numpy(), market.prices.index.to_numpy()
+        )
+        assert sliced.highest_price_across_next_n_hours.equals(
+            market.highest_price_across_next_n_hours["2025-01-03":"2025-01-04 23:30"]
+        )
+        assert len(market.slice(end="2025-01-02").prices) == 48
+        assert len(market.slice().prices) == 480
+
+    def test_sliced_market_can_be_simulated(self):
+        market = create_market_from_price_series(
+            price_series=self._prices, interval_hours=0.5
+        )
+        sliced = market.slice(start="2025-01-03", end="2025-01-05")
+
+        result = run_battery_simulation_for_scenario(
+            battery=self._data_builder.add_battery(),
+            all_markets=[sliced],
+            output=False,
+        )
+
+        assert result.revenue > 0
+
+    def test_slice_queries_the_full_data(self):
+        market = create_market_from_price_series(
+            price_series=self._prices, interval_hours=0.5
+        )
+        sliced = market.slice(start="2025-01-03", end="2025-01-05")
+        resliced = sliced.slice(start="2025-01-04")
+        offset = 96
+
+        # The index is shared rather than rebuilt, and lookaheads that cross the
+        # slice's end see the same prices as the full market's
+        assert sliced.price_range_index is market.price_range_index
+        for number_of_hours in (1.0, 5.5):
+            for part in (sliced, resliced):
+                pd.testing.assert_series_equal(
+                    part.highest_prices_over_next_hours(
+                        number_of_hours=number_of_hours
+                    ),
+                    market.highest_prices_over_next_hours(
+                        number_of_hours=number_of_hours
+                    )[part.prices.index],
+                )
+                pd.testing.assert_series_equal(
+                    part.lowest_prices_over_next_hours(number_of_hours=number_of_hours),
+                    market.lowest_prices_over_next_hours(
+                        number_of_hours=number_of_hours
+                    )[part.prices.index],
+                )
+        last = len(sliced.prices) - 1
+        assert sliced.highest_price_between(
+            start_index=last, end_index=last + 4
+        ) == market.highest_price_between(
+            start_index=offset + last, end_index=offset + last + 4
+        )
+        assert not np.isnan(
+            sliced.lowest_price_between(start_index=last, end_index=last + 1)
+        )
+
+    def test_float32_prices(self):
+        market_64 = create_market_from_price_series(
+            price_series=self._prices, interval_hours=0.5
+        )
+        market_32 = create_market_from_price_series(
+            price_series=self._prices, interval_hours=0.5, dtype="float32"
+        )
+
+        assert market_32.prices.dtype == np.float32
+        assert market_32.highest_price_across_next_n_hours.dtype == np.float32
+        result_64 = run_battery_simulation_for_scenario(
+            battery=self._data_builder.add_battery(),
+            all_markets=[market_64],
+            output=False,
+        )
+        battery_32 = self._data_builder.add_battery()
+        result_32 = run_battery_simulation_for_scenario(
+            battery=battery_32, all_markets=[market_32], output=False
+        )
+
+        assert isinstance(battery_32.revenue, float)
+        assert result_32.throughput_mwh == result_64.throughput_mwh
+        assert result_32.revenue == pytest.approx(result_64.revenue, rel=1e-6)
+
+    def test_unknown_dtype(self):
+        with pytest.raises(ValueError, match="Unknown price dtype"):
+            create_market_from_price_series(
+                price_series=self._prices, interval_hours=0.5, dtype="float16"
+            )
@@ -0,0 +1,170 @@
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import create_market_from_price_series
+from battery_dispatch.optimal import (
+    ValueFunctionCache,
+    ValueFunctionKey,
+    solve_optimal_dispatch,
+)
+from battery_dispatch.values.battery import Battery
+from tests.data_builder import DataBuilder
+
+
+def _market(prices: list[float], interval_hours: float = 1.0, name: str = "Market"):
+    return create_market_from_price_series(
+        price_series=pd.Series(
+            data=prices,
+            index=pd.date_range(
+                start="2025-01-01",
+                periods=len(prices),
+                freq=pd.Timedelta(hours=interval_hours),
+            ),
+        ),
+        interval_hours=interval_hours,
+        name=name,
+    )
+
+
+class TestSolveOptimalDispatch:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=3)
+        self._market = _market(
+            list(50 + 30 * np.sin(np.arange(480) / 4) + rng.normal(0, 5, size=480))
+        )
+
+    def _battery(self, **kwargs: Any) -> Battery:
+        return self._data_builder.add_battery(
+            **{
+                "capacity_mwh": 4.0,
+                "max_charge_mw": 2.0,
+                "max_discharge_mw": 2.0,
+                "state_of_charge_mwh": 0.0,
+                **kwargs,
+            }
+        )
+
+    def test_buys_low_and_sells_high(self):
+        battery = self._battery(
+            capacity_mwh=1.0, max_charge_mw=2.0, charge_efficiency=0.5
+        )
+
+        dispatch = solve_optimal_dispatch(
+            battery=battery, market=_market([10.0, 100.0, 20.0]), soc_steps=4
+        )
+
+        # Two MWh bought fill the battery, which sells one MWh at the peak
+        assert list(dispatch.grid_energy_mwh) == [-2.0, 1.0, 0.0]
+        assert list(dispatch.state_of_charge_mwh) == [0.0, 1.0, 0.0, 0.0]
+        assert dispatch.profit == pytest.approx(80.0)
+        assert dispatch.result.throughput_mwh == pytest.approx(3.0)
+        assert battery.state_of_charge_mwh == 0.0
+
+    def test_power_limits_are_respected(self):
+        dispatch = solve_optimal_dispatch(
+            battery=self._battery(max_charge_mw=1.0, max_discharge_mw=1.5),
+            market=_market(list(self._market.prices), interval_hours=0.5),
+        )
+
+        assert dispatch.grid_energy_mwh.min() >= -0.5 - 1e-9
+        assert dispatch.grid_energy_mwh.max() <= 0.75 + 1e-9
+        assert dispatch.profit > 0
+
+    def test_cached_value_functions_are_reused(self):
+        cache = ValueFunctionCache()
+        first = solve_optimal_dispatch(
+            battery=self._battery(), market=self._market, cache=cache
+        )
+        renamed_market = _market(list(self._market.prices), name="Renamed")
+
+        second = solve_optimal_dispatch(
+            battery=self._battery(), market=renamed_market, cache=cache
+        )
+
+        assert (first.source, second.source) == ("solved", "cached")
+        assert second.result == first.result
+        assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+    @pytest.mark.parametrize(
+        "parameter, values",
+        [("capacity_mwh", (3.8, 4.0, 4.2)), ("charge_efficiency", (0.85, 0.9, 0.95))],
+    )
+    def test_nearby_batteries_interpolate(
+        self, parameter: str, values: tuple[float, float, float]
+    ):
+        cache = ValueFunctionCache()
+        low, middle, high = values
+        for value in (low, high):
+            solve_optimal_dispatch(
+                battery=self._battery(**{parameter: value}),
+                market=self._market,
+                cache=cache,
+            )
+
+        interpolated = solve_optimal_dispatch(
+            battery=self._battery(**{parameter: middle}),
+            market=self._market,
+            cache=cache,
+        )
+        exact = solve_optimal_dispatch(
+            battery=self._battery(**{parameter: middle}), market=self._market
+        )
+
+        assert interpolated.source == "interpolated"
+        assert interpolated.profit <= exact.profit
+        assert interpolated.profit == pytest.approx(exact.profit, rel=0.02)
+
+    def test_far_batteries_are_solved(self):
+        cache = ValueFunctionCache()
+        for capacity_mwh in (2.0, 6.0):
+            solve_optimal_dispatch(
+                battery=self._battery(capacity_mwh=capacity_mwh),
+                market=self._market,
+                cache=cache,
+            )
+
+        dispatch = solve_optimal_dispatch(
+            battery=self._battery(), market=self._market, cache=cache
+        )
+
+        assert dispatch.source == "solved"
+        assert cache.interpolations == 0
+
+    def test_evicted_value_functions_spill_to_disk(self, tmp_path):
+        cache = ValueFunctionCache(max_bytes=1, spill_directory=str(tmp_path))
+        first = solve_optimal_dispatch(
+            battery=self._battery(), market=self._market, cache=cache
+        )
+        solve_optimal_dispatch(
+            battery=self._battery(max_charge_mw=1.0), market=self._market, cache=cache
+        )
+        key = ValueFunctionKey.for_battery(
+            battery=self._battery(), market=self._market, soc_steps=100
+        )
+
+        spilled = cache.get(key)
+        again = solve_optimal_dispatch(
+            battery=self._battery(), market=self._market, cache=cache
+        )
+
+        assert isinstance(spilled, np.memmap)
+        assert len(list(tmp_path.glob("*.npy"))) == 1
+        assert cache.bytes_in_memory == spilled.nbytes
+        assert again.source == "cached"
+        assert again.result == first.result
+
+    def test_evicted_value_functions_are_dropped_without_a_spill_directory(self):
+        cache = ValueFunctionCache(max_bytes=1)
+        for max_charge_mw in (1.0, 2.0):
+            solve_optimal_dispatch(
+                battery=self._battery(max_charge_mw=max_charge_mw),
+                market=self._market,
+                cache=cache,
+            )
+
+        assert len(cache) == 1
@@ -0,0 +1,94 @@
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import (
+    build_scenario_timeline,
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.parallel import block_boundaries, run_battery_simulation_in_blocks
+from battery_dispatch.values.degradation import DegradationModel
+from tests.data_builder import DataBuilder
+
+
+class TestParallelSimulation:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=3)
+        half_hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(480) / 8) + rng.normal(0, 5, size=480),
+            index=pd.date_range(start="2025-01-01", periods=480, freq="30min"),
+        )
+        hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(240) / 4) + rng.normal(0, 5, size=240),
+            index=pd.date_range(start="2025-01-01", periods=240, freq="1h"),
+        )
+        self._markets = [
+            create_market_from_price_series(
+                price_series=half_hourly_prices, interval_hours=0.5
+            ),
+            create_market_from_price_series(
+                price_series=hourly_prices, interval_hours=1.0
+            ),
+        ]
+
+    def test_block_boundaries(self):
+        timeline = build_scenario_timeline(all_markets=self._markets)
+        boundaries = block_boundaries(timeline=timeline, block_frequency="D")
+
+        assert boundaries[0] == 0
+        assert boundaries[-1] == len(timeline.timestamps)
+        assert len(boundaries) == 12
+        for boundary in boundaries[1:-1]:
+            assert (
+                timeline.timestamps[boundary]
+                == timeline.timestamps[boundary].normalize()
+            )
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    @pytest.mark.parametrize(
+        "battery_kwargs",
+        [
+            {},
+            {
+                "capacity_mwh": 4.0,
+                "max_charge_mw": 2.0,
+                "max_discharge_mw": 1.0,
+                "charge_efficiency": 0.9,
+                "discharge_efficiency": 0.85,
+                "state_of_charge_mwh": 1.0,
+                "degradation": DegradationModel(
+                    throughput_cost_per_mwh=2.0, cycle_cost=50.0
+                ),
+            },
+        ],
+    )
+    def test_blocks_match_serial_simulation(
+        self, workers: int, battery_kwargs: dict[str, Any]
+    ):
+        serial_battery = self._data_builder.add_battery(**battery_kwargs)
+        serial_result = run_battery_simulation_for_scenario(
+            battery=serial_battery, all_markets=self._markets, output=False
+        )
+        block_battery = self._data_builder.add_battery(**battery_kwargs)
+        block_result = run_battery_simulation_in_blocks(
+            battery=block_battery,
+            all_markets=self._markets,
+            output=False,
+            block_frequency="D",
+            workers=workers,
+        )
+
+        assert block_result == serial_result
+        assert block_battery == serial_battery
+        if workers == 1:
+            # One worker runs the serial loop rather than stitching blocks
+            assert block_result.steps_evaluated == serial_result.steps_evaluated
+        assert (
+            block_battery.audit_energy_balance()
+            == serial_battery.audit_energy_balance()
+        )
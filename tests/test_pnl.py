@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import (
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.parallel import run_battery_simulation_in_blocks
+from battery_dispatch.values.battery import Battery
+from battery_dispatch.values.pnl import PnlRollup
+from tests.data_builder import DataBuilder
+
+
+class TestPnlRollup:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=2)
+        self._markets = [
+            create_market_from_price_series(
+                price_series=pd.Series(
+                    data=50
+                    + 30 * np.sin(np.arange(24 * 40 / hours) * hours / 4)
+                    + rng.normal(0, 5, size=int(24 * 40 / hours)),
+                    index=pd.date_range(
+                        start="2025-01-20",
+                        periods=int(24 * 40 / hours),
+                        freq=pd.Timedelta(hours=hours),
+                    ),
+                ),
+                interval_hours=hours,
+                name=name,
+            )
+            for name, hours in (("half_hourly", 0.5), ("hourly", 1.0))
+        ]
+
+    def _battery(self) -> Battery:
+        return self._data_builder.add_battery(
+            capacity_mwh=4.0,
+            max_charge_mw=2.0,
+            max_discharge_mw=2.0,
+            charge_efficiency=0.9,
+            discharge_efficiency=0.9,
+            state_of_charge_mwh=0.0,
+        )
+
+    def test_sized_from_markets(self):
+        rollup = PnlRollup.for_markets(self._markets)
+
+        assert rollup.market_names == ("half_hourly", "hourly")
+        assert rollup.daily.shape == (4, 2, 40)
+        assert rollup.monthly.shape == (4, 2, 2)
+
+    def test_record(self):
+        rollup = PnlRollup.for_markets(self._markets)
+
+        rollup.record(
+            market_name="hourly",
+            timestamp=pd.Timestamp("2025-02-03 13:00"),
+            revenue=10.0,
+            cost=0.0,
+            throughput_mwh=1.0,
+            cycles=0.25,
+        )
+
+        day = rollup.by_day().loc["hourly"].loc[pd.Timestamp("2025-02-03")]
+        month = rollup.by_month().loc["hourly"].loc[pd.Timestamp("2025-02-01")]
+        assert list(day) == [10.0, 0.0, 10.0, 1.0, 0.25]
+        assert list(month) == list(day)
+        assert rollup.by_day()["revenue"].sum() == 10.0
+        with pytest.raises(ValueError, match="outside the P&L rollup's date range"):
+            rollup.record(
+                market_name="hourly",
+                timestamp=pd.Timestamp("2024-12-31"),
+                revenue=1.0,
+                cost=0.0,
+                throughput_mwh=0.0,
+                cycles=0.0,
+            )
+
+    def test_simulation_totals_match_the_books(self):
+        battery = self._battery()
+        battery.pnl_rollup = PnlRollup.for_markets(self._markets)
+
+        result = run_battery_simulation_for_scenario(
+            battery=battery, all_markets=self._markets, output=False
+        )
+
+        by_market = battery.pnl_rollup.by_market()
+        assert by_market["revenue"].sum() == pytest.approx(result.revenue)
+        assert by_market["cost"].sum() == pytest.approx(result.cost)
+        assert by_market["throughput_mwh"].sum() == pytest.approx(result.throughput_mwh)
+        assert (by_market["revenue"] > 0).all()
+        assert by_market["cycles"].sum() > 1
+        by_month = battery.pnl_rollup.by_month()
+        assert by_month["profit"].sum() == pytest.approx(result.profit)
+
+    def test_blocks_match_serial(self):
+        serial_battery = self._battery()
+        serial_battery.pnl_rollup = PnlRollup.for_markets(self._markets)
+        run_battery_simulation_for_scenario(
+            battery=serial_battery, all_markets=self._markets, output=False
+        )
+        blocks_battery = self._battery()
+        blocks_battery.pnl_rollup = PnlRollup.for_markets(self._markets)
+
+        run_battery_simulation_in_blocks(
+            battery=blocks_battery,
+            all_markets=self._markets,
+            output=False,
+            block_frequency="W",
+        )
+
+        np.testing.assert_allclose(
+            blocks_battery.pnl_rollup.daily, serial_battery.pnl_rollup.daily
+        )
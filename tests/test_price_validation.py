@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import (
+    create_market_from_data,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.values.price_validation import (
+    PriceValidationError,
+    validate_price_series,
+)
+from tests.data_builder import DataBuilder
+
+
+def _prices(timestamps: list[str], values: list[float]) -> pd.Series:
+    return pd.Series(data=values, index=pd.DatetimeIndex(timestamps))
+
+
+class TestValidatePriceSeries:
+    def test_clean_prices_are_unchanged(self):
+        prices = pd.Series(
+            data=np.arange(48, dtype=float),
+            index=pd.date_range(start="2025-01-01", periods=48, freq="30min"),
+        )
+
+        validated, report = validate_price_series(prices, interval_hours=0.5)
+
+        assert validated.equals(prices)
+        assert (validated.index == prices.index).all()
+        assert report.is_clean
+        assert report.filled == 0
+
+    @pytest.mark.parametrize(
+        "fill_policy, expected",
+        [("interpolate", [10.0, 20.0, 30.0, 40.0]), ("forward_fill", [10, 10, 10, 40])],
+    )
+    def test_gaps_are_filled(self, fill_policy: str, expected: list[float]):
+        prices = _prices(
+            ["2025-01-01 00:00", "2025-01-01 01:30"],
+            [10.0, 40.0],
+        )
+
+        validated, report = validate_price_series(
+            prices, interval_hours=0.5, fill_policy=fill_policy
+        )
+
+        assert list(validated) == expected
+        assert list(validated.index) == list(
+            pd.date_range(start="2025-01-01", periods=4, freq="30min")
+        )
+        assert report.missing_intervals == 2
+        assert report.filled == 2
+        assert not report.is_clean
+
+    def test_missing_prices_are_filled(self):
+        prices = _prices(
+            ["2025-01-01 00:00", "2025-01-01 01:00", "2025-01-01 02:00"],
+            [np.nan, 20.0, np.nan],
+        )
+
+        validated, report = validate_price_series(
+            prices, interval_hours=1.0, fill_policy="forward_fill"
+        )
+
+        assert list(validated) == [20.0, 20.0, 20.0]
+        assert report.missing_prices == 2
+        assert report.missing_intervals == 0
+
+    def test_gaps_can_raise(self):
+        prices = _prices(["2025-01-01 00:00", "2025-01-01 02:00"], [10.0, 40.0])
+
+        with pytest.raises(PriceValidationError, match="1 missing intervals"):
+            validate_price_series(prices, interval_hours=1.0, fill_policy="raise")
+
+    @pytest.mark.parametrize(
+        "duplicate_policy, expected",
+        [("mean", 15.0), ("first", 10.0), ("last", 20.0)],
+    )
+    def test_duplicates_are_merged(self, duplicate_policy: str, expected: float):
+        prices = _prices(
+            ["2025-10-26 00:00", "2025-10-26 01:00", "2025-10-26 01:00"],
+            [5.0, 10.0, 20.0],
+        )
+
+        validated, report = validate_price_series(
+            prices, interval_hours=1.0, duplicate_policy=duplicate_policy
+        )
+
+        assert list(validated) == [5.0, expected]
+        assert report.duplicate_timestamps == 1
+        assert report.number_of_prices == 3
+
+    def test_duplicates_can_raise(self):
+        prices = _prices(["2025-01-01 00:00", "2025-01-01 00:00"], [5.0, 10.0])
+
+        with pytest.raises(PriceValidationError, match="appear more than once"):
+            validate_price_series(prices, interval_hours=1.0, duplicate_policy="raise")
+
+    def test_out_of_order_prices_are_sorted(self):
+        prices = _prices(
+            ["2025-01-01 01:00", "2025-01-01 00:00", "2025-01-01 02:00"],
+            [2.0, 1.0, 3.0],
+        )
+
+        validated, report = validate_price_series(prices, interval_hours=1.0)
+
+        assert list(validated) == [1.0, 2.0, 3.0]
+        assert report.out_of_order == 1
+
+    def test_off_grid_timestamps_raise(self):
+        prices = _prices(["2025-01-01 00:00", "2025-01-01 00:45"], [1.0, 2.0])
+
+        with pytest.raises(PriceValidationError, match="aren't on the 0.5h grid"):
+            validate_price_series(prices, interval_hours=0.5)
+
+    @pytest.mark.parametrize(
+        "outlier_policy, expected_spike",
+        [("keep", 5000.0), ("fill", 50.0)],
+    )
+    def test_outliers(self, outlier_policy: str, expected_spike: float):
+        values = 50 + np.sin(np.arange(48))
+        values[10] = 5000.0
+        prices = pd.Series(
+            data=values,
+            index=pd.date_range(start="2025-01-01", periods=48, freq="1h"),
+        )
+
+        validated, report = validate_price_series(
+            prices, interval_hours=1.0, outlier_policy=outlier_policy
+        )
+
+        assert report.outliers == 1
+        assert validated.iloc[10] == pytest.approx(expected_spike, abs=2)
+
+    def test_outliers_can_be_clipped(self):
+        values = 50 + np.sin(np.arange(48))
+        values[10] = 5000.0
+        prices = pd.Series(
+            data=values,
+            index=pd.date_range(start="2025-01-01", periods=48, freq="1h"),
+        )
+
+        validated, _ = validate_price_series(
+            prices, interval_hours=1.0, outlier_policy="clip"
+        )
+
+        assert 50 < validated.iloc[10] < 5000
+        assert validated.drop(validated.index[10]).equals(prices.drop(prices.index[10]))
+
+    def test_unknown_policy(self):
+        prices = _prices(["2025-01-01 00:00"], [1.0])
+
+        with pytest.raises(ValueError, match="Unknown fill policy"):
+            validate_price_series(prices, interval_hours=1.0, fill_policy="zero")
+
+
+class TestCreateMarketFromData:
+    def test_gappy_csv_is_validated_on_load(self, tmp_path):
+        timestamps = pd.date_range(start="2025-01-01", periods=48, freq="1h")
+        frame = pd.DataFrame(
+            {
+                "timestamp": timestamps.strftime("%m/%d/%y %H:%M"),
+                "price [£/MWh]": 50 + 30 * np.sin(np.arange(48) / 4),
+            }
+        )
+        frame.loc[5, "price [£/MWh]"] = np.nan
+        csv_path = tmp_path / "prices.csv"
+        frame.drop(index=[20, 21]).to_csv(csv_path, index=False)
+
+        market = create_market_from_data(csv_path=str(csv_path), interval_hours=1.0)
+
+        assert market.validation_report is not None
+        assert market.validation_report.missing_intervals == 2
+        assert market.validation_report.missing_prices == 1
+        assert len(market.prices) == 48
+        assert not market.prices.isna().any()
+
+        result = run_battery_simulation_for_scenario(
+            battery=DataBuilder().add_battery(),
+            all_markets=[market],
+            output=False,
+        )
+        assert result.revenue > 0
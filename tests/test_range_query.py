@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from battery_dispatch.values.range_query import RangeExtremaIndex
+
+
+class TestRangeExtremaIndex:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._values = np.random.default_rng(seed=42).normal(50, 20, size=257)
+        self._index = RangeExtremaIndex.build(self._values)
+
+    def test_range_queries_match_brute_force(self):
+        for start_index in range(-1, len(self._values), 7):
+            for end_index in range(start_index + 1, len(self._values), 5):
+                window = self._values[start_index + 1 : end_index + 1]
+                assert self._index.max_between(start_index, end_index) == window.max()
+                assert self._index.min_between(start_index, end_index) == window.min()
+
+    def test_empty_range_is_nan(self):
+        assert np.isnan(self._index.max_between(10, 10))
+        assert np.isnan(self._index.min_between(len(self._values) - 1, 1000))
+
+    @pytest.mark.parametrize("number_of_intervals", [0, 1, 2, 6, 64, 300])
+    def test_over_next_matches_brute_force(self, number_of_intervals: int):
+        windows = [
+            self._values[i + 1 : i + number_of_intervals + 1]
+            for i in range(len(self._values))
+        ]
+        expected_max = [window.max() if len(window) else np.nan for window in windows]
+        expected_min = [window.min() if len(window) else np.nan for window in windows]
+        np.testing.assert_array_equal(
+            self._index.max_over_next(number_of_intervals), expected_max
+        )
+        np.testing.assert_array_equal(
+            self._index.min_over_next(number_of_intervals), expected_min
+        )
+
+    def test_over_next_for_some_positions(self):
+        for positions in (slice(0, 10), slice(250, None), slice(100, 100)):
+            np.testing.assert_array_equal(
+                self._index.max_over_next(6, positions=positions),
+                self._index.max_over_next(6)[positions],
+            )
+            np.testing.assert_array_equal(
+                self._index.min_over_next(6, positions=positions),
+                self._index.min_over_next(6)[positions],
+            )
+
+    def test_nans_are_skipped(self):
+        index = RangeExtremaIndex.build([1.0, np.nan, 3.0, 2.0])
+        assert index.max_between(-1, 1) == 1.0
+        assert index.min_between(0, 3) == 2.0
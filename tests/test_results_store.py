@@ -0,0 +1,204 @@
+import dataclasses
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.batch import ScenarioResult, run_scenarios
+from battery_dispatch.config import BatteryConfig, MarketConfig, ScenarioConfig
+from battery_dispatch.results_store import ResultsStore, StoredResult, scenario_key
+from battery_dispatch.values.forecast import ForecastStore
+
+
+def _result(scenario: str = "base", **kwargs) -> ScenarioResult:
+    return ScenarioResult(
+        **{
+            "scenario": scenario,
+            "strategy": "lookahead",
+            "lookahead_hours": 3.0,
+            "markets": "hourly",
+            "capacity_mwh": 4.0,
+            "max_charge_mw": 2.0,
+            "max_discharge_mw": 2.0,
+            "charge_efficiency": 0.9,
+            "discharge_efficiency": 0.9,
+            "revenue": 100.0,
+            "cost": 40.0,
+            "profit": 60.0,
+            "final_state_of_charge_mwh": 0.0,
+            "throughput_mwh": 8.0,
+            "degradation_cost": 0.0,
+            **kwargs,
+        }
+    )
+
+
+class TestResultsStore:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> Iterator[None]:
+        self._tmp_path = tmp_path
+        self._store = ResultsStore.open(str(tmp_path / "results.sqlite"))
+        yield
+        self._store.close()
+
+    def test_add_and_get(self):
+        inserted = self._store.add(
+            [
+                StoredResult(scenario_key="a", result=_result("a")),
+                StoredResult(scenario_key="b", result=_result("b", revenue=5.0)),
+            ]
+        )
+
+        found = self._store.get(["a", "b", "missing"])
+
+        assert inserted == 2
+        assert found == {"a": _result("a"), "b": _result("b", revenue=5.0)}
+
+    def test_existing_results_are_kept(self):
+        self._store.add([StoredResult(scenario_key="a", result=_result("a"))])
+
+        inserted = self._store.add(
+            [StoredResult(scenario_key="a", result=_result("a", revenue=1.0))]
+        )
+
+        assert inserted == 0
+        assert len(self._store) == 1
+        assert self._store.get(["a"])["a"].revenue == 100.0
+
+    def test_large_batches(self):
+        keys = [f"key_{index}" for index in range(1234)]
+        self._store.add(
+            StoredResult(scenario_key=key, result=_result(key)) for key in keys
+        )
+
+        assert len(self._store.get(keys)) == len(keys)
+
+    def test_query_by_parameters(self):
+        self._store.add(
+            StoredResult(
+                scenario_key=f"{capacity}_{lookahead}",
+                result=_result(
+                    f"{capacity}_{lookahead}",
+                    capacity_mwh=capacity,
+                    lookahead_hours=lookahead,
+                ),
+            )
+            for capacity in (2.0, 4.0)
+            for lookahead in (1.0, 3.0)
+        )
+
+        results = self._store.query(capacity_mwh=4.0, lookahead_hours=1.0)
+
+        assert [result.scenario for result in results] == ["4.0_1.0"]
+        assert len(self._store.query()) == 4
+        with pytest.raises(ValueError, match="Can't filter on revenue"):
+            self._store.query(revenue=100.0)
+
+    def test_indexes_are_used(self):
+        [(_, _, _, detail)] = self._store.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM scenario_results WHERE capacity_mwh = 4"
+        ).fetchall()
+
+        assert "USING INDEX" in detail
+
+    def test_timelines_are_compressed(self):
+        timeline = {"grid_import_mwh": np.zeros(10_000), "losses_mwh": np.arange(3.0)}
+        self._store.add(
+            [StoredResult(scenario_key="a", result=_result(), timeline=timeline)]
+        )
+        [blob] = self._store.connection.execute(
+            "SELECT timeline FROM scenario_results"
+        ).fetchone()
+
+        stored = self._store.timeline("a")
+
+        assert len(blob) < timeline["grid_import_mwh"].nbytes / 10
+        assert stored is not None
+        assert stored.keys() == timeline.keys()
+        assert (stored["losses_mwh"] == timeline["losses_mwh"]).all()
+        assert self._store.timeline("missing") is None
+
+
+class TestRunScenariosWithResultsStore:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path) -> None:
+        self._tmp_path = tmp_path
+        self._csv_path = tmp_path / "hourly.csv"
+        self._csv_path.write_text(
+            "timestamp,price [£/MWh]\n"
+            + "".join(
+                f"1/1/25 {hour}:00,{price}\n"
+                for hour, price in enumerate([30.0, 40.0, 50.0, 60.0, 50.0, 40.0])
+            )
+        )
+        self._scenario = ScenarioConfig(
+            name="base",
+            markets=(
+                MarketConfig(
+                    name="hourly", csv_path=str(self._csv_path), interval_hours=1.0
+                ),
+            ),
+            battery=BatteryConfig(
+                capacity_mwh=100.0, max_charge_mw=10.0, max_discharge_mw=20.0
+            ),
+        )
+        self._results_path = str(tmp_path / "results.sqlite")
+
+    def test_stored_scenarios_are_not_rerun(self):
+        renamed = dataclasses.replace(self._scenario, name="renamed")
+        [first] = run_scenarios([self._scenario], results_path=self._results_path)
+
+        results = run_scenarios(
+            [self._scenario, renamed], results_path=self._results_path
+        )
+
+        assert results == [first, dataclasses.replace(first, scenario="renamed")]
+        with ResultsStore.open(self._results_path) as store:
+            assert len(store) == 1
+
+    def test_changed_prices_are_rerun(self):
+        key = scenario_key(self._scenario)
+        self._csv_path.write_text(self._csv_path.read_text() + "1/1/25 6:00,80.0\n")
+
+        assert scenario_key(self._scenario) != key
+
+    def test_changed_forecasts_are_rerun(self):
+        forecast_path = self._tmp_path / "forecasts"
+        ForecastStore(
+            issue_times=np.array([0], dtype=np.int64),
+            first_target_times=np.array([0], dtype=np.int64),
+            values=np.array([[30.0, 40.0]]),
+            interval_hours=1.0,
+        ).save(str(forecast_path))
+        scenario = dataclasses.replace(
+            self._scenario,
+            markets=(
+                dataclasses.replace(
+                    self._scenario.markets[0], forecast_path=str(forecast_path)
+                ),
+            ),
+        )
+        key = scenario_key(scenario)
+        np.save(forecast_path / "values.npy", np.array([[30.0, 40.0, 50.0]]))
+
+        assert scenario_key(scenario) != key
+
+    def test_timelines_are_stored(self):
+        run_scenarios(
+            [self._scenario], results_path=self._results_path, store_timelines=True
+        )
+
+        with ResultsStore.open(self._results_path) as store:
+            timeline = store.timeline(scenario_key(self._scenario))
+
+        assert timeline is not None
+        assert timeline["grid_import_mwh"].sum() > 0
+        assert len(timeline["grid_export_mwh"]) == len(timeline["losses_mwh"])
+        start_times = pd.DatetimeIndex(pd.to_datetime(timeline["start_time_ns"]))
+        assert len(start_times) == len(timeline["losses_mwh"])
+        assert start_times.is_monotonic_increasing
+        assert start_times.isin(
+            pd.date_range(start="2025-01-01", periods=6, freq="1h")
+        ).all()
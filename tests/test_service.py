@@ -0,0 +1,341 @@
+import http.client
+import json
+import socket
+import socketserver
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import battery_dispatch.live
+from battery_dispatch.batch import _load_market, build_battery
+from battery_dispatch.config import BatteryConfig, MarketConfig
+from battery_dispatch.core import run_battery_simulation_for_scenario
+from battery_dispatch.live import lookahead_decisions
+from battery_dispatch.optimal import solve_optimal_dispatch
+from battery_dispatch.service import (
+    MAX_SOC_STEPS,
+    DispatchRequest,
+    DispatchService,
+    RequestError,
+    create_server,
+)
+
+BATTERY: dict[str, Any] = {
+    "capacity_mwh": 4.0,
+    "max_charge_mw": 2.0,
+    "max_discharge_mw": 2.0,
+    "charge_efficiency": 0.95,
+    "discharge_efficiency": 0.95,
+    "state_of_charge_mwh": 1.0,
+}
+
+
+def _write_prices(path: Path, *, periods: int, freq: str, seed: int) -> None:
+    rng = np.random.default_rng(seed=seed)
+    timestamps = pd.date_range(start="2025-01-01", periods=periods, freq=freq)
+    prices = 50 + 30 * np.sin(np.arange(periods) / 6) + rng.normal(0, 5, periods)
+    path.write_text(
+        "timestamp,price [£/MWh]\n"
+        + "".join(
+            f"{timestamp.strftime('%m/%d/%y %H:%M')},{price:.2f}\n"
+            for timestamp, price in zip(timestamps, prices)
+        )
+    )
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str) -> None:
+        super().__init__("localhost")
+        self._socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self._socket_path)
+
+
+class TestDispatchService:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path: Path):
+        _write_prices(tmp_path / "half_hourly.csv", periods=192, freq="30min", seed=1)
+        _write_prices(tmp_path / "hourly.csv", periods=96, freq="1h", seed=2)
+        self._tmp_path = tmp_path
+        self._market_configs = [
+            MarketConfig(
+                name="half_hourly",
+                csv_path=str(tmp_path / "half_hourly.csv"),
+                interval_hours=0.5,
+            ),
+            MarketConfig(
+                name="hourly", csv_path=str(tmp_path / "hourly.csv"), interval_hours=1.0
+            ),
+        ]
+        self._markets = [_load_market(config) for config in self._market_configs]
+        self._servers: list[tuple[socketserver.BaseServer, threading.Thread]] = []
+        yield
+        for server, thread in self._servers:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def _serve(self, *, workers: int = 1, socket_path: str | None = None):
+        service = DispatchService.start(
+            market_configs=self._market_configs, workers=workers
+        )
+        server = create_server(service, port=0, socket_path=socket_path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self._servers.append((server, thread))
+        if socket_path is not None:
+            return service, lambda: _UnixConnection(socket_path)
+        assert isinstance(server, socketserver.TCPServer)
+        port = server.server_address[1]
+        return service, lambda: http.client.HTTPConnection("127.0.0.1", port)
+
+    @staticmethod
+    def _call(connection, method: str, path: str, body=None):
+        connection.request(
+            method, path, body=None if body is None else json.dumps(body)
+        )
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def _expected_commitments(
+        self, timestamps: list[str], batteries: list[dict[str, Any]]
+    ):
+        expected = []
+        for timestamp, battery in zip(timestamps, batteries):
+            (commitments,) = lookahead_decisions(
+                batteries=[build_battery(BatteryConfig(**battery))],
+                all_markets=self._markets,
+                timestamp=pd.Timestamp(timestamp),
+            )
+            expected.append(
+                [
+                    {
+                        "market": commitment.market.name,
+                        "commitment_type": commitment.commitment_type.value,
+                        "energy_mwh": commitment.energy_mwh,
+                        "start_time": commitment.start_time.isoformat(),
+                        "end_time": commitment.end_time.isoformat(),
+                    }
+                    for commitment in commitments
+                ]
+            )
+        return expected
+
+    def test_dispatch_matches_the_heuristic(self):
+        _, connect = self._serve()
+        connection = connect()
+        timestamps = [
+            str(timestamp)
+            for timestamp in pd.date_range(start="2025-01-01", periods=48, freq="1h")
+        ]
+        batteries = [
+            {**BATTERY, "state_of_charge_mwh": float(index % 5)}
+            for index in range(len(timestamps))
+        ]
+
+        status, single = self._call(
+            connection,
+            "POST",
+            "/dispatch",
+            {"battery": batteries[0], "timestamp": timestamps[0]},
+        )
+        list_status, many = self._call(
+            connection,
+            "POST",
+            "/dispatch",
+            [
+                {"battery": battery, "timestamp": timestamp}
+                for battery, timestamp in zip(batteries, timestamps)
+            ],
+        )
+
+        expected = self._expected_commitments(timestamps, batteries)
+        assert (status, list_status) == (200, 200)
+        assert single == expected[0]
+        assert many == expected
+        assert sum(len(commitments) for commitments in many) > 5
+
+    def test_concurrent_dispatch_requests_are_batched(self):
+        service, connect = self._serve()
+        timestamp = "2025-01-02 06:00"
+        batteries = [
+            {**BATTERY, "state_of_charge_mwh": float(index % 5)} for index in range(64)
+        ]
+
+        def request(battery):
+            return self._call(
+                connect(),
+                "POST",
+                "/dispatch",
+                {"battery": battery, "timestamp": timestamp},
+            )
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            responses = list(executor.map(request, batteries))
+
+        assert [status for status, _ in responses] == [200] * 64
+        assert [body for _, body in responses] == self._expected_commitments(
+            [timestamp] * 64, batteries
+        )
+        metrics = service.metrics.snapshot()
+        assert metrics["endpoints"]["/dispatch"]["requests"] == 64
+        assert metrics["batches"] <= 64
+        assert metrics["largest_batch"] >= 1
+
+    def test_batches_group_on_the_parsed_timestamp(self, monkeypatch):
+        service = DispatchService.start(market_configs=self._market_configs)
+        calls = []
+
+        def counted(**kwargs):
+            calls.append(kwargs["timestamp"])
+            return lookahead_decisions(**kwargs)
+
+        monkeypatch.setattr(battery_dispatch.live, "lookahead_decisions", counted)
+        battery = BatteryConfig(**BATTERY)
+        batch: list[tuple[DispatchRequest, Future[Any]]] = [
+            (DispatchRequest(battery=battery, timestamp=timestamp), Future())
+            for timestamp in ("2025-01-02 06:00", "2025-01-02T06:00:00", "soon")
+        ]
+
+        service._decide_batch(batch)
+        service.close()
+
+        assert calls == [pd.Timestamp("2025-01-02 06:00")]
+        assert batch[0][1].result() == batch[1][1].result()
+        with pytest.raises(RequestError):
+            batch[2][1].result()
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_value_and_simulate(self, workers: int):
+        _, connect = self._serve(workers=workers)
+        connection = connect()
+        battery = build_battery(BatteryConfig(**BATTERY))
+
+        value_status, value = self._call(
+            connection,
+            "POST",
+            "/value",
+            {
+                "battery": BATTERY,
+                "market": "half_hourly",
+                "start": "2025-01-02",
+                "soc_steps": 20,
+            },
+        )
+        simulate_status, simulated = self._call(
+            connection,
+            "POST",
+            "/simulate",
+            {"battery": BATTERY, "end": "2025-01-03", "lookahead_hours": 2},
+        )
+
+        dispatch = solve_optimal_dispatch(
+            battery=battery,
+            market=self._markets[0].slice(start="2025-01-02"),
+            soc_steps=20,
+        )
+        result = run_battery_simulation_for_scenario(
+            battery=build_battery(BatteryConfig(**BATTERY)),
+            all_markets=[market.slice(end="2025-01-03") for market in self._markets],
+            output=False,
+            number_of_hours_to_look_ahead=2,
+        )
+        assert (value_status, simulate_status) == (200, 200)
+        assert value["profit"] == pytest.approx(dispatch.profit)
+        assert value["throughput_mwh"] == pytest.approx(dispatch.result.throughput_mwh)
+        assert simulated["profit"] == pytest.approx(result.profit)
+        assert simulated["final_state_of_charge_mwh"] == pytest.approx(
+            result.final_state_of_charge_mwh
+        )
+
+    @pytest.mark.parametrize(
+        "method, path, body, expected_status",
+        [
+            ("POST", "/dispatch", {"battery": {**BATTERY, "capacity_mwh": -1}}, 400),
+            ("POST", "/dispatch", {"battery": BATTERY}, 400),
+            ("POST", "/dispatch", {"battery": BATTERY, "timestamp": "soon"}, 400),
+            (
+                "POST",
+                "/dispatch",
+                {"battery": BATTERY, "timestamp": "2030-01-01"},
+                400,
+            ),
+            (
+                "POST",
+                "/dispatch",
+                {"battery": BATTERY, "timestamp": "2025-01-01", "markets": ["x"]},
+                400,
+            ),
+            ("POST", "/value", {"battery": BATTERY, "market": "x"}, 400),
+            (
+                "POST",
+                "/value",
+                {
+                    "battery": BATTERY,
+                    "market": "half_hourly",
+                    "soc_steps": MAX_SOC_STEPS + 1,
+                },
+                400,
+            ),
+            (
+                "POST",
+                "/value",
+                {"battery": BATTERY, "market": "half_hourly", "soc_steps": 2.5},
+                400,
+            ),
+            ("POST", "/simulate", {"battery": BATTERY, "speed": 1}, 400),
+            ("GET", "/dispatch", None, 405),
+            ("GET", "/elsewhere", None, 404),
+        ],
+    )
+    def test_bad_requests(self, method, path, body, expected_status):
+        service, connect = self._serve()
+
+        status, response = self._call(connect(), method, path, body)
+
+        assert status == expected_status
+        assert "error" in response
+        if path != "/elsewhere":
+            assert service.metrics.snapshot()["endpoints"][path]["errors"] == 1
+
+    def test_serves_markets_and_metrics_on_a_unix_socket(self):
+        socket_path = str(self._tmp_path / "dispatch.sock")
+        _, connect = self._serve(socket_path=socket_path)
+        connection = connect()
+
+        markets_status, markets = self._call(connection, "GET", "/markets")
+        for _ in range(3):
+            self._call(
+                connection,
+                "POST",
+                "/dispatch",
+                {"battery": BATTERY, "timestamp": "2025-01-01 12:00"},
+            )
+        metrics_status, metrics = self._call(connection, "GET", "/metrics")
+
+        assert (markets_status, metrics_status) == (200, 200)
+        assert [market["name"] for market in markets] == ["half_hourly", "hourly"]
+        assert markets[1] == {
+            "name": "hourly",
+            "interval_hours": 1.0,
+            "start": "2025-01-01T00:00:00",
+            "end": "2025-01-04T23:00:00",
+            "intervals": 96,
+        }
+        dispatch_metrics = metrics["endpoints"]["/dispatch"]
+        assert dispatch_metrics["requests"] == 3
+        assert (
+            0
+            < dispatch_metrics["p50_ms"]
+            <= dispatch_metrics["p99_ms"]
+            <= dispatch_metrics["max_ms"]
+        )
+        assert metrics["requests"] == 4
+        assert metrics["requests_per_second"] > 0
@@ -0,0 +1,214 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from battery_dispatch.core import (
+    create_market_from_price_series,
+    run_battery_simulation_for_scenario,
+)
+from battery_dispatch.sizing import (
+    CapexModel,
+    SizingParameter,
+    optimise_sizing,
+    sized_battery,
+)
+from tests.data_builder import DataBuilder
+
+
+class TestOptimiseSizing:
+    @pytest.fixture(autouse=True)
+    def setup(self) -> None:
+        self._data_builder = DataBuilder()
+        rng = np.random.default_rng(seed=3)
+        half_hourly_prices = pd.Series(
+            data=50 + 30 * np.sin(np.arange(480) / 8) + rng.normal(0, 5, size=480),
+            index=pd.date_range(start="2025-01-01", periods=480, freq="30min"),
+        )
+        hourly_prices = pd.Series(
+            data=50 + 20 * np.sin(np.arange(240) / 4) + rng.normal(0, 5, size=240),
+            index=pd.date_range(start="2025-01-01", periods=240, freq="1h"),
+        )
+        self._markets = [
+            create_market_from_price_series(
+                price_series=half_hourly_prices, interval_hours=0.5
+            ),
+            create_market_from_price_series(
+                price_series=hourly_prices, interval_hours=1.0, name="Hourly"
+            ),
+        ]
+        self._battery = self._data_builder.add_battery(
+            capacity_mwh=4.0,
+            max_charge_mw=2.0,
+            max_discharge_mw=2.0,
+            charge_efficiency=0.95,
+            discharge_efficiency=0.95,
+            state_of_charge_mwh=1.0,
+        )
+        self._parameters = [
+            SizingParameter("capacity_mwh", 1.0, 8.0, resolution=0.5),
+            SizingParameter("max_power_mw", 0.5, 4.0, resolution=0.5),
+        ]
+        self._capex = CapexModel(cost_per_mwh=60.0, cost_per_mw=120.0)
+
+    def test_finds_the_grid_optimum_with_fewer_simulations(self):
+        sizing = optimise_sizing(
+            battery=self._battery,
+            all_markets=self._markets,
+            parameters=self._parameters,
+            capex=self._capex,
+        )
+        grid_objectives = []
+        for capacity_mwh, max_power_mw in itertools.product(
+            np.arange(1.0, 8.5, 0.5), np.arange(0.5, 4.5, 0.5)
+        ):
+            battery = sized_battery(
+                battery=self._battery,
+                parameters={"capacity_mwh": capacity_mwh, "max_power_mw": max_power_mw},
+            )
+            result = run_battery_simulation_for_scenario(
+                battery=battery, all_markets=self._markets, output=False
+            )
+            grid_objectives.append(
+                result.profit
+                - result.degradation_cost
+                - self._capex.capex(battery=battery)
+            )
+
+        assert sizing.converged
+        assert len(sizing.evaluations) < len(grid_objectives) / 3
+        assert sizing.best.objective == pytest.approx(max(grid_objectives))
+
+    def test_evaluations_match_direct_simulations(self):
+        sizing = optimise_sizing(
+            battery=self._battery,
+            all_markets=self._markets,
+            parameters=[
+                SizingParameter("capacity_mwh", 2.0, 6.0, resolution=1.0),
+                SizingParameter("lookahead_hours", 1.0, 5.0, resolution=1.0),
+            ],
+            capex=self._capex,
+            max_evaluations=12,
+        )
+
+        for evaluation in sizing.evaluations:
+            battery = sized_battery(
+                battery=self._battery, parameters=evaluation.parameters
+            )
+            assert evaluation.result == run_battery_simulation_for_scenario(
+                battery=battery,
+                all_markets=self._markets,
+                output=False,
+                number_of_hours_to_look_ahead=evaluation.parameters["lookahead_hours"],
+            )
+            assert evaluation.capex == self._capex.capex(battery=battery)
+
+    def test_workers_match_serial_search(self):
+        serial = optimise_sizing(
+            battery=self._battery,
+            all_markets=self._markets,
+            parameters=self._parameters,
+            capex=self._capex,
+            max_evaluations=15,
+        )
+        in_workers = optimise_sizing(
+            battery=self._battery,
+            all_markets=self._markets,
+            parameters=self._parameters,
+            capex=self._capex,
+            max_evaluations=15,
+            workers=2,
+        )
+
+        assert in_workers == serial
+
+    def test_stops_at_the_evaluation_budget(self):
+        sizing = optimise_sizing(
+            battery=self._battery,
+            all_markets=self._markets,
+            parameters=self._parameters,
+            capex=self._capex,
+            max_evaluations=11,
+        )
+
+        assert len(sizing.evaluations) == 11
+        assert not sizing.converged
+        assert sizing.best.objective == max(
+            evaluation.objective for evaluation in sizing.evaluations
+        )
+
+    def test_parameters_fixed_by_their_bounds(self):
+        sizing = optimise_sizing(
+            battery=self._battery,
+            all_markets=self._markets,
+            parameters=[
+                SizingParameter("capacity_mwh", 1.0, 8.0),
+                SizingParameter("max_power_mw", 2.0, 2.0),
+            ],
+            capex=self._capex,
+        )
+
+        assert sizing.converged
+        assert len(sizing.evaluations) < 100
+        assert {
+            evaluation.parameters["max_power_mw"] for evaluation in sizing.evaluations
+        } == {2.0}
+
+    def test_every_parameter_fixed_by_its_bounds(self):
+        sizing = optimise_sizing(
+            battery=self._battery,
+            all_markets=self._markets,
+            parameters=[SizingParameter("capacity_mwh", 3.0, 3.0)],
+            capex=self._capex,
+        )
+
+        assert sizing.converged
+        assert sizing.rounds == 0
+        assert len(sizing.evaluations) == 1
+
+    def test_sized_batteries_start_as_full_as_the_template(self):
+        battery = sized_battery(
+            battery=self._battery,
+            parameters={"capacity_mwh": 8.0, "max_power_mw": 3.0, "lookahead_hours": 2},
+        )
+
+        assert (battery.capacity_mwh, battery.state_of_charge_mwh) == (8.0, 2.0)
+        assert (battery.max_charge_mw, battery.max_discharge_mw) == (3.0, 3.0)
+        assert battery.charge_efficiency == 0.95
+        assert self._battery.capacity_mwh == 4.0
+
+    @pytest.mark.parametrize(
+        "parameters",
+        [
+            [],
+            [
+                SizingParameter("capacity_mwh", 1, 2),
+                SizingParameter("capacity_mwh", 1, 2),
+            ],
+            [
+                SizingParameter("max_power_mw", 1, 2),
+                SizingParameter("max_charge_mw", 1, 2),
+            ],
+        ],
+    )
+    def test_rejects_invalid_searches(self, parameters: list[SizingParameter]):
+        with pytest.raises(ValueError):
+            optimise_sizing(
+                battery=self._battery,
+                all_markets=self._markets,
+                parameters=parameters,
+                capex=self._capex,
+            )
+
+    @pytest.mark.parametrize(
+        "name, low, high, resolution",
+        [
+            ("efficiency", 0, 1, None),
+            ("capacity_mwh", 2, 1, None),
+            ("capacity_mwh", 1, 2, 0),
+        ],
+    )
+    def test_rejects_invalid_parameters(self, name, low, high, resolution):
+        with pytest.raises(ValueError):
+            SizingParameter(name, low, high, resolution=resolution)